@@ -0,0 +1,662 @@
+import base64
+import io
+import json
+import os
+import shutil
+import tarfile
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+from StorageBackend import CHUNK_SIZE, StorageBackend
+
+# Formate deja comprimate, pe care deflate nu le mai micsoreaza
+COMPRESSED_AUDIO_EXTENSIONS = {
+    ".mp3", ".m4a", ".m4b", ".aac", ".ogg", ".oga", ".opus", ".wma", ".mka", ".mpc", ".spx", ".ac3", ".eac3",
+    ".dts", ".amr", ".ape", ".wv", ".tta", ".flac", ".alac", ".f4a", ".f4b", ".flv", ".vqf", ".la", ".shn",
+}
+
+ARCHIVE_FORMATS = {
+    ".zip": "zip",
+    ".tar": "tar",
+    ".tar.gz": "tar.gz",
+    ".tgz": "tar.gz",
+    ".tar.bz2": "tar.bz2",
+    ".tar.xz": "tar.xz",
+    ".tar.zst": "tar.zst",
+}
+
+
+def detect_format(archive_path):
+    """
+    Gets the archive format matching the extension of a path.
+
+    Args:
+        archive_path (str): Path of the archive.
+
+    Returns:
+        str: One of the ARCHIVE_FORMATS values, "zip" for a path without extension.
+
+    Raises:
+        ValueError: If the extension isn't one of a supported format (e.g. ".rar", ".7z").
+    """
+
+    name = os.path.basename(archive_path).lower()
+
+    for extension in sorted(ARCHIVE_FORMATS, key=len, reverse=True):
+        if name.endswith(extension):
+            return ARCHIVE_FORMATS[extension]
+
+    # Un fisier .rar scris ca zip ar parea stricat, asa ca doar numele fara extensie devin zip
+    if os.path.splitext(name)[1]:
+        raise ValueError(f"Unsupported archive extension: {os.path.splitext(name)[1]}. "
+                         f"Use one of {', '.join(ARCHIVE_FORMATS)}.")
+
+    return "zip"
+
+
+def unique_arcname(arcname, id_song, names):
+    """
+    Gets the name of the archive entry of a song, adding the song ID to a name already used by another song.
+
+    Args:
+        arcname (str): The file name of the song.
+        id_song (int): ID of the song.
+        names (set): The names used so far, to which the returned name is added.
+
+    Returns:
+        str: The name of the entry.
+    """
+
+    # Doua melodii cu acelasi nume de fisier nu pot avea aceeasi intrare in arhiva
+    if arcname in names:
+        stem, extension = os.path.splitext(arcname)
+        arcname = f"{stem} ({id_song}){extension}"
+
+    names.add(arcname)
+    return arcname
+
+
+class ArchiveBuilder:
+    """
+    Writes archives of song files taken from storage backends.
+
+    The files are read by a pool of threads, a bounded number of them ahead of the one being written, and the
+    archive is written sequentially, so it can go to any writable file-like object (a file, a socket, an HTTP
+    response) without temporary files. Already compressed audio is stored as is instead of being deflated.
+    """
+
+    def __init__(self, format="zip", compress_audio=False, workers=4, prefetch=8, max_prefetch_size=64 * CHUNK_SIZE):
+        """
+        Initialize the builder.
+
+        Args:
+            format (str): One of "zip", "tar", "tar.gz", "tar.bz2", "tar.xz" and "tar.zst" (requires zstandard).
+            compress_audio (bool): Whether to compress the already compressed audio formats too.
+            workers (int): Number of threads reading files.
+            prefetch (int): Maximum number of files read ahead of the one being written.
+            max_prefetch_size (int): Files larger than this are not read ahead but copied in chunks when written.
+
+        Raises:
+            ValueError: If the format isn't supported.
+        """
+
+        if format not in ARCHIVE_FORMATS.values():
+            raise ValueError(f"Unsupported archive format: {format}.")
+
+        self.format = format
+        self.compress_audio = compress_audio
+        self.workers = workers
+        self.prefetch = prefetch
+        self.max_prefetch_size = max_prefetch_size
+
+
+    def build(self, entries, destination, progress=None, cancel_event=None):
+        """
+        Writes an archive.
+
+        Args:
+            entries (iterable): (arcname, backend, key) tuples, the name in the archive and where the file is stored.
+            destination (str or file): Path of the archive or a writable binary file-like object.
+            progress (callable): Called with the number of entries written and their total (None if unknown)
+                after each entry.
+            cancel_event (threading.Event): Stops the build when set.
+
+        Returns:
+            list: The names of the files added to the archive. Missing files are skipped.
+
+        Raises:
+            CancelledError: If the build was cancelled.
+            Exception: If an error occurs while reading the files or writing the archive. An archive written
+                to a path is removed in this case.
+        """
+
+        if isinstance(destination, (str, os.PathLike)):
+            try:
+                with open(destination, "wb") as file:
+                    return self.build(entries, file, progress, cancel_event)
+            except BaseException:
+                if os.path.exists(destination):
+                    os.remove(destination)
+                raise
+
+        if self.format == "zip":
+            with zipfile.ZipFile(destination, "w", zipfile.ZIP_DEFLATED) as archive:
+                return self.add_entries(archive, entries, progress, cancel_event)
+
+        if self.format == "tar.zst":
+            try:
+                import zstandard
+            except ImportError as e:
+                raise ImportError("The tar.zst format requires zstandard (pip install zstandard).") from e
+
+            with zstandard.ZstdCompressor().stream_writer(destination, closefd=False) as compressed:
+                with tarfile.open(fileobj=compressed, mode="w|") as archive:
+                    return self.add_entries(archive, entries, progress, cancel_event)
+
+        # Modul "w|" scrie secvential, fara seek, deci merge si pe un socket
+        mode = "w|" + self.format[len("tar."):] if "." in self.format else "w|"
+        with tarfile.open(fileobj=destination, mode=mode) as archive:
+            return self.add_entries(archive, entries, progress, cancel_event)
+
+
+    def add_entries(self, archive, entries, progress=None, cancel_event=None):
+        """
+        Adds files to an already open archive.
+
+        Args:
+            archive (ZipFile or TarFile): The archive, open for writing or appending.
+            entries (iterable): (arcname, backend, key) tuples, the name in the archive and where the file is stored.
+            progress (callable): Called with the number of entries written and their total after each entry.
+            cancel_event (threading.Event): Stops adding files when set.
+
+        Returns:
+            list: The names of the files added to the archive. Missing files are skipped.
+
+        Raises:
+            CancelledError: If cancel_event was set.
+        """
+
+        if isinstance(archive, zipfile.ZipFile):
+            return self._write(entries, lambda *entry: self._add_to_zip(archive, *entry), progress, cancel_event)
+
+        return self._write(entries, lambda *entry: self._add_to_tar(archive, *entry), progress, cancel_event)
+
+
+    def _write(self, entries, add, progress=None, cancel_event=None):
+        """
+        Reads the entries in parallel and adds them to the archive in order.
+
+        Args:
+            entries (iterable): (arcname, backend, key) tuples.
+            add (callable): Adds an entry to the archive, called with arcname, info, data and the open function.
+            progress (callable): Called with the number of entries written and their total after each entry.
+            cancel_event (threading.Event): Stops adding files when set.
+
+        Returns:
+            list: The names of the files added to the archive.
+
+        Raises:
+            CancelledError: If cancel_event was set.
+        """
+
+        added = []
+        pending = deque()
+        total = len(entries) if hasattr(entries, "__len__") else None
+        entries = iter(entries)
+        done = 0
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while True:
+                # Cel mult `prefetch` fisiere citite inainte
+                while len(pending) < self.prefetch:
+                    entry = next(entries, None)
+                    if entry is None:
+                        break
+                    pending.append((entry, executor.submit(self._read, *entry[1:])))
+
+                if not pending:
+                    return added
+
+                if cancel_event is not None and cancel_event.is_set():
+                    for _, future in pending:
+                        future.cancel()
+                    raise CancelledError("The archive was cancelled.")
+
+                (arcname, backend, key), future = pending.popleft()
+                info, data = future.result()
+                done += 1
+
+                if info is None:
+                    print(f"File {key} not found.")
+                else:
+                    print(f"Adding file: {key}.")
+                    add(arcname, info, data, lambda: backend.open_stream(key))
+                    print(f"Added {arcname} into arhive.")
+                    added.append(arcname)
+
+                if progress is not None:
+                    progress(done, total)
+
+
+    def _read(self, backend, key):
+        """
+        Reads a file ahead, unless it is too large.
+
+        Args:
+            backend (StorageBackend): Backend holding the file.
+            key (str): Key of the file.
+
+        Returns:
+            tuple: The stat of the file (None if it is missing) and its content (None if it wasn't read ahead).
+        """
+
+        info = backend.stat(key)
+
+        if info is None or info["size"] > self.max_prefetch_size:
+            return info, None
+
+        with backend.open_stream(key) as stream:
+            return info, stream.read()
+
+
+    def _add_to_zip(self, archive, arcname, info, data, open_stream):
+        """
+        Adds a file to a ZIP archive, stored without compression if it is compressed audio.
+
+        Args:
+            archive (ZipFile): The archive.
+            arcname (str): Name of the file in the archive.
+            info (dict): Size and modification time of the file.
+            data (bytes): Content of the file, or None to read it with open_stream.
+            open_stream (callable): Opens the stored file.
+        """
+
+        # ZIP nu poate retine date anterioare anului 1980
+        zip_info = zipfile.ZipInfo(arcname, max(time.localtime(info["mtime"])[:6], (1980, 1, 1, 0, 0, 0)))
+        zip_info.compress_type = self._compression(arcname)
+
+        with archive.open(zip_info, "w", force_zip64=info["size"] > zipfile.ZIP64_LIMIT) as destination:
+            if data is not None:
+                destination.write(data)
+            else:
+                with open_stream() as source:
+                    shutil.copyfileobj(source, destination, CHUNK_SIZE)
+
+
+    def _add_to_tar(self, archive, arcname, info, data, open_stream):
+        """
+        Adds a file to a TAR archive.
+
+        Args:
+            archive (TarFile): The archive.
+            arcname (str): Name of the file in the archive.
+            info (dict): Size and modification time of the file.
+            data (bytes): Content of the file, or None to read it with open_stream.
+            open_stream (callable): Opens the stored file.
+        """
+
+        tar_info = tarfile.TarInfo(arcname)
+        tar_info.size = info["size"]
+        tar_info.mtime = int(info["mtime"])
+        tar_info.mode = 0o644
+
+        if data is not None:
+            archive.addfile(tar_info, io.BytesIO(data))
+        else:
+            with open_stream() as source:
+                archive.addfile(tar_info, source)
+
+
+    def _compression(self, arcname):
+        """
+        Chooses the ZIP compression of a file.
+
+        Args:
+            arcname (str): Name of the file.
+
+        Returns:
+            int: ZIP_STORED for compressed audio (unless compress_audio is set), ZIP_DEFLATED otherwise.
+        """
+
+        if not self.compress_audio and os.path.splitext(arcname)[1].lower() in COMPRESSED_AUDIO_EXTENSIONS:
+            return zipfile.ZIP_STORED
+
+        return zipfile.ZIP_DEFLATED
+
+
+class IncrementalArchive:
+    """
+    A ZIP save list that is updated instead of rebuilt. A manifest kept next to the archive (the archive path
+    followed by ".manifest.json") records the song ID, content hash, size and modification time of every entry:
+    a later update only appends the new songs, and the archive is rewritten only if songs changed or were
+    removed, the unchanged entries being copied from the old archive instead of read from storage again.
+
+    The new entries are appended in groups, and after each group the manifest saves a checkpoint (the offset
+    where the entries end and the central directory that follows them). An interrupted build is resumed from
+    the last checkpoint instead of being restarted. A rewrite is checkpointed the same way, in the "rewrite"
+    field of the manifest, while the new archive is written next to the old one.
+    """
+
+    def __init__(self, archive_path, builder=None, checkpoint_every=50):
+        """
+        Initialize the archive.
+
+        Args:
+            archive_path (str): Path of the ZIP archive.
+            builder (ArchiveBuilder): Builder writing the entries, a ZIP builder with default settings if not provided.
+            checkpoint_every (int): Number of entries appended between two checkpoints.
+
+        Raises:
+            ValueError: If the builder doesn't write ZIP archives.
+        """
+
+        self.builder = builder or ArchiveBuilder("zip")
+
+        if self.builder.format != "zip":
+            raise ValueError("Incremental save lists must be ZIP archives.")
+
+        self.archive_path = os.fspath(archive_path)
+        self.manifest_path = self.archive_path + ".manifest.json"
+        self.partial_path = self.archive_path + ".partial"
+        self.checkpoint_every = checkpoint_every
+
+
+    def update(self, songs, progress=None, cancel_event=None):
+        """
+        Brings the archive up to date with a list of songs.
+
+        Args:
+            songs (list): (song_id, arcname, backend, key, content_hash) tuples, content_hash being None
+                for the files that aren't content-addressed.
+            progress (callable): Called with the number of entries written and their total after each entry.
+            cancel_event (threading.Event): Stops the update when set. A cancelled update is resumed by the next one.
+
+        Returns:
+            list: The names of all the files in the archive.
+
+        Raises:
+            CancelledError: If the update was cancelled.
+        """
+
+        manifest = self._load_manifest()
+
+        if manifest is None:
+            manifest = self._create()
+        elif not manifest["complete"]:
+            print(f"Resuming the archive from {len(manifest['entries'])} entries.")
+            self._restore(manifest["checkpoint"])
+
+        wanted, locations = self._describe(songs)
+        current = manifest["entries"]
+
+        changed = [id_song for id_song in wanted if id_song in current and current[id_song] != wanted[id_song]]
+        removed = [id_song for id_song in current if id_song not in wanted]
+        added = [id_song for id_song in wanted if id_song not in current]
+
+        if changed or removed:
+            print(f"Rewriting the archive: {len(changed)} changed, {len(removed)} removed, {len(added)} new songs.")
+            self._rewrite(manifest, wanted, locations, progress, cancel_event)
+        elif added:
+            print(f"Appending {len(added)} new songs to the archive.")
+            self._append(manifest, added, wanted, locations, progress, cancel_event)
+
+        if not (changed or removed) and manifest.pop("rewrite", None) is not None:
+            # O rescriere intrerupta care nu mai e necesara
+            if os.path.exists(self.partial_path):
+                os.remove(self.partial_path)
+
+        manifest["complete"] = True
+        self._save_manifest(manifest)
+
+        return [entry["arcname"] for entry in manifest["entries"].values()]
+
+
+    def _describe(self, songs):
+        """
+        Gets the manifest entries the songs should have.
+
+        Args:
+            songs (list): (song_id, arcname, backend, key, content_hash) tuples.
+
+        Returns:
+            tuple: The entries by song ID (as a string, like the JSON keys) and the (backend, key) of every song.
+                Songs whose files are missing are left out.
+        """
+
+        songs = list(songs)
+
+        with ThreadPoolExecutor(max_workers=self.builder.workers) as executor:
+            stats = list(executor.map(lambda song: song[2].stat(song[3]), songs))
+
+        wanted = {}
+        locations = {}
+        names = set()
+
+        for (id_song, arcname, backend, key, content_hash), info in zip(songs, stats):
+            if info is None:
+                print(f"File {key} not found.")
+                continue
+
+            arcname = unique_arcname(arcname, id_song, names)
+
+            wanted[str(id_song)] = {
+                "arcname": arcname,
+                "content_hash": content_hash,
+                "size": info["size"],
+                "mtime": info["mtime"],
+            }
+            locations[str(id_song)] = (backend, key)
+
+        return wanted, locations
+
+
+    def _create(self):
+        """
+        Starts a new, empty archive.
+
+        Returns:
+            dict: The manifest of the archive.
+        """
+
+        zipfile.ZipFile(self.archive_path, "w").close()
+
+        manifest = {"format": "zip", "complete": False, "entries": {}, "checkpoint": self._checkpoint()}
+        self._save_manifest(manifest)
+        return manifest
+
+
+    def _append(self, manifest, ids, wanted, locations, progress=None, cancel_event=None):
+        """
+        Appends songs to the archive, saving a checkpoint after every group of entries.
+
+        Args:
+            manifest (dict): The manifest of the archive, updated in place.
+            ids (list): IDs of the songs to append.
+            wanted (dict): The manifest entries of the songs.
+            locations (dict): The (backend, key) of the songs.
+            progress (callable): Called with the number of entries written and their total after each entry.
+            cancel_event (threading.Event): Stops appending when set.
+        """
+
+        manifest["complete"] = False
+        self._save_manifest(manifest)
+
+        for start in range(0, len(ids), self.checkpoint_every):
+            group = ids[start:start + self.checkpoint_every]
+
+            with zipfile.ZipFile(self.archive_path, "a", zipfile.ZIP_DEFLATED) as archive:
+                added = set(self.builder.add_entries(
+                    archive,
+                    [(wanted[id_song]["arcname"],) + locations[id_song] for id_song in group],
+                    progress and (lambda done, _, start=start: progress(start + done, len(ids))),
+                    cancel_event
+                ))
+
+            manifest["entries"].update(
+                {id_song: wanted[id_song] for id_song in group if wanted[id_song]["arcname"] in added}
+            )
+            manifest["checkpoint"] = self._checkpoint()
+            self._save_manifest(manifest)
+
+
+    def _rewrite(self, manifest, wanted, locations, progress=None, cancel_event=None):
+        """
+        Writes the archive again, next to the old one, which it replaces when complete. The unchanged entries are
+        copied from the old archive, the changed and new ones are read from storage.
+
+        The entries are written in groups, with a checkpoint of the new archive in manifest["rewrite"] after each
+        group, so an interrupted or cancelled rewrite is resumed by the next update (unless the entries already
+        written changed meanwhile, in which case it starts again).
+
+        Args:
+            manifest (dict): The manifest of the archive, updated in place.
+            wanted (dict): The manifest entries of the songs.
+            locations (dict): The (backend, key) of the songs.
+            progress (callable): Called with the number of entries written and their total after each entry.
+            cancel_event (threading.Event): Stops the rewrite when set, the old archive being kept.
+        """
+
+        current = manifest["entries"]
+        rewrite = manifest.get("rewrite")
+
+        if (rewrite is not None and os.path.exists(self.partial_path)
+                and all(wanted.get(id_song) == entry for id_song, entry in rewrite["entries"].items())):
+            print(f"Resuming the rewrite from {len(rewrite['entries'])} entries.")
+            self._restore(rewrite["checkpoint"], self.partial_path)
+        else:
+            zipfile.ZipFile(self.partial_path, "w").close()
+            rewrite = {"entries": {}, "checkpoint": self._checkpoint(self.partial_path)}
+            manifest["rewrite"] = rewrite
+            self._save_manifest(manifest)
+
+        ids = [id_song for id_song in wanted if id_song not in rewrite["entries"]]
+        written = len(wanted) - len(ids)
+
+        with zipfile.ZipFile(self.archive_path) as old_archive:
+            members = _ZipMembers(old_archive)
+
+            for start in range(0, len(ids), self.checkpoint_every):
+                group = ids[start:start + self.checkpoint_every]
+                entries = [
+                    (wanted[id_song]["arcname"], members, current[id_song]["arcname"])
+                    if current.get(id_song) == wanted[id_song]
+                    else (wanted[id_song]["arcname"],) + locations[id_song]
+                    for id_song in group
+                ]
+
+                with zipfile.ZipFile(self.partial_path, "a", zipfile.ZIP_DEFLATED) as archive:
+                    added = set(self.builder.add_entries(
+                        archive,
+                        entries,
+                        progress and (lambda done, _, start=start: progress(written + start + done, len(wanted))),
+                        cancel_event
+                    ))
+
+                rewrite["entries"].update(
+                    {id_song: wanted[id_song] for id_song in group if wanted[id_song]["arcname"] in added}
+                )
+                rewrite["checkpoint"] = self._checkpoint(self.partial_path)
+                self._save_manifest(manifest)
+
+        # Arhiva veche ramane valida pana in ultimul moment
+        os.replace(self.partial_path, self.archive_path)
+
+        manifest["entries"] = manifest.pop("rewrite")["entries"]
+        manifest["checkpoint"] = self._checkpoint()
+        self._save_manifest(manifest)
+
+
+    def _checkpoint(self, path=None):
+        """
+        Records the current end of the entries of the archive and the central directory that follows them.
+
+        Args:
+            path (str): Path of the archive, by default the save list (the new archive during a rewrite).
+
+        Returns:
+            dict: The "offset" of the central directory and the "tail" of the archive, base64 encoded.
+        """
+
+        path = path or self.archive_path
+
+        with zipfile.ZipFile(path) as archive:
+            offset = archive.start_dir
+
+        with open(path, "rb") as file:
+            file.seek(offset)
+            return {"offset": offset, "tail": base64.b64encode(file.read()).decode("ascii")}
+
+
+    def _restore(self, checkpoint, path=None):
+        """
+        Brings an interrupted archive back to its last checkpoint: what was written after the last
+        checkpointed entry is dropped and the central directory saved with it is put back.
+
+        Args:
+            checkpoint (dict): The checkpoint, from the manifest.
+            path (str): Path of the archive, by default the save list.
+        """
+
+        with open(path or self.archive_path, "r+b") as file:
+            file.truncate(checkpoint["offset"])
+            file.seek(checkpoint["offset"])
+            file.write(base64.b64decode(checkpoint["tail"]))
+
+
+    def _load_manifest(self):
+        """
+        Reads the manifest of the archive.
+
+        Returns:
+            dict: The manifest, or None if the archive or the manifest doesn't exist.
+        """
+
+        if not os.path.exists(self.archive_path) or not os.path.exists(self.manifest_path):
+            return None
+
+        with open(self.manifest_path) as file:
+            return json.load(file)
+
+
+    def _save_manifest(self, manifest):
+        """
+        Writes the manifest of the archive, atomically.
+
+        Args:
+            manifest (dict): The manifest.
+        """
+
+        temp_path = self.manifest_path + ".tmp"
+
+        with open(temp_path, "w") as file:
+            json.dump(manifest, file, indent=2)
+            file.flush()
+            os.fsync(file.fileno())
+
+        os.replace(temp_path, self.manifest_path)
+
+
+class _ZipMembers(StorageBackend):
+    """
+    Exposes the files of an open ZIP archive as a read-only storage backend, keyed by their names.
+    """
+
+    def __init__(self, archive):
+        self._archive = archive
+
+
+    def stat(self, key):
+        try:
+            info = self._archive.getinfo(key)
+        except KeyError:
+            return None
+
+        return {"size": info.file_size, "mtime": time.mktime(info.date_time + (0, 0, -1))}
+
+
+    def open_stream(self, key):
+        try:
+            return self._archive.open(key)
+        except KeyError as e:
+            raise FileNotFoundError(f"File {key} does not exist in the archive.") from e
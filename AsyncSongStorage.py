@@ -0,0 +1,616 @@
+import asyncio
+import os
+from ArchiveBuilder import ArchiveBuilder, IncrementalArchive, detect_format, unique_arcname
+from BlobStore import BlobStore
+from ConnectionPool import DB_CONFIG
+from Journal import Journal
+from MetadataExtractor import MetadataExtractor, TECHNICAL_COLUMNS
+from SongQueries import LOCK_BLOBS, SONG_COLUMNS, build_assignments, build_stored_files, build_where
+from StorageBackend import LocalStorageBackend, ShardedLocalStorageBackend
+
+
+class AsyncSongStorage:
+    """
+    The asyncio counterpart of SongStorage, for programs running on an event loop: the same operations on the same
+    database and storage folder, without blocking the loop, so many of them can run concurrently.
+
+    The queries go through a pool of psycopg 3 async connections. The file operations (hashing, storage copies,
+    archives) run in threads with asyncio.to_thread. Requires psycopg and psycopg_pool.
+
+    Use it as `async with AsyncSongStorage() as storage:`, or call open and close.
+    """
+
+    def __init__(self, pool=None, min_size=1, max_size=10, cache=None, backend=None, extractor=None, journal=None,
+                 **config):
+        """
+        Initialize the AsyncSongStorage class, without connecting to the database yet.
+
+        Args:
+            pool (AsyncConnectionPool): Pool used for the database connections, created if not provided.
+            min_size (int): Minimum size of the created pool.
+            max_size (int): Maximum size of the created pool.
+            cache (SongCache): Optional cache of the songs metadata and of the recent searches.
+            backend (StorageBackend): Where the song files are stored, by default sharded subdirectories of
+                the storage folder.
+            extractor (MetadataExtractor): Reads the tags and the technical data of the added files.
+            journal (Journal): Write-ahead journal of the file operations, recovered when the storage is opened.
+            **config: Connection parameters overriding the ones from DB_CONFIG.
+
+        Raises:
+            ImportError: If psycopg or psycopg_pool isn't installed.
+        """
+
+        try:
+            from psycopg.conninfo import make_conninfo
+            from psycopg_pool import AsyncConnectionPool
+        except ImportError as e:
+            raise ImportError(
+                "AsyncSongStorage requires psycopg 3 (pip install \"psycopg[binary]\" psycopg_pool)."
+            ) from e
+
+        self.STORAGE_PATH = "Storage"
+        self.backend = backend or ShardedLocalStorageBackend(self.STORAGE_PATH)
+        self.blob_store = BlobStore(self.backend)
+        # Melodiile adaugate inainte de stocarea dupa continut, pastrate dupa nume
+        self.legacy_backend = LocalStorageBackend(self.STORAGE_PATH)
+        self._owns_pool = pool is None
+
+        if self._owns_pool:
+            settings = {**DB_CONFIG, **config}
+            settings["dbname"] = settings.pop("database")  # Numele folosit de libpq
+            # Textul e decodat ca la psycopg2 si pe serverele SQL_ASCII, unde psycopg 3 ar intoarce bytes
+            settings.setdefault("client_encoding", "utf8")
+            self.pool = AsyncConnectionPool(
+                make_conninfo(**settings), min_size=min_size, max_size=max_size, open=False
+            )
+        else:
+            self.pool = pool
+
+        self.cache = cache
+        self.extractor = extractor or MetadataExtractor()
+        self.journal = journal or Journal()
+
+
+    async def open(self):
+        """
+        Opens the connection pool, waiting for its first connections, and recovers the file operations left
+        unfinished by a crash.
+        """
+
+        if self._owns_pool:
+            await self.pool.open(wait=True)
+
+        if self.journal.has_leftovers():
+            await self.recover()
+
+
+    async def recover(self):
+        """
+        Completes or rolls back the file operations left unfinished by a crash, see SongStorage.recover.
+
+        Returns:
+            int: Number of unfinished operations found.
+        """
+
+        loop = asyncio.get_running_loop()
+
+        def resolve(keys):
+            """
+            Runs _resolve_files on the event loop, for the journal reading the files on a thread.
+
+            Args:
+                keys (list): (store, key) pairs.
+            """
+
+            asyncio.run_coroutine_threadsafe(self._resolve_files(keys), loop).result()
+
+        found = await asyncio.to_thread(self.journal.recover, resolve)
+
+        if found:
+            print(f"{found} unfinished file operations have been recovered.")
+
+        return found
+
+
+    async def _resolve_files(self, keys):
+        """
+        Keeps the files of the given keys that the database uses and removes the others.
+
+        Args:
+            keys (list): (store, key) pairs, store being "blobs" or "legacy".
+        """
+
+        blob_keys = [key for store, key in keys if store == "blobs"]
+        legacy_keys = [key for store, key in keys if store == "legacy"]
+
+        async with self.pool.connection() as conn:
+            # Randurile ramase fara melodii (adaugari anulate) sunt sterse odata cu fisierele lor
+            await conn.execute('''DELETE FROM blobs WHERE content_hash = ANY(%s) AND refcount <= 0''', (blob_keys,))
+            cursor = await conn.execute('''SELECT content_hash FROM blobs WHERE content_hash = ANY(%s)''', (blob_keys,))
+            used = {row[0] for row in await cursor.fetchall()}
+
+            cursor = await conn.execute(
+                '''SELECT file_name FROM songs WHERE content_hash IS NULL AND file_name = ANY(%s)''',
+                (legacy_keys,)
+            )
+            used.update(("legacy", row[0]) for row in await cursor.fetchall())
+
+        for key in blob_keys:
+            if key not in used and await self._delete_blob(key):
+                print(f"File {key} of an unfinished operation has been removed from storage folder.")
+
+        for key in legacy_keys:
+            if ("legacy", key) not in used and await asyncio.to_thread(self.legacy_backend.delete, key):
+                print(f"File {key} of an unfinished operation has been removed from storage folder.")
+
+
+    async def close(self):
+        """
+        Closes the connection pool, if it was created by this instance.
+        """
+
+        if self._owns_pool:
+            await self.pool.close()
+
+        self.journal.close()
+
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+
+    async def _fetch(self, query, values=(), one=False):
+        """
+        Runs a query on a connection of the pool and commits it.
+
+        Args:
+            query (str): The query.
+            values (tuple): Its parameters.
+            one (bool): Whether to return only the first row.
+
+        Returns:
+            list or tuple: The rows, or the first row (None if there is none).
+        """
+
+        async with self.pool.connection() as conn:
+            cursor = await conn.execute(query, values)
+
+            if cursor.description is None:
+                return None
+
+            return await cursor.fetchone() if one else await cursor.fetchall()
+
+
+    async def get_song(self, id_song):
+        """
+        Gets a song by its ID, from the cache if possible.
+
+        Args:
+            id_song (int): ID of the song.
+
+        Returns:
+            tuple: The song record or None if there is no song with this ID.
+        """
+
+        if self.cache:
+            song = self.cache.get_song(id_song)
+            if song is not None:
+                return song
+
+        song = await self._fetch(f'''SELECT {SONG_COLUMNS} FROM songs WHERE id = %s''', (id_song,), one=True)
+
+        if song and self.cache:
+            self.cache.put_song(song)
+
+        return song
+
+
+    async def add_song(self, file_path, *metadata):
+        """
+        Adds a song file to the storage folder and its metadata to the database.
+        The file is stored by the hash of its content and the empty metadata is read from its tags, as in
+        SongStorage.add_song.
+
+        Args:
+            file_path (str): Song file path.
+            metadata (tuple): A tuple containing artist, song_name, release_date and tags information, None or
+                empty for the ones to be read from the file.
+
+        Returns:
+            int: ID of the added song.
+
+        Raises:
+            ValueError: If not all metadata has been provided, the artist or the song name is missing from both
+                the arguments and the file, or the song already exists in database.
+            Exception: If there are errors during copying the song file into storage folder or database operations.
+        """
+
+        if len(metadata) != 4:
+            raise ValueError("Expected 4 metadata arguments: artist, song_name, release_date, and tags.")
+
+        extracted = await asyncio.to_thread(self.extractor.extract, file_path)
+        artist, song_name, release_date, tags = self.extractor.complete(metadata, extracted)
+
+        if not artist or not song_name:
+            raise ValueError("The artist and the song name must be provided when the file has no tags for them.")
+
+        file_name = os.path.basename(file_path)
+        content_hash, size = await asyncio.to_thread(self.blob_store.hash_file, file_path)
+
+        # Exista deja o melodie cu acelasi continut si aceleasi date
+        existing_song = await self._fetch(
+            '''SELECT 1 FROM songs WHERE content_hash = %s AND artist = %s AND song_name = %s LIMIT 1''',
+            (content_hash, artist, song_name),
+            one=True
+        )
+
+        if existing_song:
+            raise ValueError(f"A song with the same data already exists in the database.")
+
+        # Daca procesul cade inainte de INSERT, fisierul copiat e sters la recuperare
+        entry = await asyncio.to_thread(self.journal.begin, "add", [("blobs", content_hash)])
+
+        async with self.pool.connection() as conn:
+            # Fisierul gasit in storage nu poate fi sters de o stergere concurenta pana la INSERT,
+            # vezi SongStorage._lock_blobs
+            await conn.execute(LOCK_BLOBS, ([content_hash],))
+
+            try:
+                _, copied = await asyncio.to_thread(self.blob_store.put, file_path, content_hash)
+                if copied:
+                    print(f"File {file_name} copied successfully to storage as {content_hash}.")
+                else:
+                    print(f"File {file_name} is already in storage folder.")
+            except Exception as e:
+                print(f"Error while adding the song {file_name} into storage folder: {e}.")
+                raise
+
+            try:
+                await conn.execute(
+                    '''INSERT INTO blobs (content_hash, size) VALUES (%s, %s) ON CONFLICT (content_hash) DO NOTHING''',
+                    (content_hash, size)
+                )
+                cursor = await conn.execute(
+                    f'''
+                    INSERT INTO songs (file_name, artist, song_name, release_date, tags, content_hash,
+                                       {', '.join(TECHNICAL_COLUMNS)})
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    RETURNING {SONG_COLUMNS};
+                    ''',
+                    (file_name, artist, song_name, release_date, tags, content_hash)
+                    + tuple(extracted.get(column) for column in TECHNICAL_COLUMNS)
+                )
+
+                song = await cursor.fetchone()
+                song_id = song[0]
+            except Exception as e:
+                print(f"Error while adding the song {file_name} into database: {e}.")
+
+                if copied:
+                    await asyncio.to_thread(self.blob_store.delete, content_hash)
+                raise
+
+        if self.cache:
+            self.cache.song_added(song)
+
+        self.journal.done(entry)
+        print(f"Song added successfully with ID: {song_id}.")
+        return song_id
+
+
+    async def _delete_blob(self, content_hash):
+        """
+        Removes a stored content no song uses, under its lock, unless a song added meanwhile uses it again
+        (see SongStorage._delete_blob).
+
+        Args:
+            content_hash (str): SHA-256 hex digest of the content.
+
+        Returns:
+            bool: True if the file was removed.
+        """
+
+        async with self.pool.connection() as conn:
+            await conn.execute(LOCK_BLOBS, ([content_hash],))
+            cursor = await conn.execute('''SELECT 1 FROM blobs WHERE content_hash = %s''', (content_hash,))
+
+            if await cursor.fetchone() is not None:
+                return False
+
+            return await asyncio.to_thread(self.blob_store.delete, content_hash)
+
+
+    async def delete_song(self, id_song):
+        """
+        Deletes a song file from storage file and its metadata from database.
+        The song is identified by its ID. The file is kept while other songs have the same content.
+
+        Args:
+            id_song (int): ID of the song to delete.
+
+        Raises:
+            ValueError: If the song ID doesn't exist in the database.
+            FileNotFoundError: If the song file doesn't exist in the storage folder.
+            Exception: If there are errors during deleting the song file from storage folder or database operations.
+        """
+
+        row = await self._fetch('''SELECT file_name, content_hash FROM songs WHERE id = %s''', (id_song,), one=True)
+
+        if not row:
+            raise ValueError(f"No song found with ID: {id_song}")
+
+        file_name, content_hash = row
+        backend, key = self._locate(file_name, content_hash)
+
+        if not await asyncio.to_thread(backend.exists, key):
+            raise FileNotFoundError(f"File {file_name} does not exist in storage folder.")
+
+        renditions = [row[0] for row in await self._fetch(
+            '''SELECT content_hash FROM renditions WHERE song_id = %s''', (id_song,)
+        )]
+
+        # Daca procesul cade dupa DELETE, fisierele ramase fara melodii sunt sterse la recuperare
+        entry = await asyncio.to_thread(
+            self.journal.begin,
+            "delete",
+            [("blobs" if content_hash else "legacy", key)] + [("blobs", rendition) for rendition in renditions]
+        )
+
+        try:
+            async with self.pool.connection() as conn:
+                await conn.execute('''DELETE FROM songs WHERE id = %s''', (id_song,))
+
+                # Fisierul e sters doar daca nicio alta melodie nu il mai foloseste
+                cursor = await conn.execute(
+                    '''DELETE FROM blobs WHERE content_hash = %s AND refcount <= 0 RETURNING content_hash''',
+                    (content_hash,)
+                )
+                unreferenced = await cursor.fetchone() is not None or content_hash is None
+
+                # Fisierele convertite sunt sterse odata cu melodia (in cascada)
+                cursor = await conn.execute(
+                    '''DELETE FROM blobs WHERE content_hash = ANY(%s) AND refcount <= 0 RETURNING content_hash''',
+                    (renditions,)
+                )
+                unreferenced_renditions = [row[0] for row in await cursor.fetchall()]
+
+            if self.cache:
+                self.cache.song_deleted(id_song)
+
+            print(f"Song successfully deleted with ID: {id_song}.")
+        except Exception as e:
+            print(f"Error while deleting song with ID: {id_song} : {e}.")
+            raise
+
+        if unreferenced:
+            try:
+                # Fisierele dupa continut sunt sterse sub lacatul lor, daca nu au fost adaugate din nou
+                if content_hash is None:
+                    removed = await asyncio.to_thread(backend.delete, key)
+                else:
+                    removed = await self._delete_blob(content_hash)
+
+                if removed:
+                    print(f"File {file_name} has been removed from storage folder.")
+            except Exception as e:
+                print(f"Error deleting the file from storage folder: {file_name}: {e}.")
+                raise
+
+        for rendition_hash in unreferenced_renditions:
+            try:
+                await self._delete_blob(rendition_hash)
+            except Exception as e:
+                print(f"Error deleting a rendition of {file_name} from storage folder: {e}.")
+
+        self.journal.done(entry)
+
+
+    def _locate(self, file_name, content_hash):
+        """
+        Gets where the file of a song is stored.
+
+        Args:
+            file_name (str): Name of the song file.
+            content_hash (str): Hash of the song content, None for the songs stored by name.
+
+        Returns:
+            tuple: The storage backend holding the file and the key of the file.
+        """
+
+        if content_hash:
+            return self.backend, content_hash
+
+        return self.legacy_backend, file_name
+
+
+    async def modify_data(self, id_song, **metadata):
+        """
+        Modifies the metadata of a song existing in the database.
+        The song is identified by its ID.
+
+        Args:
+            id_song (int): ID of the song to modify.
+            **metadata: Key-value pairs representing the fields to update and their new values; add_tags and
+                remove_tags change the tags as in SongStorage.modify_many.
+
+        Raises:
+             ValueError: If in the database isn't a song with the specified ID, or a column can't be modified.
+             Exception: If an error occurs during the database operation.
+        """
+
+        clauses = []
+        values = []
+
+        # Doar coloanele permise ajung in SQL
+        for column, expression, expression_values in build_assignments(metadata):
+            clauses.append(f"{column} = {expression}")
+            values.extend(expression_values)
+
+        if not clauses:
+            return
+
+        values.append(id_song)
+
+        query = f"UPDATE songs SET {', '.join(clauses)} WHERE id = %s RETURNING id"
+        try:
+            # RETURNING spune daca melodia exista, fara o interogare separata
+            if await self._fetch(query, tuple(values), one=True) is None:
+                raise ValueError(f"No song found with ID: {id_song}")
+
+            if self.cache:
+                self.cache.song_modified(id_song)
+
+            print(f"Song with ID: {id_song} succssfully modified.")
+        except Exception as e:
+            print(f"Error while modifying song with ID: {id_song} : {e}.")
+            raise
+
+
+    async def search(self, **criteria):
+        """
+        Searches for songs in the database that meet the criteria.
+
+        Args:
+            **criteria: Key-value pairs representing the criteria for searching process.
+
+        Returns:
+            list: A list of matching songs.
+
+        Raises:
+            Exception: If there are errors in the database operation or in the search process.
+        """
+
+        try:
+            where_clause, values = build_where(criteria)
+
+            query = f"SELECT {SONG_COLUMNS} FROM songs"
+            if where_clause:
+                query += f" WHERE {where_clause}"
+
+            if self.cache:
+                key = self.cache.search_key("search", **criteria)
+                results = self.cache.get_search(key)
+                if results is not None:
+                    return results
+
+            results = await self._fetch(query, tuple(values))
+
+            if self.cache:
+                self.cache.put_search(key, results)
+
+            if not results:
+                print("No songs match the criteria.")
+                return []
+
+            return results
+        except Exception as e:
+            print(f"Error while searching for songs: {e}")
+            raise
+
+
+    async def iter_search(self, itersize=2000, **criteria):
+        """
+        Searches for songs in the database that meet the criteria, streaming them from a server-side cursor
+        instead of loading all of them in memory.
+
+        Args:
+            itersize (int): Number of rows fetched from the database at a time.
+            **criteria: Key-value pairs representing the criteria for searching process.
+
+        Yields:
+            tuple: The matching songs, one at a time.
+        """
+
+        where_clause, values = build_where(criteria)
+
+        query = f"SELECT {SONG_COLUMNS} FROM songs"
+        if where_clause:
+            query += f" WHERE {where_clause}"
+        query += " ORDER BY id"
+
+        async with self.pool.connection() as conn:
+            async with conn.cursor(name="song_search") as cursor:
+                cursor.itersize = itersize
+                await cursor.execute(query, tuple(values))
+
+                async for song in cursor:
+                    yield song
+
+
+    async def get_all_songs(self):
+        """
+        Gets all songs stored into database.
+
+        Returns:
+            list: A list of song records from database.
+        """
+
+        return await self._fetch(f"SELECT {SONG_COLUMNS} FROM songs")
+
+
+    async def create_save_list(self, arhive_path, archive_format=None, compress_audio=False, incremental=False,
+                               progress=None, cancel_event=None, rendition=None, **criteria):
+        """
+        Create an archive containing the song files that meet the given criteria.
+        See SongStorage.create_save_list; the archive is written on a thread, so the loop keeps running.
+
+        Args:
+            arhive_path (str or file): Path to the archive, or a writable binary file-like object.
+            archive_format (str): "zip", "tar", "tar.gz", "tar.bz2", "tar.xz" or "tar.zst". By default it is
+                chosen by the extension of the archive path (ZIP for unknown extensions and file-like objects).
+            compress_audio (bool): Whether to compress the already compressed audio formats too.
+            incremental (bool): Whether to update an existing archive instead of rebuilding it. Only for ZIP
+                archive paths.
+            progress (callable): Called from the archive thread with the number of files written and their total.
+            cancel_event (threading.Event): Stops the archive when set.
+            rendition (str): Archive the renditions in this format (e.g. "ogg") instead of the originals, or
+                "smallest" for the smallest file of each song. The originals of the songs without a rendition
+                are archived.
+            **criteria: Key-value pairs representing the criteria for searching songs process.
+
+        Returns:
+            list: A list of file names that has been added to the archive.
+
+        Raises:
+            CancelledError: If the archive was cancelled.
+            Exception: If no songs match the criteria or an error occurs during the process.
+        """
+
+        try:
+            query, values = build_stored_files(rendition, criteria)
+            songs = await self._fetch(query, tuple(values))
+
+            if not songs:
+                print("No songs match the criteria.")
+                raise ValueError("No songs match the criteria.")
+
+            if archive_format is None:
+                archive_format = detect_format(arhive_path) if isinstance(arhive_path, str) else "zip"
+
+            builder = ArchiveBuilder(archive_format, compress_audio=compress_audio)
+
+            if incremental:
+                if not isinstance(arhive_path, (str, os.PathLike)):
+                    raise ValueError("An incremental save list must be written to a path.")
+
+                return await asyncio.to_thread(
+                    IncrementalArchive(arhive_path, builder).update,
+                    [(id_song, file_name) + self._locate(file_name, content_hash) + (content_hash,)
+                     for id_song, file_name, content_hash in songs],
+                    progress,
+                    cancel_event
+                )
+
+            names = set()
+            entries = [(unique_arcname(file_name, id_song, names),) + self._locate(file_name, content_hash)
+                       for id_song, file_name, content_hash in songs]
+
+            return await asyncio.to_thread(builder.build, entries, arhive_path, progress, cancel_event)
+        except Exception as e:
+            print(f"Error while creating the archive: {e}.")
+            raise
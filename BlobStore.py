@@ -0,0 +1,93 @@
+import hashlib
+from StorageBackend import CHUNK_SIZE
+
+
+class BlobStore:
+    """
+    A content-addressed store for the song files: every file is kept once, under the SHA-256 of its
+    content, in a storage backend.
+    """
+
+    def __init__(self, backend):
+        """
+        Initialize the store.
+
+        Args:
+            backend (StorageBackend): Backend holding the files, sharded by the hash if it is a ShardedLocalStorageBackend.
+        """
+
+        self.backend = backend
+
+
+    @staticmethod
+    def hash_file(file_path, chunk_size=CHUNK_SIZE):
+        """
+        Computes the SHA-256 of a file, reading it in chunks.
+
+        Args:
+            file_path (str): Path of the file.
+            chunk_size (int): Number of bytes read at a time.
+
+        Returns:
+            tuple: The hex digest of the content and the size of the file.
+        """
+
+        digest = hashlib.sha256()
+        size = 0
+
+        with open(file_path, "rb") as file:
+            while chunk := file.read(chunk_size):
+                digest.update(chunk)
+                size += len(chunk)
+
+        return digest.hexdigest(), size
+
+
+    def exists(self, content_hash):
+        """
+        Checks if a content is stored.
+
+        Args:
+            content_hash (str): SHA-256 hex digest of the content.
+
+        Returns:
+            bool: True if the content is stored.
+        """
+
+        return self.backend.exists(content_hash)
+
+
+    def put(self, file_path, content_hash=None):
+        """
+        Stores the content of a file, unless the same content is already stored.
+
+        Args:
+            file_path (str): Path of the file to store.
+            content_hash (str): SHA-256 hex digest of the file, computed if not provided.
+
+        Returns:
+            tuple: The hash of the content and True if the file was copied, False if the content was already stored.
+        """
+
+        if content_hash is None:
+            content_hash, _ = self.hash_file(file_path)
+
+        if self.backend.exists(content_hash):
+            return content_hash, False
+
+        self.backend.put(content_hash, file_path)
+        return content_hash, True
+
+
+    def delete(self, content_hash):
+        """
+        Removes a stored content.
+
+        Args:
+            content_hash (str): SHA-256 hex digest of the content.
+
+        Returns:
+            bool: True if the file was removed, False if it didn't exist.
+        """
+
+        return self.backend.delete(content_hash)
@@ -0,0 +1,174 @@
+import json
+import queue
+import select
+import threading
+import time
+
+CHANGE_CHANNEL = "songs_changed"
+
+
+class ChangeFeed:
+    """
+    The changes made to the songs table by any process, as announced by the table trigger on the songs_changed
+    channel: {"op": "INSERT" | "UPDATE" | "DELETE", "id": ...}.
+
+    A background thread listens on a dedicated connection and passes every change to the subscribers, reconnecting
+    if the connection is lost. The changes made while disconnected are missed, so after every (re)connection the
+    subscribers receive {"op": "RESYNC"}, meaning that anything they hold may be stale.
+    """
+
+    def __init__(self, pool, poll_timeout=1.0):
+        """
+        Initialize the feed, without starting it.
+
+        Args:
+            pool (ConnectionPool): Pool whose settings are used for the listening connection.
+            poll_timeout (float): Seconds between two checks of the stop request while no change arrives.
+        """
+
+        self.pool = pool
+        self.poll_timeout = poll_timeout
+
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._listener = None
+
+
+    def subscribe(self, callback):
+        """
+        Registers a function called with every change. It is called on the listener thread, so it must be quick
+        and thread-safe.
+
+        Args:
+            callback (callable): Receives the change dict.
+
+        Returns:
+            callable: The callback, to be passed to unsubscribe.
+        """
+
+        with self._lock:
+            self._subscribers.append(callback)
+
+        return callback
+
+
+    def unsubscribe(self, callback):
+        """
+        Removes a function registered with subscribe.
+
+        Args:
+            callback (callable): The callback.
+        """
+
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+
+    def iter_changes(self, timeout=None):
+        """
+        Yields the changes as they arrive, the feed being started if needed.
+
+        Args:
+            timeout (float): Seconds without changes after which the iteration ends, None to never end.
+
+        Yields:
+            dict: The changes.
+        """
+
+        changes = queue.SimpleQueue()
+        callback = self.subscribe(changes.put)
+        self.start()
+
+        try:
+            while True:
+                try:
+                    yield changes.get(timeout=timeout)
+                except queue.Empty:
+                    return
+        finally:
+            self.unsubscribe(callback)
+
+
+    def start(self):
+        """
+        Starts the listener thread, unless it is already running.
+        """
+
+        if self._listener is not None:
+            return
+
+        self._stop.clear()
+        self._listener = threading.Thread(target=self._listen, daemon=True)
+        self._listener.start()
+
+
+    def stop(self):
+        """
+        Stops the listener thread.
+        """
+
+        self._stop.set()
+
+        if self._listener is not None:
+            self._listener.join()
+            self._listener = None
+
+
+    def _publish(self, change):
+        """
+        Passes a change to the subscribers.
+
+        Args:
+            change (dict): The change.
+        """
+
+        with self._lock:
+            subscribers = list(self._subscribers)
+
+        for callback in subscribers:
+            try:
+                callback(change)
+            except Exception as e:
+                print(f"Error while handling a song change: {e}.")
+
+
+    def _listen(self):
+        """
+        Body of the listener thread, reconnecting if the connection is lost.
+        """
+
+        while not self._stop.is_set():
+            try:
+                conn = self.pool.dedicated_connection()
+
+                try:
+                    with conn.cursor() as cursor:
+                        cursor.execute(f"LISTEN {CHANGE_CHANNEL};")
+
+                    # Notificarile pierdute cat timp nu am fost conectati
+                    self._publish({"op": "RESYNC"})
+
+                    while not self._stop.is_set():
+                        if select.select([conn], [], [], self.poll_timeout) == ([], [], []):
+                            continue
+
+                        conn.poll()
+                        while conn.notifies:
+                            payload = conn.notifies.pop(0).payload
+
+                            # O notificare stricata (trimisa de mana cu NOTIFY) e sarita, nu opreste firul
+                            try:
+                                change = json.loads(payload)
+                            except ValueError as e:
+                                print(f"Error while reading the song change {payload!r}: {e}.")
+                                continue
+
+                            self._publish(change)
+                finally:
+                    conn.close()
+            except Exception as e:
+                # Orice eroare neasteptata duce la o reconectare, nu la oprirea firului
+                print(f"Error while listening for song changes: {e}.")
+                time.sleep(1)
@@ -0,0 +1,223 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+import psycopg2
+from psycopg2 import pool
+
+# Datele de conectare pot fi suprascrise prin variabile de mediu
+DB_CONFIG = {
+    "database": os.environ.get("SONGSTORAGE_DB_NAME", "SongStorage"),
+    "user": os.environ.get("SONGSTORAGE_DB_USER", "postgres"),
+    "password": os.environ.get("SONGSTORAGE_DB_PASSWORD", "password"),
+    "host": os.environ.get("SONGSTORAGE_DB_HOST", "localhost"),
+    "port": os.environ.get("SONGSTORAGE_DB_PORT", "5432"),
+}
+
+_shared_pool = None
+_shared_pool_lock = threading.Lock()
+
+
+class ConnectionPool:
+    """
+    A thread safe pool of PostgreSQL connections shared by SongStorage instances and the database bootstrap.
+
+    Connections are checked before being handed out and are reopened if the server closed them, so a restart
+    of the database doesn't break the long living users of the pool.
+    """
+
+    def __init__(self, minconn=1, maxconn=10, health_check_interval=30, retries=3, **config):
+        """
+        Initialize the pool, opening the minimum number of connections.
+
+        Args:
+            minconn (int): Number of connections opened when the pool is created.
+            maxconn (int): Maximum number of connections opened at the same time.
+            health_check_interval (float): Seconds a connection can stay idle before it is checked with a query.
+            retries (int): Number of attempts to obtain a working connection.
+            **config: Connection parameters overriding the ones from DB_CONFIG.
+        """
+
+        self.config = {**DB_CONFIG, **config}
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.health_check_interval = health_check_interval
+        self.retries = retries
+
+        self._pool = pool.ThreadedConnectionPool(minconn, maxconn, **self.config)
+        # ThreadedConnectionPool arunca eroare cand e plin, semaforul face apelantii sa astepte
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._last_used = {}
+
+
+    def _is_healthy(self, conn):
+        """
+        Checks if a connection can still be used.
+
+        Args:
+            conn (connection): The connection to check.
+
+        Returns:
+            bool: True if the connection is usable.
+        """
+
+        if conn.closed:
+            return False
+
+        if time.monotonic() - self._last_used.get(id(conn), 0) < self.health_check_interval:
+            return True
+
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+
+    def _checkout(self):
+        """
+        Takes a healthy connection from the pool, replacing the broken ones.
+
+        Returns:
+            connection: A usable connection.
+
+        Raises:
+            psycopg2.OperationalError: If no working connection could be obtained.
+        """
+
+        error = None
+
+        for attempt in range(self.retries):
+            try:
+                conn = self._pool.getconn()
+            except psycopg2.OperationalError as e:
+                error = e
+                print(f"Error while connecting to the database (attempt {attempt + 1}): {e}.")
+                time.sleep(0.1 * 2 ** attempt)
+                continue
+
+            if self._is_healthy(conn):
+                return conn
+
+            print("Dropping a broken database connection.")
+            self._last_used.pop(id(conn), None)
+            self._pool.putconn(conn, close=True)
+
+        raise psycopg2.OperationalError(f"Could not obtain a database connection: {error}")
+
+
+    @contextmanager
+    def connection(self, autocommit=False):
+        """
+        Lends a connection from the pool. The transaction is committed when the block ends
+        and rolled back if an exception is raised.
+
+        Args:
+            autocommit (bool): Whether the connection should be used in autocommit mode.
+
+        Yields:
+            connection: A psycopg2 connection.
+        """
+
+        with self._slots:
+            conn = self._checkout()
+
+            try:
+                conn.autocommit = autocommit
+                yield conn
+
+                if not autocommit:
+                    conn.commit()
+            except BaseException:
+                if not conn.closed:
+                    try:
+                        conn.rollback()
+                    except psycopg2.Error:
+                        pass
+                raise
+            finally:
+                broken = bool(conn.closed)
+                if broken:
+                    self._last_used.pop(id(conn), None)
+                else:
+                    self._last_used[id(conn)] = time.monotonic()
+                self._pool.putconn(conn, close=broken)
+
+
+    @contextmanager
+    def cursor(self, autocommit=False):
+        """
+        Lends a cursor on a pooled connection, inside a transaction.
+
+        Args:
+            autocommit (bool): Whether the connection should be used in autocommit mode.
+
+        Yields:
+            cursor: A psycopg2 cursor.
+        """
+
+        with self.connection(autocommit) as conn:
+            with conn.cursor() as cursor:
+                yield cursor
+
+
+    def dedicated_connection(self):
+        """
+        Opens a connection outside the pool, with the same parameters, for long living uses
+        (such as LISTEN) that would otherwise keep a pooled connection busy forever.
+
+        Returns:
+            connection: A new psycopg2 connection in autocommit mode, closed by the caller.
+        """
+
+        conn = psycopg2.connect(**self.config)
+        conn.autocommit = True
+        return conn
+
+
+    def closeall(self):
+        """
+        Closes all the connections of the pool.
+        """
+
+        self._pool.closeall()
+        self._last_used.clear()
+
+
+def get_pool(minconn=None, maxconn=None):
+    """
+    Gets the pool shared by the whole process, creating it on first use.
+
+    Args:
+        minconn (int): Minimum size of the pool, read from SONGSTORAGE_POOL_MIN if not provided.
+        maxconn (int): Maximum size of the pool, read from SONGSTORAGE_POOL_MAX if not provided.
+
+    Returns:
+        ConnectionPool: The shared pool.
+    """
+
+    global _shared_pool
+
+    with _shared_pool_lock:
+        if _shared_pool is None:
+            _shared_pool = ConnectionPool(
+                minconn=minconn or int(os.environ.get("SONGSTORAGE_POOL_MIN", 1)),
+                maxconn=maxconn or int(os.environ.get("SONGSTORAGE_POOL_MAX", 10))
+            )
+
+        return _shared_pool
+
+
+def close_pool():
+    """
+    Closes the shared pool, if it was created.
+    """
+
+    global _shared_pool
+
+    with _shared_pool_lock:
+        if _shared_pool is not None:
+            _shared_pool.closeall()
+            _shared_pool = None
@@ -1,65 +1,309 @@
-import psycopg2
-
-# Realizare conexiunii
-conn = psycopg2.connect(
-    database="postgres", # Baza de date implicita
-    user='postgres',
-    password='password',
-    host='localhost',
-    port='5432'
-)
-
-conn.autocommit = True
-cursor = conn.cursor()
-
-cursor.execute("SELECT 1 FROM pg_catalog.pg_database WHERE datname = 'SongStorage'")
-exists = cursor.fetchone()
-
-if not exists:
-    cursor.execute('CREATE DATABASE "SongStorage";')
-    print("Database 'SongStorage' has been created successfully!")
-else:
-    print("Database 'SongStorage' already exists.")
-
-cursor.close()
-conn.close()
-
-
-db_conn = psycopg2.connect(
-    database="SongStorage",
-    user='postgres',
-    password='password',
-    host='localhost',
-    port='5432'
-)
-
-db_conn.autocommit = True
-db_cursor = db_conn.cursor()
-
-db_cursor.execute('''
-       SELECT EXISTS (
-           SELECT 1
-           FROM information_schema.tables
-           WHERE table_name = 'songs'
-       );
-   ''')
-table_exists = db_cursor.fetchone()[0]
-
-if not table_exists:
-    db_cursor.execute('''
-        CREATE TABLE songs (
-            id SERIAL PRIMARY KEY,
-            file_name VARCHAR(255) NOT NULL UNIQUE,
-            artist VARCHAR(255) NOT NULL,
-            song_name VARCHAR(255) NOT NULL,
-            release_date DATE,
-            tags TEXT[]
-        );
-    ''')
-    print("Table 'songs' has been created successfully!")
-else:
-    print("Table 'songs' already exists.")
-
-db_cursor.close()
-db_conn.close()
+import threading
+import weakref
+from psycopg2 import sql
+from ConnectionPool import ConnectionPool, DB_CONFIG, get_pool
 
+# Pool-urile a caror schema a fost deja verificata in acest proces
+_checked_pools = weakref.WeakSet()
+_check_lock = threading.Lock()
+
+# Migrarile schemei, aplicate o singura data, in ordinea versiunii
+MIGRATIONS = [
+    (1, "Indexes for the search criteria", [
+        "CREATE INDEX IF NOT EXISTS songs_artist_idx ON songs (artist);",
+        "CREATE INDEX IF NOT EXISTS songs_song_name_idx ON songs (song_name);",
+        "CREATE INDEX IF NOT EXISTS songs_release_date_idx ON songs (release_date);",
+        "CREATE INDEX IF NOT EXISTS songs_tags_idx ON songs USING GIN (tags);",
+        # Extensia fisierului, ca sa nu fie nevoie de LIKE '%.ext'
+        r"""ALTER TABLE songs ADD COLUMN IF NOT EXISTS format TEXT
+               GENERATED ALWAYS AS (lower(substring(file_name FROM '\.([^.]*)$'))) STORED;""",
+        "CREATE INDEX IF NOT EXISTS songs_format_idx ON songs (format);",
+    ]),
+    (2, "Full-text and fuzzy search", [
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm;",
+        "ALTER TABLE songs ADD COLUMN IF NOT EXISTS search_vector TSVECTOR;",
+        # Vectorul e actualizat de trigger doar pentru randurile modificate
+        """CREATE OR REPLACE FUNCTION songs_search_vector_update() RETURNS TRIGGER AS $$
+           BEGIN
+               NEW.search_vector :=
+                   setweight(to_tsvector('simple', coalesce(NEW.artist, '')), 'A') ||
+                   setweight(to_tsvector('simple', coalesce(NEW.song_name, '')), 'A') ||
+                   setweight(to_tsvector('simple', coalesce(array_to_string(NEW.tags, ' '), '')), 'B');
+               RETURN NEW;
+           END
+           $$ LANGUAGE plpgsql;""",
+        "DROP TRIGGER IF EXISTS songs_search_vector_trigger ON songs;",
+        """CREATE TRIGGER songs_search_vector_trigger
+           BEFORE INSERT OR UPDATE OF artist, song_name, tags ON songs
+           FOR EACH ROW EXECUTE FUNCTION songs_search_vector_update();""",
+        """UPDATE songs SET search_vector =
+               setweight(to_tsvector('simple', coalesce(artist, '')), 'A') ||
+               setweight(to_tsvector('simple', coalesce(song_name, '')), 'A') ||
+               setweight(to_tsvector('simple', coalesce(array_to_string(tags, ' '), '')), 'B');""",
+        "CREATE INDEX IF NOT EXISTS songs_search_vector_idx ON songs USING GIN (search_vector);",
+        "CREATE INDEX IF NOT EXISTS songs_artist_trgm_idx ON songs USING GIN (artist gin_trgm_ops);",
+        "CREATE INDEX IF NOT EXISTS songs_song_name_trgm_idx ON songs USING GIN (song_name gin_trgm_ops);",
+    ]),
+    (3, "Change notifications", [
+        # Fiecare modificare e anuntata pe canalul songs_changed, ca {"op": ..., "id": ...}
+        """CREATE OR REPLACE FUNCTION songs_notify_change() RETURNS TRIGGER AS $$
+           BEGIN
+               IF TG_OP = 'DELETE' THEN
+                   PERFORM pg_notify('songs_changed', json_build_object('op', TG_OP, 'id', OLD.id)::TEXT);
+               ELSE
+                   PERFORM pg_notify('songs_changed', json_build_object('op', TG_OP, 'id', NEW.id)::TEXT);
+               END IF;
+               RETURN NULL;
+           END
+           $$ LANGUAGE plpgsql;""",
+        "DROP TRIGGER IF EXISTS songs_notify_change_trigger ON songs;",
+        """CREATE TRIGGER songs_notify_change_trigger
+           AFTER INSERT OR UPDATE OR DELETE ON songs
+           FOR EACH ROW EXECUTE FUNCTION songs_notify_change();""",
+    ]),
+    (4, "Content-addressed storage", [
+        """CREATE TABLE IF NOT EXISTS blobs (
+               content_hash CHAR(64) PRIMARY KEY,
+               size BIGINT NOT NULL,
+               refcount INTEGER NOT NULL DEFAULT 0,
+               created_at TIMESTAMP NOT NULL DEFAULT now()
+           );""",
+        # Melodiile vechi raman cu content_hash NULL si fisierul in Storage/<file_name>
+        "ALTER TABLE songs ADD COLUMN IF NOT EXISTS content_hash CHAR(64) REFERENCES blobs (content_hash);",
+        "CREATE INDEX IF NOT EXISTS songs_content_hash_idx ON songs (content_hash);",
+        # Numele fisierului devine doar o metadata
+        "ALTER TABLE songs DROP CONSTRAINT IF EXISTS songs_file_name_key;",
+        "CREATE INDEX IF NOT EXISTS songs_file_name_idx ON songs (file_name);",
+        # Numarul de melodii care folosesc fiecare fisier
+        """CREATE OR REPLACE FUNCTION songs_blob_refcount() RETURNS TRIGGER AS $$
+           BEGIN
+               IF TG_OP <> 'DELETE' AND NEW.content_hash IS NOT NULL THEN
+                   UPDATE blobs SET refcount = refcount + 1 WHERE content_hash = NEW.content_hash;
+               END IF;
+               IF TG_OP <> 'INSERT' AND OLD.content_hash IS NOT NULL THEN
+                   UPDATE blobs SET refcount = refcount - 1 WHERE content_hash = OLD.content_hash;
+               END IF;
+               RETURN NULL;
+           END
+           $$ LANGUAGE plpgsql;""",
+        "DROP TRIGGER IF EXISTS songs_blob_refcount_trigger ON songs;",
+        """CREATE TRIGGER songs_blob_refcount_trigger
+           AFTER INSERT OR DELETE OR UPDATE OF content_hash ON songs
+           FOR EACH ROW EXECUTE FUNCTION songs_blob_refcount();""",
+    ]),
+    (5, "Keyset pagination by column", [
+        # (coloana, id) da o ordine totala, paginile continua dupa ultimul rand fara OFFSET
+        "CREATE INDEX IF NOT EXISTS songs_file_name_id_idx ON songs (file_name, id);",
+        "CREATE INDEX IF NOT EXISTS songs_artist_id_idx ON songs (artist, id);",
+        "CREATE INDEX IF NOT EXISTS songs_song_name_id_idx ON songs (song_name, id);",
+        "CREATE INDEX IF NOT EXISTS songs_release_date_id_idx ON songs (release_date, id);",
+        # Indexurile compuse le acopera si pe cele pe o singura coloana
+        "DROP INDEX IF EXISTS songs_file_name_idx;",
+        "DROP INDEX IF EXISTS songs_artist_idx;",
+        "DROP INDEX IF EXISTS songs_song_name_idx;",
+        "DROP INDEX IF EXISTS songs_release_date_idx;",
+    ]),
+    (6, "Technical audio metadata", [
+        # Citite din fisier la adaugare, ca sa poata fi cautate fara a redeschide fisierele
+        "ALTER TABLE songs ADD COLUMN IF NOT EXISTS duration REAL;",  # Secunde
+        "ALTER TABLE songs ADD COLUMN IF NOT EXISTS bitrate INTEGER;",  # Biti pe secunda
+        "ALTER TABLE songs ADD COLUMN IF NOT EXISTS sample_rate INTEGER;",  # Hz
+        "ALTER TABLE songs ADD COLUMN IF NOT EXISTS codec TEXT;",
+        "CREATE INDEX IF NOT EXISTS songs_duration_idx ON songs (duration);",
+        "CREATE INDEX IF NOT EXISTS songs_codec_idx ON songs (codec);",
+    ]),
+    (7, "Renditions and loudness", [
+        "ALTER TABLE songs ADD COLUMN IF NOT EXISTS loudness REAL;",  # LUFS (EBU R128)
+        "ALTER TABLE songs ADD COLUMN IF NOT EXISTS peak REAL;",  # dBFS
+        # Fisierele convertite ale melodiilor, cate unul pe format
+        """CREATE TABLE IF NOT EXISTS renditions (
+               song_id INTEGER NOT NULL REFERENCES songs (id) ON DELETE CASCADE,
+               format TEXT NOT NULL,
+               file_name VARCHAR(255) NOT NULL,
+               content_hash CHAR(64) NOT NULL REFERENCES blobs (content_hash),
+               codec TEXT,
+               bitrate INTEGER,
+               sample_rate INTEGER,
+               created_at TIMESTAMP NOT NULL DEFAULT now(),
+               PRIMARY KEY (song_id, format)
+           );""",
+        "CREATE INDEX IF NOT EXISTS renditions_content_hash_idx ON renditions (content_hash);",
+        # Fisierele convertite sunt numarate in blobs la fel ca originalele
+        "DROP TRIGGER IF EXISTS renditions_blob_refcount_trigger ON renditions;",
+        """CREATE TRIGGER renditions_blob_refcount_trigger
+           AFTER INSERT OR DELETE OR UPDATE OF content_hash ON renditions
+           FOR EACH ROW EXECUTE FUNCTION songs_blob_refcount();""",
+        # Originalul si fisierele convertite ale fiecarei melodii
+        """CREATE OR REPLACE VIEW song_renditions AS
+               SELECT s.id AS song_id, s.format, s.file_name, s.content_hash, s.codec, s.bitrate,
+                      s.sample_rate, b.size, TRUE AS original
+               FROM songs s LEFT JOIN blobs b ON b.content_hash = s.content_hash
+               UNION ALL
+               SELECT r.song_id, r.format, r.file_name, r.content_hash, r.codec, r.bitrate,
+                      r.sample_rate, b.size, FALSE AS original
+               FROM renditions r JOIN blobs b ON b.content_hash = r.content_hash;""",
+    ]),
+    (8, "Loudness attempts", [
+        # Melodiile a caror intensitate nu poate fi masurata nu sunt reluate la fiecare transcode_songs
+        "ALTER TABLE songs ADD COLUMN IF NOT EXISTS loudness_checked_at TIMESTAMP;",
+    ]),
+]
+
+
+def migrate(pool):
+    """
+    Applies the migrations from MIGRATIONS that weren't applied yet, each one in its own transaction.
+
+    Args:
+        pool (ConnectionPool): Pool of the SongStorage database.
+
+    Returns:
+        int: The schema version after the migrations.
+    """
+
+    with pool.cursor() as cursor:
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                description TEXT,
+                applied_at TIMESTAMP NOT NULL DEFAULT now()
+            );
+        ''')
+
+    version = 0
+
+    for migration_version, description, statements in MIGRATIONS:
+        with pool.cursor() as cursor:
+            # Doua bootstrap-uri pornite simultan nu aplica aceeasi migrare de doua ori
+            cursor.execute("SELECT pg_advisory_xact_lock(hashtext('songs_schema_version'))")
+            cursor.execute("SELECT 1 FROM schema_version WHERE version = %s", (migration_version,))
+
+            if not cursor.fetchone():
+                for statement in statements:
+                    cursor.execute(statement)
+
+                cursor.execute(
+                    "INSERT INTO schema_version (version, description) VALUES (%s, %s)",
+                    (migration_version, description)
+                )
+                print(f"Migration {migration_version} ({description}) has been applied successfully!")
+
+        version = migration_version
+
+    return version
+
+def create_database():
+    """
+    Creates the SongStorage database if it doesn't exist, connecting to the default postgres database.
+    """
+
+    # Realizare conexiunii la baza de date implicita
+    bootstrap_pool = ConnectionPool(minconn=1, maxconn=1, database="postgres")
+
+    try:
+        with bootstrap_pool.cursor(autocommit=True) as cursor:
+            database = DB_CONFIG["database"]
+            cursor.execute("SELECT 1 FROM pg_catalog.pg_database WHERE datname = %s", (database,))
+            exists = cursor.fetchone()
+
+            if not exists:
+                cursor.execute(sql.SQL("CREATE DATABASE {};").format(sql.Identifier(database)))
+                print(f"Database '{database}' has been created successfully!")
+            else:
+                print(f"Database '{database}' already exists.")
+    finally:
+        bootstrap_pool.closeall()
+
+
+def create_songs_table(pool):
+    """
+    Creates the songs table, as it was before the migrations, if it doesn't exist.
+
+    Args:
+        pool (ConnectionPool): Pool of the SongStorage database.
+    """
+
+    with pool.cursor() as db_cursor:
+        db_cursor.execute('''
+               SELECT EXISTS (
+                   SELECT 1
+                   FROM information_schema.tables
+                   WHERE table_name = 'songs'
+               );
+           ''')
+        table_exists = db_cursor.fetchone()[0]
+
+        if not table_exists:
+            db_cursor.execute('''
+                CREATE TABLE songs (
+                    id SERIAL PRIMARY KEY,
+                    file_name VARCHAR(255) NOT NULL UNIQUE,
+                    artist VARCHAR(255) NOT NULL,
+                    song_name VARCHAR(255) NOT NULL,
+                    release_date DATE,
+                    tags TEXT[]
+                );
+            ''')
+            print("Table 'songs' has been created successfully!")
+        else:
+            print("Table 'songs' already exists.")
+
+
+def schema_version(pool):
+    """
+    Gets the version of the schema.
+
+    Args:
+        pool (ConnectionPool): Pool of the SongStorage database.
+
+    Returns:
+        int: The version of the last applied migration, 0 if none was applied.
+    """
+
+    with pool.cursor() as cursor:
+        cursor.execute("SELECT to_regclass('schema_version') IS NOT NULL")
+
+        if not cursor.fetchone()[0]:
+            return 0
+
+        cursor.execute("SELECT coalesce(max(version), 0) FROM schema_version")
+        return cursor.fetchone()[0]
+
+
+def ensure_schema(pool):
+    """
+    Makes sure the schema is up to date, creating the songs table and applying the missing migrations.
+    The version is checked once per pool; the next calls in the process return at once.
+
+    Args:
+        pool (ConnectionPool): Pool of the SongStorage database.
+    """
+
+    if pool in _checked_pools:
+        return
+
+    with _check_lock:
+        if pool in _checked_pools:
+            return
+
+        if schema_version(pool) < MIGRATIONS[-1][0]:
+            create_songs_table(pool)
+            migrate(pool)
+
+        _checked_pools.add(pool)
+
+
+def bootstrap():
+    """
+    Creates the database and the songs table, then applies the migrations.
+    """
+
+    create_database()
+
+    pool = get_pool()
+    create_songs_table(pool)
+    print(f"Schema is at version {migrate(pool)}.")
+
+
+if __name__ == "__main__":
+    bootstrap()
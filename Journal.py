@@ -0,0 +1,241 @@
+import json
+import os
+import threading
+import uuid
+from StorageBackend import fsync_directory
+
+JOURNAL_DIR = "Journal"
+
+# Peste aceasta marime, jurnalul e rescris doar cu operatiile nefinalizate
+COMPACT_SIZE = 1024 * 1024
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+def _try_lock(file):
+    """
+    Takes the exclusive lock of a journal file, without waiting.
+
+    Args:
+        file (file): The open journal file.
+
+    Returns:
+        bool: True if the lock was taken, False if another process holds it.
+    """
+
+    try:
+        if fcntl is not None:
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            file.seek(0)
+            msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+
+class Journal:
+    """
+    A write-ahead journal of the file operations of SongStorage. The files being added or deleted are recorded
+    (and synced to disk) before they are touched, and marked as done once the database transaction deciding
+    their fate has committed. After a crash, the recovery looks only at the files of the unfinished operations:
+    the database says whether each one is still used, so the operation is completed or rolled back without
+    scanning the whole storage.
+
+    Every process writes its own journal file, locked while the process lives, so the recovery never touches
+    the operations of a running process.
+    """
+
+    def __init__(self, directory=JOURNAL_DIR):
+        """
+        Initialize the journal. Its file is created on the first operation.
+
+        Args:
+            directory (str): Folder of the journal files.
+        """
+
+        self.directory = directory
+        self._file = None
+        self._path = None
+        self._next_id = 0
+        self._pending = {}  # id -> inregistrarea operatiei
+        self._lock = threading.Lock()
+
+
+    def _open(self):
+        """
+        Creates and locks the journal file of this process.
+        """
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._path = os.path.join(self.directory, f"{os.getpid()}-{uuid.uuid4().hex[:8]}.journal")
+        self._file = open(self._path, "ab+")
+        _try_lock(self._file)
+        fsync_directory(self.directory)
+
+
+    def _write(self, record, sync):
+        """
+        Appends a record to the journal file.
+
+        Args:
+            record (dict): The record.
+            sync (bool): Whether to wait until the record is on disk.
+        """
+
+        if self._file is None:
+            self._open()
+
+        self._file.seek(0, os.SEEK_END)
+        self._file.write(json.dumps(record).encode() + b"\n")
+        self._file.flush()
+
+        if sync:
+            os.fsync(self._file.fileno())
+
+
+    def begin(self, operation, keys):
+        """
+        Records an operation before its files are touched.
+
+        Args:
+            operation (str): "add" or "delete".
+            keys (list): (store, key) pairs of the files, store being "blobs" for the content-addressed files or
+                "legacy" for the files stored by name.
+
+        Returns:
+            int: ID of the operation, to be passed to done.
+        """
+
+        with self._lock:
+            entry = self._next_id
+            self._next_id += 1
+            record = {"id": entry, "op": operation, "keys": [list(key) for key in keys]}
+            self._write(record, sync=True)
+            self._pending[entry] = record
+
+        return entry
+
+
+    def done(self, entry):
+        """
+        Marks an operation as finished. The mark isn't synced: if it is lost, the recovery checks the files of
+        the operation again and finds nothing to do. An operation that failed is left unfinished, so its files
+        are checked by the recovery after this process stops.
+
+        Args:
+            entry (int): ID of the operation, from begin.
+        """
+
+        with self._lock:
+            self._write({"id": entry, "done": True}, sync=False)
+            self._pending.pop(entry, None)
+
+            # Doar operatiile nefinalizate mai trebuie pastrate
+            if self._file.tell() > COMPACT_SIZE:
+                self._file.truncate(0)
+                for record in self._pending.values():
+                    self._write(record, sync=False)
+                os.fsync(self._file.fileno())
+
+
+    def close(self):
+        """
+        Closes the journal file, removing it if no operation is unfinished.
+        """
+
+        with self._lock:
+            if self._file is None:
+                return
+
+            self._file.close()
+            self._file = None
+
+            if not self._pending:
+                os.remove(self._path)
+
+
+    @staticmethod
+    def _read(file):
+        """
+        Reads the unfinished operations of a journal file.
+
+        Args:
+            file (file): The open journal file.
+
+        Returns:
+            list: The (operation, keys) pairs. A record cut by a crash is ignored, its operation wasn't started.
+        """
+
+        file.seek(0)
+        operations = {}
+
+        for line in file.read().splitlines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+
+            if record.get("done"):
+                operations.pop(record["id"], None)
+            else:
+                operations[record["id"]] = (record["op"], [tuple(key) for key in record["keys"]])
+
+        return list(operations.values())
+
+
+    def recover(self, resolve):
+        """
+        Finishes the unfinished operations of the journals left by the processes that stopped, then removes
+        those journals.
+
+        Args:
+            resolve (callable): Called with the (store, key) pairs of the files of the unfinished operations;
+                it keeps the files the database uses and removes the others.
+
+        Returns:
+            int: Number of unfinished operations found.
+        """
+
+        if not os.path.isdir(self.directory):
+            return 0
+
+        found = 0
+
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(".journal") or entry.path == self._path:
+                continue
+
+            with open(entry.path, "rb+") as file:
+                if not _try_lock(file):
+                    continue  # Procesul care il scrie ruleaza inca
+
+                operations = self._read(file)
+
+                if operations:
+                    resolve(sorted({key for _, keys in operations for key in keys}))
+                    found += len(operations)
+
+            os.remove(entry.path)
+
+        return found
+
+
+    def has_leftovers(self):
+        """
+        Checks cheaply, without reading them, if other journal files exist (left behind by a crash, or written
+        by running processes), for deciding at startup whether to recover.
+
+        Returns:
+            bool: True if there are other journal files.
+        """
+
+        try:
+            return any(entry.name.endswith(".journal") and entry.path != self._path
+                       for entry in os.scandir(self.directory))
+        except FileNotFoundError:
+            return False
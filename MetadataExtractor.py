@@ -0,0 +1,249 @@
+import contextlib
+import importlib.util
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+# Coloanele cu datele tehnice ale fisierului audio
+TECHNICAL_COLUMNS = ("duration", "bitrate", "sample_rate", "codec")
+
+# Codecul formatelor care nu il declara (MP4 il are in info.codec, de ex. "mp4a.40.2")
+CODECS = {
+    "MP3": "mp3",
+    "EasyMP3": "mp3",
+    "OggVorbis": "vorbis",
+    "OggOpus": "opus",
+    "OggFLAC": "flac",
+    "OggSpeex": "speex",
+    "OggTheora": "theora",
+    "FLAC": "flac",
+    "AAC": "aac",
+    "AC3": "ac3",
+    "WAVE": "pcm",
+    "AIFF": "pcm",
+    "DSF": "dsd",
+    "DSDIFF": "dsd",
+    "ASF": "wma",
+    "MonkeysAudio": "ape",
+    "Musepack": "musepack",
+    "TrueAudio": "tta",
+    "WavPack": "wavpack",
+    "OptimFROG": "optimfrog",
+    "SMF": "midi",
+}
+
+DATE_PATTERN = re.compile(r"(\d{4})(?:-(\d{2}))?(?:-(\d{2}))?")
+
+
+def read_audio_metadata(file_path):
+    """
+    Reads the tags (ID3, Vorbis comments, MP4 atoms, ...) and the technical data of an audio file.
+    A module level function, so it can run on a process pool.
+
+    Args:
+        file_path (str): Path to the audio file.
+
+    Returns:
+        dict: The values found, among artist, song_name, release_date (YYYY-MM-DD), tags (the genres),
+            duration (seconds), bitrate (bits per second), sample_rate (Hz) and codec. Empty if the file
+            isn't a known audio format.
+
+    Raises:
+        ImportError: If mutagen isn't installed.
+        Exception: If the file can't be read.
+    """
+
+    try:
+        import mutagen
+    except ImportError as e:
+        raise ImportError("Reading the audio tags requires mutagen (pip install mutagen).") from e
+
+    # easy=True da aceleasi chei (artist, title, date, genre) pentru toate formatele
+    audio = mutagen.File(file_path, easy=True)
+
+    if audio is None:
+        return {}
+
+    metadata = {}
+    tags = audio.tags or {}
+
+    def first(key):
+        """
+        Gets the first non-empty value of a tag.
+
+        Args:
+            key (str): The tag.
+
+        Returns:
+            str: The value, None if the tag is missing.
+        """
+
+        try:
+            values = tags.get(key) or []
+        except (KeyError, ValueError):
+            return None
+
+        values = [str(value).strip() for value in values if str(value).strip()]
+        return values[0] if values else None
+
+    if first("artist") or first("albumartist"):
+        metadata["artist"] = first("artist") or first("albumartist")
+
+    if first("title"):
+        metadata["song_name"] = first("title")
+
+    date = DATE_PATTERN.match(first("date") or first("originaldate") or "")
+    if date:
+        # Coloana e de tip DATE, un an singur devine 1 ianuarie
+        year, month, day = date.groups()
+        metadata["release_date"] = f"{year}-{month or '01'}-{day or '01'}"
+
+    try:
+        genres = [str(genre).strip() for genre in tags.get("genre") or [] if str(genre).strip()]
+    except (KeyError, ValueError):
+        genres = []
+    if genres:
+        metadata["tags"] = genres
+
+    info = audio.info
+    length = getattr(info, "length", None)
+    bitrate = getattr(info, "bitrate", None)
+
+    if length:
+        metadata["duration"] = round(float(length), 3)
+
+        # Unele containere (MP4, WAVE) nu declara bitrate-ul, e aproximat din marime
+        if not bitrate:
+            bitrate = os.path.getsize(file_path) * 8 / length
+
+    if bitrate:
+        metadata["bitrate"] = int(bitrate)
+
+    if getattr(info, "sample_rate", None):
+        metadata["sample_rate"] = int(info.sample_rate)
+
+    metadata["codec"] = getattr(info, "codec", None) or CODECS.get(type(audio).__name__, type(audio).__name__.lower())
+
+    return metadata
+
+
+def _read_or_empty(file_path):
+    """
+    Reads the metadata of a file for MetadataExtractor, reporting an unreadable file instead of failing.
+
+    Args:
+        file_path (str): Path to the audio file.
+
+    Returns:
+        dict: The metadata, empty if the file can't be read.
+    """
+
+    try:
+        return read_audio_metadata(file_path)
+    except Exception as e:
+        print(f"Error while reading the tags of {os.path.basename(file_path)}: {e}.")
+        return {}
+
+
+class MetadataExtractor:
+    """
+    Reads the embedded tags and the technical data of the song files while they are added, so the user doesn't
+    have to type what the file already knows. Large imports read the files on a pool of processes, the tag
+    parsing being CPU bound.
+
+    Requires mutagen. Without it nothing is extracted and the songs are added with the given metadata only.
+    """
+
+    def __init__(self, max_workers=None, process_threshold=64):
+        """
+        Initialize the extractor.
+
+        Args:
+            max_workers (int): Number of processes reading files, by default the number of CPUs.
+            process_threshold (int): Imports of at least this many songs (or of unknown size) use the process pool,
+                the smaller ones read the files in the calling process.
+        """
+
+        self.max_workers = max_workers
+        self.process_threshold = process_threshold
+        self.available = importlib.util.find_spec("mutagen") is not None
+
+
+    def extract(self, file_path):
+        """
+        Reads the metadata of a file.
+
+        Args:
+            file_path (str): Path to the audio file.
+
+        Returns:
+            dict: The metadata found (see read_audio_metadata), empty if mutagen isn't installed or the file
+                can't be read.
+        """
+
+        if not self.available:
+            return {}
+
+        return _read_or_empty(file_path)
+
+
+    def extract_many(self, file_paths, processes=None):
+        """
+        Reads the metadata of many files.
+
+        Args:
+            file_paths (list): Paths to the audio files.
+            processes (ProcessPoolExecutor): Pool reading the files, from process_pool. None to read them here.
+
+        Returns:
+            list: The metadata of each file (see extract), in the input order.
+        """
+
+        if not self.available:
+            return [{} for _ in file_paths]
+
+        if processes is None:
+            return [_read_or_empty(file_path) for file_path in file_paths]
+
+        return list(processes.map(_read_or_empty, file_paths, chunksize=16))
+
+
+    def process_pool(self, count=None):
+        """
+        Gets the pool of processes for an import, to be used as a context manager around it.
+
+        Args:
+            count (int): Number of songs imported, None if unknown.
+
+        Returns:
+            ContextManager: A ProcessPoolExecutor for the large imports, otherwise a context giving None.
+        """
+
+        if not self.available or (count is not None and count < self.process_threshold):
+            return contextlib.nullcontext(None)
+
+        return ProcessPoolExecutor(max_workers=self.max_workers)
+
+
+    @staticmethod
+    def complete(metadata, extracted):
+        """
+        Fills the missing metadata of a song with the values read from its file.
+
+        Args:
+            metadata (tuple): The artist, song_name, release_date and tags given by the user, None or empty
+                for the missing ones.
+            extracted (dict): The metadata read from the file.
+
+        Returns:
+            tuple: The completed artist, song_name, release_date and tags.
+        """
+
+        artist, song_name, release_date, tags = metadata
+
+        return (
+            artist or extracted.get("artist"),
+            song_name or extracted.get("song_name"),
+            release_date or extracted.get("release_date"),
+            tags or extracted.get("tags") or []
+        )
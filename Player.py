@@ -0,0 +1,1047 @@
+import hashlib
+import os
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# pygame e incarcat la prima redare, nu odata cu modulul
+mixer = None
+
+# Formatul in care sunt decodate melodiile: 16 biti cu semn, stereo
+FREQUENCY = 44100
+CHANNELS = 2
+SAMPLE_WIDTH = 2
+
+# Formatele decodate de pygame, celelalte sunt redate din fisierele convertite
+PLAYABLE_FORMATS = ("ogg", "opus", "mp3", "wav", "flac")
+
+WAVEFORM_DIR = os.path.join("Cache", "waveforms")
+
+
+def compute_peaks(pcm, points=1000, samples_per_point=2048):
+    """
+    Summarizes decoded audio as the peak amplitude of each of its segments, for drawing a waveform.
+
+    Args:
+        pcm (bytes): 16-bit signed samples, as decoded by Player.
+        points (int): Number of segments.
+        samples_per_point (int): Maximum number of samples examined in a segment; longer segments are
+            sampled at regular steps, which is enough for a picture.
+
+    Returns:
+        list: The peaks, between 0 and 1.
+    """
+
+    samples = array("h")
+    samples.frombytes(pcm[:len(pcm) - len(pcm) % SAMPLE_WIDTH])
+
+    if not samples:
+        return [0.0] * points
+
+    segment = max(1, len(samples) // points)
+    step = max(1, segment // samples_per_point)
+    peaks = []
+
+    for index in range(points):
+        chunk = samples[index * segment:(index + 1) * segment:step]
+        peaks.append(max(max(chunk), -min(chunk)) / 32768 if chunk else 0.0)
+
+    return peaks
+
+
+class WaveformCache:
+    """
+    Stores the waveform summaries of the songs on disk, so the seek bar of a song is drawn without decoding
+    it again, even after a restart.
+    """
+
+    def __init__(self, directory=WAVEFORM_DIR, points=1000):
+        """
+        Initialize the cache.
+
+        Args:
+            directory (str): Folder holding the summaries.
+            points (int): Number of peaks in a summary.
+        """
+
+        self.directory = directory
+        self.points = points
+
+
+    def key(self, file_path, content_hash=None):
+        """
+        Gets the key of the summary of a file.
+
+        Args:
+            file_path (str): Path to the audio file.
+            content_hash (str): Hash of the file content, if known. Otherwise the path, size and modification
+                time identify the file.
+
+        Returns:
+            str: The key.
+        """
+
+        if content_hash:
+            return content_hash
+
+        stat = os.stat(file_path)
+        identity = f"{os.path.abspath(file_path)}|{stat.st_size}|{stat.st_mtime_ns}"
+        return hashlib.sha256(identity.encode()).hexdigest()
+
+
+    def get(self, key):
+        """
+        Gets a stored summary.
+
+        Args:
+            key (str): Key of the summary.
+
+        Returns:
+            list: The peaks, or None if the summary isn't stored.
+        """
+
+        path = os.path.join(self.directory, f"{key}.peaks")
+
+        try:
+            with open(path, "rb") as file:
+                peaks = array("H")
+                peaks.frombytes(file.read())
+        except (OSError, ValueError):
+            return None
+
+        return [peak / 65535 for peak in peaks]
+
+
+    def put(self, key, peaks):
+        """
+        Stores a summary, atomically so a reader never sees a partial file.
+
+        Args:
+            key (str): Key of the summary.
+            peaks (list): The peaks, between 0 and 1.
+        """
+
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{key}.peaks")
+        temporary = f"{path}.{threading.get_ident()}.tmp"
+
+        with open(temporary, "wb") as file:
+            file.write(array("H", (round(min(peak, 1.0) * 65535) for peak in peaks)).tobytes())
+
+        os.replace(temporary, path)
+
+
+class Player:
+    """
+    Plays the song files. The mixer is initialized once, and the decoded songs are kept in a bounded LRU cache,
+    so playing a song again, or seeking in it, starts immediately instead of decoding the file from the start.
+
+    A song played for the first time is streamed from its file with mixer.music, so it starts at once, while it
+    is decoded whole (with pygame.mixer.Sound) in the background. Once decoded, the song is played on a dedicated
+    channel: replaying it, seeking in it and queueing it without a gap use the decoded samples. The songs that
+    aren't on the local disk can also be streamed from a file-like object with mixer.music, which decodes them
+    while they are read.
+
+    The methods can be called from any thread: the playback state is changed under one lock, and a song
+    prepared (decoded or opened) while stop was called isn't started afterwards.
+    """
+
+    def __init__(self, cache_size=8, cache_bytes=512 * 1024 * 1024, volume=0.7, waveforms=None):
+        """
+        Initialize the player, without opening the audio device yet.
+
+        Args:
+            cache_size (int): Maximum number of decoded songs kept in memory.
+            cache_bytes (int): Maximum size of the decoded songs kept in memory (about 10 MB per minute).
+            volume (float): Playback volume, between 0 and 1.
+            waveforms (WaveformCache): Where the waveform summaries are stored.
+        """
+
+        self.cache_size = cache_size
+        self.cache_bytes = cache_bytes
+        self.volume = volume
+        self.waveforms = waveforms or WaveformCache()
+
+        self._decoded = OrderedDict()  # file_path -> PCM, cel mai recent folosit la sfarsit
+        self._decoded_bytes = 0
+        self._lock = threading.Lock()
+        self._loading = {}  # file_path -> threading.Event, pentru decodarile in curs
+
+        self._channel = None
+        self._frequency = FREQUENCY
+        self._frame = CHANNELS * SAMPLE_WIDTH  # Octeti per cadru (un esantion pe fiecare canal)
+        self._current = None
+        self._length = 0.0
+        self._queued = None  # (file_path, Sound, durata) melodiei care urmeaza fara pauza
+        self._stream = None  # Fisierul redat cu mixer.music, in loc de canal
+        self._streamed_path = None  # Fisierul local redat cu mixer.music pana e decodat
+        self._offset = 0.0
+        self._started_at = None
+        self._paused_at = None
+        self._playback = threading.RLock()  # Starea redarii, schimbata din firul Tk si din cele de fundal
+        self._generation = 0  # Creste la fiecare stop
+
+
+    @property
+    def generation(self):
+        """
+        Counter increased by every stop. A caller preparing a song reads it first and passes it to play or
+        stream, so the song isn't started if it was stopped meanwhile.
+        """
+
+        return self._generation
+
+
+    def _ensure_mixer(self):
+        """
+        Initializes the mixer the first time it is needed, loading pygame.
+        """
+
+        global mixer
+
+        with self._playback:
+            if mixer is None:
+                from pygame import mixer
+
+            if not mixer.get_init():
+                mixer.init(frequency=FREQUENCY, size=-8 * SAMPLE_WIDTH, channels=CHANNELS)
+
+            if self._channel is None:
+                # Mixerul poate fi deja initializat de altcineva, cu alt format
+                frequency, size, channels = mixer.get_init()
+                self._frequency = frequency
+                self._frame = abs(size) // 8 * channels
+
+                self._channel = mixer.Channel(0)
+                mixer.set_reserved(1)  # Canalul 0 nu e folosit de alte sunete
+
+
+    def load(self, file_path):
+        """
+        Gets the decoded samples of a song, decoding it only if it isn't in the cache. Safe to call from
+        a background thread to preload a song.
+
+        Args:
+            file_path (str): Path to the song file.
+
+        Returns:
+            bytes: The decoded samples.
+        """
+
+        self._ensure_mixer()
+
+        while True:
+            with self._lock:
+                if file_path in self._decoded:
+                    self._decoded.move_to_end(file_path)
+                    return self._decoded[file_path]
+
+                loading = self._loading.get(file_path)
+                if loading is None:
+                    self._loading[file_path] = threading.Event()
+                    break
+
+            # Alt fir decodeaza deja melodia
+            loading.wait()
+
+        try:
+            pcm = mixer.Sound(file_path).get_raw()
+
+            with self._lock:
+                self._decoded[file_path] = pcm
+                self._decoded_bytes += len(pcm)
+
+                # Cele mai vechi melodii ies din cache, dar ultima ramane oricat de mare ar fi
+                while len(self._decoded) > 1 and (len(self._decoded) > self.cache_size
+                                                  or self._decoded_bytes > self.cache_bytes):
+                    _, evicted = self._decoded.popitem(last=False)
+                    self._decoded_bytes -= len(evicted)
+
+            return pcm
+        finally:
+            with self._lock:
+                self._loading.pop(file_path).set()
+
+
+    def preload(self, file_path):
+        """
+        Decodes a song in advance, so it starts without delay. Errors are reported, not raised.
+
+        Args:
+            file_path (str): Path to the song file.
+        """
+
+        try:
+            self.load(file_path)
+        except Exception as e:
+            print(f"Error while preloading the song {os.path.basename(file_path)}: {e}.")
+
+
+    def waveform(self, file_path, content_hash=None):
+        """
+        Gets the waveform summary of a song, from the disk cache or computed from the decoded song.
+
+        Args:
+            file_path (str): Path to the song file.
+            content_hash (str): Hash of the file content, if known.
+
+        Returns:
+            list: The peaks of the song (waveform.points values between 0 and 1).
+        """
+
+        key = self.waveforms.key(file_path, content_hash)
+        peaks = self.waveforms.get(key)
+
+        if peaks is None:
+            peaks = compute_peaks(self.load(file_path), self.waveforms.points)
+            self.waveforms.put(key, peaks)
+
+        return peaks
+
+
+    def duration(self, file_path):
+        """
+        Gets the duration of a song.
+
+        Args:
+            file_path (str): Path to the song file.
+
+        Returns:
+            float: The duration in seconds.
+        """
+
+        return len(self.load(file_path)) / (self._frequency * self._frame)
+
+
+    def _cached(self, file_path):
+        """
+        Gets the decoded samples of a song, without decoding it.
+
+        Args:
+            file_path (str): Path to the song file.
+
+        Returns:
+            bytes: The decoded samples, None if the song isn't in the cache.
+        """
+
+        with self._lock:
+            if file_path in self._decoded:
+                self._decoded.move_to_end(file_path)
+                return self._decoded[file_path]
+
+        return None
+
+
+    def _warm(self, file_path):
+        """
+        Decodes a streamed song and computes its waveform, on a background thread. Errors are reported, not raised.
+
+        Args:
+            file_path (str): Path to the song file.
+        """
+
+        try:
+            # Forma de unda poate fi deja pe disc, melodia e decodata oricum
+            self.load(file_path)
+            self.waveform(file_path)
+        except Exception as e:
+            print(f"Error while decoding the song {os.path.basename(file_path)}: {e}.")
+
+
+    def play(self, file_path, start=0.0, stream=True, generation=None):
+        """
+        Plays a song, replacing the one playing. A decoded song starts from the cache; otherwise the song is
+        streamed from its file and decoded in the background for the next plays and seeks.
+
+        Args:
+            file_path (str): Path to the song file.
+            start (float): Second from which the song starts.
+            stream (bool): Whether a song that isn't decoded yet is streamed. If False, it is decoded first and
+                played on the channel, so the next song can be queued after it without a gap.
+            generation (int): The generation read before the song was prepared, by default the current one.
+                The song isn't started if stop was called since.
+        """
+
+        self._ensure_mixer()
+        generation = self._generation if generation is None else generation
+        pcm = self._cached(file_path)
+
+        if pcm is None and not stream:
+            pcm = self.load(file_path)  # Decodarea nu tine lacatul redarii
+
+        with self._playback:
+            if generation != self._generation:
+                return
+
+            if pcm is not None:
+                self._current = file_path
+                self._start(pcm, start)
+                return
+
+            self.stream(open(file_path, "rb"), file_path, start)
+            self._streamed_path = file_path
+
+        threading.Thread(target=self._warm, args=(file_path,), daemon=True).start()
+
+
+    def stream(self, file, name="", start=0.0, generation=None):
+        """
+        Plays a song while it is read from a file-like object (e.g. a RangeReader over a remote file), without
+        decoding it whole first. The file is closed when the song is stopped or replaced.
+
+        Args:
+            file: A seekable binary file-like object.
+            name (str): Name of the song file, whose extension tells the format.
+            start (float): Second from which the song starts.
+            generation (int): The generation read before the file was opened; the file is closed without
+                playing it if stop was called since.
+        """
+
+        self._ensure_mixer()
+
+        with self._playback:
+            if generation is not None and generation != self._generation:
+                file.close()
+                return
+
+            self._halt()
+
+            try:
+                mixer.music.load(file, name)
+                mixer.music.set_volume(self.volume)
+                mixer.music.play(start=start)
+            except Exception:
+                file.close()
+                raise
+
+            self._stream = file
+            self._current = name
+            self._length = 0.0
+            self._offset = start
+            self._started_at = time.monotonic()
+            self._paused_at = None
+
+
+    def _stop_stream(self):
+        """
+        Stops the song streamed with mixer.music, if there is one, and closes its file.
+        """
+
+        if self._stream is not None:
+            mixer.music.stop()
+            mixer.music.unload()
+            self._stream.close()
+            self._stream = None
+            self._streamed_path = None
+
+
+    def _start(self, pcm, start):
+        """
+        Plays decoded samples from an offset.
+
+        Args:
+            pcm (bytes): The decoded song.
+            start (float): Second from which it starts.
+        """
+
+        self._stop_stream()
+
+        self._length = len(pcm) / (self._frequency * self._frame)
+        start = max(0.0, min(start, self._length))
+        offset = int(start * self._frequency) * self._frame
+
+        sound = mixer.Sound(buffer=memoryview(pcm)[offset:])
+        sound.set_volume(self.volume)
+
+        self._channel.play(sound)  # Goleste si coada canalului
+        self._queued = None
+        self._offset = start
+        self._started_at = time.monotonic()
+        self._paused_at = None
+
+
+    @property
+    def current(self):
+        """
+        The path of the song playing or paused, None if there is none.
+        """
+
+        with self._playback:
+            return self._current
+
+
+    def queue(self, file_path):
+        """
+        Queues a song to start exactly when the current one ends, without a gap. Playing another song,
+        seeking or stopping drops it from the queue.
+
+        Args:
+            file_path (str): Path to the song file.
+
+        Returns:
+            bool: False if no song is playing, in which case the song should be played instead.
+        """
+
+        pcm = self.load(file_path)
+
+        with self._playback:
+            if self._stream is not None or not self.is_playing():
+                return False
+
+            sound = mixer.Sound(buffer=pcm)
+            sound.set_volume(self.volume)
+
+            self._channel.queue(sound)
+            self._queued = (file_path, sound, len(pcm) / (self._frequency * self._frame))
+            return True
+
+
+    def update(self):
+        """
+        Checks if the queued song started, the previous one having ended. To be called periodically while
+        a song is queued.
+
+        Returns:
+            str: The path of the song that started, None if it didn't start yet.
+        """
+
+        with self._playback:
+            if self._queued is None:
+                return None
+
+            file_path, sound, length = self._queued
+
+            if self._channel.get_sound() is not sound:
+                return None
+
+            # A inceput exact cand s-a terminat melodia anterioara
+            self._started_at += self._length - self._offset
+            self._offset = 0.0
+            self._length = length
+            self._current = file_path
+            self._queued = None
+            return file_path
+
+
+    def seek(self, position):
+        """
+        Moves the playback of the current song to another position, keeping it paused if it was. A streamed song
+        moves to the decoded samples once its background decoding is done.
+
+        Args:
+            position (float): The new position, in seconds.
+        """
+
+        with self._playback:
+            if self._current is None:
+                return
+
+            paused = self._paused_at is not None
+            pcm = self._cached(self._streamed_path) if self._streamed_path is not None else None
+
+            if pcm is not None:
+                self._start(pcm, position)
+            elif self._stream is not None:
+                mixer.music.play(start=position)
+                self._offset = position
+                self._started_at = time.monotonic()
+                self._paused_at = None
+            else:
+                # Decodata din nou doar daca a iesit din cache
+                self._start(self.load(self._current), position)
+
+            if paused:
+                self.pause()
+
+
+    def position(self):
+        """
+        Gets the playback position of the current song.
+
+        Returns:
+            float: Seconds from the start of the song, 0 if nothing is playing.
+        """
+
+        with self._playback:
+            if self._started_at is None:
+                return 0.0
+
+            now = self._paused_at if self._paused_at is not None else time.monotonic()
+            return self._offset + now - self._started_at
+
+
+    def is_playing(self):
+        """
+        Checks if a song is playing or paused.
+
+        Returns:
+            bool: False if the song ended or was stopped.
+        """
+
+        with self._playback:
+            if self._stream is not None:
+                # mixer.music nu e ocupat cat timp e in pauza
+                return self._paused_at is not None or mixer.music.get_busy()
+
+            return self._channel is not None and self._channel.get_busy()
+
+
+    def pause(self):
+        """
+        Pauses the currently playing song.
+        """
+
+        with self._playback:
+            if self._stream is not None and self._paused_at is None:
+                mixer.music.pause()
+                self._paused_at = time.monotonic()
+            elif self._channel is not None and self._paused_at is None:
+                self._channel.pause()
+                self._paused_at = time.monotonic()
+
+
+    def resume(self):
+        """
+        Resumes a paused song.
+        """
+
+        with self._playback:
+            if self._paused_at is not None:
+                if self._stream is not None:
+                    mixer.music.unpause()
+                elif self._channel is not None:
+                    self._channel.unpause()
+
+                self._started_at += time.monotonic() - self._paused_at
+                self._paused_at = None
+
+
+    def stop(self):
+        """
+        Stops the currently playing song, and the songs being prepared to play.
+        """
+
+        with self._playback:
+            self._generation += 1
+            self._halt()
+
+
+    def _halt(self):
+        """
+        Stops the current song, before another one starts or on stop.
+        """
+
+        self._stop_stream()
+
+        if self._channel is not None:
+            self._channel.stop()
+
+        self._current = None
+        self._queued = None
+        self._started_at = None
+        self._paused_at = None
+
+
+class PlaybackQueue:
+    """
+    Plays a list of songs one after another, without gaps: while a song plays, the next one is decoded on
+    a background thread and queued on the mixer channel, so it starts on the sample where the previous one ends.
+
+    The subscribers are told about the playback with {"event": ..., "index": ..., "item": ...} dicts:
+    "track_changed" when a song starts, "track_ended" when one ends, "queue_ended" after the last one and
+    "error" (with the exception under "error") for a song that can't be played, which is skipped. They are called
+    on the thread of the queue (or of the caller, for play and next), so they must be quick and thread-safe;
+    a window passes them to BackgroundRunner.dispatch.
+
+    Starting a song resolves its file (a database query, or a download) and may wait for its decoding, so play,
+    next and previous block their caller: a window calls them through BackgroundRunner. The lock of the queue is
+    never held during that work, and the last request wins if several overlap.
+    """
+
+    def __init__(self, player, resolve=None, poll_interval=0.02):
+        """
+        Initialize the queue, empty.
+
+        Args:
+            player (Player): Plays the songs.
+            resolve (callable): Gets the path of the file of a queue item (e.g. a song ID). By default the items
+                are the paths.
+            poll_interval (float): Seconds between two checks of the playback.
+        """
+
+        self.player = player
+        self.resolve = resolve or (lambda item: item)
+        self.poll_interval = poll_interval
+
+        self.items = []
+        self.index = None
+
+        self._next = None  # (index, Future) cu decodarea urmatoarei melodii
+        self._next_index = 0  # Pozitia urmatoarei melodii, dupa cele care nu au putut fi decodate
+        self._queued_index = None
+        self._paused = False
+        self._request = 0  # Creste la fiecare pornire sau oprire; o pornire mai veche e abandonata
+        self._starting = False  # O melodie e pornita in afara lock-ului
+        self._subscribers = []
+        self._lock = threading.RLock()
+        self._prefetcher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch")
+        self._stop = threading.Event()
+        self._monitor = None
+
+
+    def subscribe(self, callback):
+        """
+        Registers a function called with every playback event.
+
+        Args:
+            callback (callable): Receives the event dict.
+
+        Returns:
+            callable: The callback, to be passed to unsubscribe.
+        """
+
+        with self._lock:
+            self._subscribers.append(callback)
+
+        return callback
+
+
+    def unsubscribe(self, callback):
+        """
+        Removes a function registered with subscribe.
+
+        Args:
+            callback (callable): The callback.
+        """
+
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+
+    def _publish(self, event, index=None, **details):
+        """
+        Passes an event to the subscribers.
+
+        Args:
+            event (str): Name of the event.
+            index (int): Position of the song in the queue.
+            **details: Other values of the event.
+        """
+
+        change = {"event": event, "index": index, "item": self.items[index] if index is not None else None,
+                  **details}
+
+        for callback in list(self._subscribers):
+            try:
+                callback(change)
+            except Exception as e:
+                print(f"Error while handling a playback event: {e}.")
+
+
+    def set_items(self, items, start=0):
+        """
+        Replaces the songs of the queue and plays them from a position.
+
+        Args:
+            items (iterable): The songs, as accepted by resolve.
+            start (int): Position of the first song played.
+        """
+
+        with self._lock:
+            self.stop()
+            self.items = list(items)
+
+        self._play_from(start)
+
+
+    def extend(self, items):
+        """
+        Adds songs at the end of the queue. They are played after the current ones, or right away if
+        the queue had ended.
+
+        Args:
+            items (iterable): The songs, as accepted by resolve.
+        """
+
+        with self._lock:
+            ended = self.index is None and self.items and not self._starting
+            start = len(self.items)
+            self.items.extend(items)
+
+        if ended:
+            self._play_from(start)
+
+
+    def play(self, index):
+        """
+        Plays the song at a position of the queue.
+
+        Args:
+            index (int): The position.
+        """
+
+        self._play_from(index)
+
+
+    def next(self):
+        """
+        Skips to the next song, reusing its decoding if it was prefetched. After the last one the queue ends.
+        """
+
+        with self._lock:
+            index = self.index
+
+        if index is not None:
+            self._play_from(index + 1)
+
+
+    def previous(self):
+        """
+        Goes back to the previous song, or to the start of the current one if it played for a few seconds.
+        """
+
+        with self._lock:
+            index = self.index
+
+            if index is None:
+                return
+
+            if self.player.position() > 3 or index == 0:
+                self.seek(0)
+                return
+
+        self._play_from(index - 1)
+
+
+    def pause(self):
+        """
+        Pauses the current song.
+        """
+
+        with self._lock:
+            self._paused = True
+            self.player.pause()
+
+
+    def resume(self):
+        """
+        Resumes the current song.
+        """
+
+        with self._lock:
+            self._paused = False
+            self.player.resume()
+
+
+    def seek(self, position):
+        """
+        Moves the playback of the current song.
+
+        Args:
+            position (float): The new position, in seconds.
+        """
+
+        with self._lock:
+            self.player.seek(position)
+            self._queued_index = None  # Cautarea goleste coada canalului, urmatoarea e pusa din nou
+
+
+    def stop(self):
+        """
+        Stops the playback. The songs stay in the queue.
+        """
+
+        with self._lock:
+            self._request += 1
+            self._starting = False
+            self.player.stop()
+            self.index = None
+            self._next = None
+            self._queued_index = None
+            self._paused = False
+
+
+    def close(self):
+        """
+        Stops the playback and the threads of the queue.
+        """
+
+        self.stop()
+        self._stop.set()
+
+        if self._monitor is not None:
+            self._monitor.join()
+            self._monitor = None
+
+        self._prefetcher.shutdown(wait=False, cancel_futures=True)
+
+
+    def _load(self, index):
+        """
+        Resolves and decodes a song of the queue, on the prefetch thread.
+
+        Args:
+            index (int): Position of the song.
+
+        Returns:
+            str: The path of the song file.
+        """
+
+        file_path = self.resolve(self.items[index])
+        self.player.load(file_path)
+        return file_path
+
+
+    def _play_from(self, index):
+        """
+        Plays the first song that can be played from a position, or ends the queue. The songs are resolved,
+        and the prefetched one waited for, without holding the lock; the start is abandoned if another one
+        (or stop) was requested meanwhile.
+
+        Args:
+            index (int): The position.
+        """
+
+        with self._lock:
+            self._request += 1
+            request = self._request
+            self._starting = True
+            self._queued_index = None
+            self._paused = False
+            prefetched = self._next
+
+        while True:
+            with self._lock:
+                if request != self._request:
+                    return
+
+                if index >= len(self.items):
+                    self.player.stop()
+                    self.index = None
+                    self._next = None
+                    self._starting = False
+                    self._publish("queue_ended")
+                    return
+
+                item = self.items[index]
+
+            try:
+                if prefetched is not None and prefetched[0] == index:
+                    file_path = prefetched[1].result()
+                else:
+                    file_path = self.resolve(item)
+                    # Decodata in afara lacatului; redata pe canal, ca urmatoarea sa poata fi pusa in coada
+                    self.player.load(file_path)
+
+                with self._lock:
+                    if request != self._request:
+                        return
+
+                    self.player.play(file_path, stream=False)
+                    self.index = index
+                    self._next = None
+                    self._starting = False
+                    self._publish("track_changed", index)
+                    self._prefetch()
+                    self._start_monitor()
+                    return
+            except Exception as e:
+                print(f"Error while playing the song {item}: {e}.")
+
+                with self._lock:
+                    if request != self._request:
+                        return
+
+                    self._publish("error", index, error=e)
+                    self._next = None
+
+                index += 1
+
+
+    def _prefetch(self, index=None):
+        """
+        Starts decoding the song following the current one (or the one at a position).
+
+        Args:
+            index (int): Position of the song to decode, by default the next one.
+        """
+
+        index = self.index + 1 if index is None else index
+        self._next_index = index
+
+        if index < len(self.items):
+            self._next = (index, self._prefetcher.submit(self._load, index))
+        else:
+            self._next = None
+
+
+    def _start_monitor(self):
+        """
+        Starts the thread following the playback, unless it is running.
+        """
+
+        if self._monitor is None:
+            self._stop.clear()
+            self._monitor = threading.Thread(target=self._watch, daemon=True)
+            self._monitor.start()
+
+
+    def _watch(self):
+        """
+        Body of the monitor thread: notices the song changes and queues the next song once it is decoded.
+        """
+
+        while not self._stop.wait(self.poll_interval):
+            restart = None
+
+            with self._lock:
+                if self.index is None or self._starting:
+                    continue
+
+                if self.player.update() is not None:
+                    # Melodia din coada a pornit fara pauza
+                    ended = self.index
+                    self.index = self._queued_index
+                    self._queued_index = None
+                    self._publish("track_ended", ended)
+                    self._publish("track_changed", self.index)
+                    self._prefetch()
+                elif not self._paused and not self.player.is_playing():
+                    # Urmatoarea melodie nu a fost decodata la timp, porneste cu o mica pauza
+                    ended = self.index
+                    self._publish("track_ended", ended)
+                    # Melodiile care nu au putut fi decodate au fost deja sarite de _prefetch
+                    restart = self._next_index
+                    self._starting = True
+                elif self._queued_index is None:
+                    self._queue_next()
+
+            if restart is not None:
+                self._play_from(restart)
+
+
+    def _queue_next(self):
+        """
+        Queues the next song on the mixer channel, if it is decoded.
+        """
+
+        if self._next is None:
+            if self._next_index < len(self.items):
+                self._prefetch(self._next_index)  # Melodii adaugate cu extend
+            return
+
+        index, future = self._next
+
+        if not future.done():
+            return
+
+        try:
+            if self.player.queue(future.result()):
+                self._queued_index = index
+        except Exception as e:
+            print(f"Error while playing the song {self.items[index]}: {e}.")
+            self._publish("error", index, error=e)
+            self._prefetch(index + 1)
@@ -0,0 +1,331 @@
+import threading
+from collections import OrderedDict
+from ChangeFeed import ChangeFeed
+
+
+class SongCache:
+    """
+    An in-memory cache of the songs metadata: the songs by ID, where their files are stored and the results
+    of the recent searches, all bounded and evicted in least recently used order.
+    """
+
+    def __init__(self, max_songs=10000, max_searches=256):
+        """
+        Initialize an empty cache.
+
+        Args:
+            max_songs (int): Maximum number of songs (and of file locations) kept by ID.
+            max_searches (int): Maximum number of search results kept.
+        """
+
+        self.max_songs = max_songs
+        self.max_searches = max_searches
+
+        self._songs = OrderedDict()
+        self._locations = OrderedDict()  # id -> (file_name, content_hash)
+        self._searches = OrderedDict()
+        self._lock = threading.Lock()
+        self._feed = None
+        self._owns_feed = False
+
+        self.song_hits = 0
+        self.song_misses = 0
+        self.search_hits = 0
+        self.search_misses = 0
+
+
+    @staticmethod
+    def search_key(*args, **criteria):
+        """
+        Builds a hashable key for a search.
+
+        Args:
+            *args: Positional values identifying the search (e.g. its kind).
+            **criteria: The criteria of the search.
+
+        Returns:
+            tuple: The key of the search.
+        """
+
+        return args + tuple(sorted(
+            (name, tuple(value) if isinstance(value, list) else value) for name, value in criteria.items()
+        ))
+
+
+    def get_song(self, id_song):
+        """
+        Gets a cached song.
+
+        Args:
+            id_song (int): ID of the song.
+
+        Returns:
+            tuple: The song record or None if it isn't cached.
+        """
+
+        with self._lock:
+            song = self._songs.get(int(id_song))
+
+            if song is None:
+                self.song_misses += 1
+                return None
+
+            self._songs.move_to_end(int(id_song))
+            self.song_hits += 1
+            return song
+
+
+    def put_song(self, song):
+        """
+        Caches a song record.
+
+        Args:
+            song (tuple): The song record, its first value being the ID.
+        """
+
+        with self._lock:
+            self._songs[song[0]] = song
+            self._songs.move_to_end(song[0])
+
+            while len(self._songs) > self.max_songs:
+                self._songs.popitem(last=False)
+
+
+    def get_location(self, id_song):
+        """
+        Gets where the file of a cached song is stored.
+
+        Args:
+            id_song (int): ID of the song.
+
+        Returns:
+            tuple: The file name and the content hash of the song, or None if they aren't cached.
+        """
+
+        with self._lock:
+            location = self._locations.get(int(id_song))
+
+            if location is not None:
+                self._locations.move_to_end(int(id_song))
+
+            return location
+
+
+    def put_location(self, id_song, location):
+        """
+        Caches where the file of a song is stored.
+
+        Args:
+            id_song (int): ID of the song.
+            location (tuple): The file name and the content hash of the song.
+        """
+
+        with self._lock:
+            self._locations[int(id_song)] = tuple(location)
+            self._locations.move_to_end(int(id_song))
+
+            while len(self._locations) > self.max_songs:
+                self._locations.popitem(last=False)
+
+
+    def get_search(self, key):
+        """
+        Gets the cached results of a search.
+
+        Args:
+            key (tuple): The key of the search, built with search_key.
+
+        Returns:
+            list: A copy of the results or None if they aren't cached.
+        """
+
+        with self._lock:
+            results = self._searches.get(key)
+
+            if results is None:
+                self.search_misses += 1
+                return None
+
+            self._searches.move_to_end(key)
+            self.search_hits += 1
+            return list(results)
+
+
+    def put_search(self, key, results):
+        """
+        Caches the results of a search.
+
+        Args:
+            key (tuple): The key of the search, built with search_key.
+            results (list): The songs found.
+        """
+
+        with self._lock:
+            self._searches[key] = list(results)
+            self._searches.move_to_end(key)
+
+            while len(self._searches) > self.max_searches:
+                self._searches.popitem(last=False)
+
+
+    def song_added(self, song=None):
+        """
+        Invalidates what an added song makes stale: any search could match the new song.
+
+        Args:
+            song (tuple): The added song record, cached if provided.
+        """
+
+        with self._lock:
+            self._searches.clear()
+
+        if song is not None:
+            self.put_song(song)
+
+
+    def song_modified(self, id_song):
+        """
+        Invalidates what a modified song makes stale: the song itself and all the searches, which
+        could start or stop matching it.
+
+        Args:
+            id_song (int): ID of the modified song.
+        """
+
+        self.songs_modified([id_song])
+
+
+    def songs_modified(self, ids):
+        """
+        Invalidates what many modified songs make stale, see song_modified.
+
+        Args:
+            ids (iterable): IDs of the modified songs.
+        """
+
+        with self._lock:
+            for id_song in ids:
+                self._songs.pop(int(id_song), None)
+                self._locations.pop(int(id_song), None)
+
+            self._searches.clear()
+
+
+    def song_deleted(self, id_song):
+        """
+        Invalidates what a deleted song makes stale: the song itself and only the searches that found it.
+
+        Args:
+            id_song (int): ID of the deleted song.
+        """
+
+        self.songs_deleted([id_song])
+
+
+    def songs_deleted(self, ids):
+        """
+        Invalidates what many deleted songs make stale, see song_deleted.
+
+        Args:
+            ids (iterable): IDs of the deleted songs.
+        """
+
+        ids = {int(id_song) for id_song in ids}
+
+        with self._lock:
+            for id_song in ids:
+                self._songs.pop(id_song, None)
+                self._locations.pop(id_song, None)
+
+            for key in [key for key, results in self._searches.items()
+                        if any(song[0] in ids for song in results)]:
+                del self._searches[key]
+
+
+    def clear(self):
+        """
+        Empties the cache.
+        """
+
+        with self._lock:
+            self._songs.clear()
+            self._locations.clear()
+            self._searches.clear()
+
+
+    def stats(self):
+        """
+        Gets the cache counters.
+
+        Returns:
+            dict: The hits and misses for songs and searches and the number of cached entries.
+        """
+
+        with self._lock:
+            return {
+                "song_hits": self.song_hits,
+                "song_misses": self.song_misses,
+                "search_hits": self.search_hits,
+                "search_misses": self.search_misses,
+                "songs": len(self._songs),
+                "searches": len(self._searches),
+            }
+
+
+    def listen(self, source):
+        """
+        Keeps the cache coherent with the changes made by other processes, by following the notifications
+        sent by the songs table triggers.
+
+        Args:
+            source (ChangeFeed or ConnectionPool): A change feed shared with other users, or a pool whose settings
+                are used for a feed of the cache's own.
+        """
+
+        if self._feed is not None:
+            return
+
+        if isinstance(source, ChangeFeed):
+            self._feed = source
+        else:
+            self._feed = ChangeFeed(source)
+            self._owns_feed = True
+
+        self._feed.subscribe(self._apply)
+        self._feed.start()
+
+
+    def stop_listening(self):
+        """
+        Stops following the changes started by listen.
+        """
+
+        if self._feed is None:
+            return
+
+        self._feed.unsubscribe(self._apply)
+
+        if self._owns_feed:
+            self._feed.stop()
+
+        self._feed = None
+        self._owns_feed = False
+
+
+    def _apply(self, change):
+        """
+        Applies a change notification to the cache.
+
+        Args:
+            change (dict): The notification payload, with the operation and the song ID.
+        """
+
+        if change["op"] == "INSERT":
+            self.song_added()
+        elif change["op"] == "UPDATE":
+            self.song_modified(change["id"])
+        elif change["op"] == "DELETE":
+            self.song_deleted(change["id"])
+        elif change["op"] == "RESYNC":
+            # Notificarile pierdute cat timp nu am fost conectati
+            self.clear()
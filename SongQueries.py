@@ -0,0 +1,147 @@
+from MetadataExtractor import TECHNICAL_COLUMNS
+from Transcoder import LOUDNESS_COLUMNS
+
+# Coloanele afisate in tabele, in ordinea lor
+SONG_COLUMNS = "id, file_name, artist, song_name, release_date, tags"
+
+# Coloanele dupa care se poate cauta; doar numele acestea ajung in textul interogarilor
+SEARCH_COLUMNS = frozenset(SONG_COLUMNS.split(", ")) | {"format"} | set(TECHNICAL_COLUMNS) | set(LOUDNESS_COLUMNS)
+
+# Coloanele pe care utilizatorul le poate modifica
+MODIFIABLE_COLUMNS = ("artist", "song_name", "release_date", "tags")
+
+# Blocheaza continuturile (hash-urile, sortate) pana la sfarsitul tranzactiei, fata de adaugari si stergeri concurente
+LOCK_BLOBS = "SELECT pg_advisory_xact_lock(hashtext(content_hash)) FROM unnest(%s::TEXT[]) AS content_hash"
+
+
+def build_where(criteria):
+    """
+    Builds the WHERE clause of a search.
+
+    Args:
+        criteria (dict): Key-value pairs representing the criteria for searching process. A list matches the songs
+            having any of its values (tags), a (minimum, maximum) tuple an interval, either end being None if open.
+
+    Returns:
+        tuple: The WHERE clause (empty if there are no criteria) and the list of its values.
+
+    Raises:
+        ValueError: If a criterion isn't one of the SEARCH_COLUMNS.
+    """
+
+    clauses = []
+    values = []
+
+    for clause, value in criteria.items():
+        if clause not in SEARCH_COLUMNS:
+            raise ValueError(f"The songs can't be searched by {clause!r}.")
+
+        if clause == "format":
+            clauses.append("format = lower(%s)")  # Coloana generata si indexata
+            values.append(value.lstrip("."))
+        elif isinstance(value, list):  # Tags
+            clauses.append(f"{clause} && %s")  # PostgreSQL overlap array operator
+            values.append(value)
+        elif isinstance(value, tuple):  # Interval (minim, maxim), de ex. duration=(180, 240)
+            low, high = value
+            if low is not None:
+                clauses.append(f"{clause} >= %s")
+                values.append(low)
+            if high is not None:
+                clauses.append(f"{clause} <= %s")
+                values.append(high)
+        else:
+            clauses.append(f"{clause} = %s")
+            values.append(value)
+
+    return ' AND '.join(clauses), values
+
+
+def build_stored_files(rendition, criteria):
+    """
+    Builds the query getting the stored file of each song that meets the criteria, for the save lists.
+
+    Args:
+        rendition (str): Which file of each song to get: None for the original, a format (e.g. "ogg") for
+            the rendition in that format or "smallest" for the smallest file. The original is used for
+            the songs without such a rendition.
+        criteria (dict): Key-value pairs representing the criteria for searching process.
+
+    Returns:
+        tuple: The query, selecting (id, file_name, content_hash) in ID order, and the list of its values.
+    """
+
+    where_clause, values = build_where(criteria)
+
+    if rendition is None:
+        query = "SELECT id, file_name, content_hash FROM songs"
+        if where_clause:
+            query += f" WHERE {where_clause}"
+        query += " ORDER BY id"
+        return query, values
+
+    # Un singur fisier pe melodie, ales din original si fisierele convertite
+    if rendition == "smallest":
+        order = "size NULLS LAST, original DESC"
+    else:
+        order = "format = %s DESC, original DESC"
+
+    query = "SELECT DISTINCT ON (song_id) song_id, file_name, content_hash FROM song_renditions"
+    if where_clause:
+        query += f" WHERE song_id IN (SELECT id FROM songs WHERE {where_clause})"
+    query += f" ORDER BY song_id, {order}"
+
+    if rendition != "smallest":
+        values = list(values) + [rendition]
+
+    return query, values
+
+
+def build_assignments(metadata):
+    """
+    Builds the new values of a modification.
+
+    Args:
+        metadata (dict): The new values of the columns. The tags can also be changed with add_tags (a list of
+            tags appended, the ones already present being skipped) and remove_tags (a list of tags removed).
+
+    Returns:
+        list: A (column, SQL expression, values of the expression) tuple for each modified column.
+
+    Raises:
+        ValueError: If a column can't be modified, or the tags are both replaced and changed.
+    """
+
+    assignments = []
+
+    for column, value in metadata.items():
+        if column in ("add_tags", "remove_tags"):
+            continue
+        if column not in MODIFIABLE_COLUMNS:
+            raise ValueError(f"The column {column} can't be modified.")
+        assignments.append((column, "%s", [value]))
+
+    add_tags = metadata.get("add_tags")
+    remove_tags = metadata.get("remove_tags")
+
+    if add_tags is None and remove_tags is None:
+        return assignments
+
+    if "tags" in metadata:
+        raise ValueError("The tags can't be replaced and changed with add_tags or remove_tags at once.")
+
+    expression = "coalesce(tags, '{}')"
+    values = []
+
+    if remove_tags:
+        expression = f"ARRAY(SELECT tag FROM unnest({expression}) AS tag WHERE tag <> ALL(%s::TEXT[]))"
+        values.append(list(remove_tags))
+
+    if add_tags:
+        # Fiecare tag o singura data, in ordinea primei aparitii
+        expression = f'''ARRAY(SELECT tag FROM unnest({expression} || %s::TEXT[]) WITH ORDINALITY AS t (tag, position)
+                              GROUP BY tag ORDER BY min(position))'''
+        values.append(list(add_tags))
+
+    assignments.append(("tags", expression, values))
+    return assignments
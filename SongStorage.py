@@ -1,357 +1,2050 @@
-import shutil
-import psycopg2
-from pygame import mixer
-import zipfile
+from ArchiveBuilder import ArchiveBuilder, IncrementalArchive, detect_format, unique_arcname
+from BlobStore import BlobStore
+from ChangeFeed import ChangeFeed
+from Journal import Journal
+from MetadataExtractor import MetadataExtractor, TECHNICAL_COLUMNS
+from Player import PLAYABLE_FORMATS, PlaybackQueue, Player
+from SongQueries import LOCK_BLOBS, SONG_COLUMNS, build_assignments, build_stored_files, build_where
+from StorageBackend import LocalStorageBackend, RangeReader, ShardedLocalStorageBackend
+from StorageScanner import StorageScanner
+from Transcoder import LOUDNESS_COLUMNS, Transcoder, replay_gain
+from ConnectionPool import ConnectionPool, get_pool
+from Database import ensure_schema
+from psycopg2 import DatabaseError
+from psycopg2.extras import execute_values
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+import uuid
+import json
 import os
 
+# Coloanele dupa care tabelul de melodii poate fi sortat (au index (coloana, id))
+SORTABLE_COLUMNS = ("id", "file_name", "artist", "song_name", "release_date")
+
+# Sub acest numar estimat de melodii, numaratoarea exacta e ieftina
+EXACT_COUNT_LIMIT = 100000
+
+# Copiile locale ale fisierelor din stocarile la distanta, pentru coada de redare
+DOWNLOAD_DIR = os.path.join("Cache", "downloads")
+
+# Forma fiecarei cautari verificate de check_search_indexes, cu o valoare de exemplu
+SEARCH_SHAPES = {
+    "artist": "Queen",
+    "song_name": "Bohemian Rhapsody",
+    "release_date": "1975-10-31",
+    "tags": ["rock"],
+    "format": "mp3",
+}
+
 class SongStorage:
     """
     A class for mapping songs in a storage system with metadata stored in a PostgreSQL database
     and the songs files in a storage folder.
     """
 
-    def __init__(self):
+    def __init__(self, pool=None, minconn=None, maxconn=None, cache=None, backend=None, extractor=None,
+                 player=None, transcoder=None, journal=None):
         """
         Initialize the SongStorage class, setting up the storage directory and the
-        database connection.
+        database connection pool.
+
+        Args:
+            pool (ConnectionPool): Pool used for the database connections. If not provided, the pool shared by
+                the whole process is used, unless minconn or maxconn request a dedicated one.
+            minconn (int): Minimum size of a dedicated pool.
+            maxconn (int): Maximum size of a dedicated pool.
+            cache (SongCache): Optional cache of the songs metadata and of the recent searches.
+            backend (StorageBackend): Where the song files are stored, by default sharded subdirectories of
+                the storage folder.
+            extractor (MetadataExtractor): Reads the tags and the technical data of the added files.
+            player (Player): Plays the songs, created if not provided.
+            transcoder (Transcoder): Optional ingest stage, converting the added songs to a canonical format
+                and measuring their loudness. Without it the songs are stored as they are.
+            journal (Journal): Write-ahead journal of the file operations. The operations left unfinished by
+                a crash are completed or rolled back when the storage is created.
         """
 
         self.STORAGE_PATH = "Storage"
-        self.db_conn = psycopg2.connect(
-            database="SongStorage",
-            user='postgres',
-            password='password',
-            host='localhost',
-            port='5432'
-        )
-        self.db_conn.autocommit = True
-        self.db_cursor = self.db_conn.cursor()
+        self.backend = backend or ShardedLocalStorageBackend(self.STORAGE_PATH)
+        self.blob_store = BlobStore(self.backend)
+        # Melodiile adaugate inainte de stocarea dupa continut, pastrate dupa nume
+        self.legacy_backend = LocalStorageBackend(self.STORAGE_PATH)
+        self._owns_pool = pool is None and (minconn is not None or maxconn is not None)
+
+        if self._owns_pool:
+            self.pool = ConnectionPool(minconn=minconn or 1, maxconn=maxconn or 10)
+        else:
+            self.pool = pool or get_pool()
+
+        ensure_schema(self.pool)  # O singura verificare pe proces
+
+        self.cache = cache
+        self.extractor = extractor or MetadataExtractor()
+        self.player = player or Player()
+        self.transcoder = transcoder
+        self.journal = journal or Journal()
+        self._queue = None
+        self._feed = None
+
+        if self.journal.has_leftovers():
+            self.recover()
+
+
+    def recover(self):
+        """
+        Completes or rolls back the file operations left unfinished by a crash, from the journals of the
+        processes that stopped: a file recorded by an unfinished add or delete is kept if the database uses it
+        and removed otherwise.
+
+        Returns:
+            int: Number of unfinished operations found.
+        """
+
+        found = self.journal.recover(self._resolve_files)
+
+        if found:
+            print(f"{found} unfinished file operations have been recovered.")
+
+        return found
+
+
+    def _resolve_files(self, keys):
+        """
+        Keeps the files of the given keys that the database uses and removes the others.
+
+        Args:
+            keys (list): (store, key) pairs, store being "blobs" or "legacy".
+        """
+
+        blob_keys = [key for store, key in keys if store == "blobs"]
+        legacy_keys = [key for store, key in keys if store == "legacy"]
+
+        with self.pool.cursor() as cursor:
+            # Randurile ramase fara melodii (adaugari anulate) sunt sterse odata cu fisierele lor
+            cursor.execute('''DELETE FROM blobs WHERE content_hash = ANY(%s) AND refcount <= 0''', (blob_keys,))
+            cursor.execute('''SELECT content_hash FROM blobs WHERE content_hash = ANY(%s)''', (blob_keys,))
+            used = {row[0] for row in cursor.fetchall()}
+
+            cursor.execute(
+                '''SELECT file_name FROM songs WHERE content_hash IS NULL AND file_name = ANY(%s)''',
+                (legacy_keys,)
+            )
+            used.update(("legacy", row[0]) for row in cursor.fetchall())
+
+        for key in blob_keys:
+            if key not in used and self._delete_blob(key):
+                print(f"File {key} of an unfinished operation has been removed from storage folder.")
+
+        for key in legacy_keys:
+            if ("legacy", key) not in used and self.legacy_backend.delete(key):
+                print(f"File {key} of an unfinished operation has been removed from storage folder.")
+
+
+    def get_song(self, id_song):
+        """
+        Gets a song by its ID, from the cache if possible.
+
+        Args:
+            id_song (int): ID of the song.
+
+        Returns:
+            tuple: The song record or None if there is no song with this ID.
+        """
+
+        if self.cache:
+            song = self.cache.get_song(id_song)
+            if song is not None:
+                return song
+
+        with self.pool.cursor() as cursor:
+            cursor.execute(
+                f'''SELECT {SONG_COLUMNS} FROM songs WHERE id = %s''',
+                (id_song,)
+            )
+
+            song = cursor.fetchone()
+
+        if song and self.cache:
+            self.cache.put_song(song)
+
+        return song
 
 
     def add_song(self, file_path, *metadata):
         """
         Adds a song file to the storage folder and its metadata to the database.
 
+        The file is stored by the hash of its content, so adding the same audio again under another name
+        doesn't use extra disk space. The metadata left empty is read from the tags of the file, together with
+        its duration, bitrate, sample rate and codec.
+
         Args:
             file_path (str): Song file path.
-            metadata (tuple): A tuple containing artist, song_name, release_date and tags information.
+            metadata (tuple): A tuple containing artist, song_name, release_date and tags information, None or
+                empty for the ones to be read from the file.
 
         Returns:
             int: ID of the added song.
 
         Raises:
-            ValueError: If not all metadata has been provided or the song already exists in database.
-            FileExistsError: If the file already exists in the storage folder.
+            ValueError: If not all metadata has been provided, the artist or the song name is missing from both
+                the arguments and the file, or the song already exists in database.
             Exception: If there are errors during copying the song file into storage folder or database operations.
         """
 
         if len(metadata) != 4:
             raise ValueError("Expected 4 metadata arguments: artist, song_name, release_date, and tags.")
 
-        artist, song_name, release_date, tags = metadata
+        extracted = self.extractor.extract(file_path)
+        artist, song_name, release_date, tags = self.extractor.complete(metadata, extracted)
 
-        if not os.path.exists(self.STORAGE_PATH):
-            os.makedirs(self.STORAGE_PATH)
+        if not artist or not song_name:
+            raise ValueError("The artist and the song name must be provided when the file has no tags for them.")
 
         file_name = os.path.basename(file_path)
-        new_path = os.path.join(self.STORAGE_PATH, file_name)
+        content_hash, size = self.blob_store.hash_file(file_path)
 
-        if os.path.exists(new_path):
-            raise FileExistsError(f"File {file_name} already exists in storage folder.")
-
-        self.db_cursor.execute(
-            '''SELECT 1 FROM songs WHERE file_name = %s AND song_name = %s 
-            AND artist = %s AND release_date = %s AND tags = %s LIMIT 1''',
-            (file_name, artist, song_name, release_date, tags)
-        )
+        with self.pool.cursor() as cursor:
+            cursor.execute(
+                '''SELECT 1 FROM songs WHERE content_hash = %s AND artist = %s AND song_name = %s LIMIT 1''',
+                (content_hash, artist, song_name)
+            )
 
-        # Exista deja o melodie cu aceleasi date
-        existing_song = self.db_cursor.fetchone()
+            # Exista deja o melodie cu acelasi continut si aceleasi date
+            existing_song = cursor.fetchone()
 
         if existing_song:
             raise ValueError(f"A song with the same data already exists in the database.")
 
-        try:
-            shutil.copy(file_path, new_path)  # Copiaza fișierul in Storage
-            print(f"File copied successfully to {new_path}.")
-        except Exception as e:
-            print(f"Error while adding the song {file_name} into storage folder: {e}.")
-            raise
+        # Daca procesul cade inainte de INSERT, fisierul copiat e sters la recuperare
+        entry = self.journal.begin("add", [("blobs", content_hash)])
 
-        try:
-            self.db_cursor.execute(
-                '''
-                INSERT INTO songs (file_name, artist, song_name, release_date, tags)
-                VALUES (%s, %s, %s, %s, %s)
-                RETURNING id;
-                ''',
-                (file_name, artist, song_name, release_date, tags)
-            )
+        song_id = self._store_song(file_path, file_name, content_hash, size,
+                                   (artist, song_name, release_date, tags), extracted)
+        self.journal.done(entry)
 
-            song_id = self.db_cursor.fetchone()[0]
+        if self.transcoder is not None:
+            self._ingest([song_id])
 
-            print(f"Song added successfully with ID: {song_id}.")
-            return song_id
-        except Exception as e:
-            print(f"Error while adding the song {file_name} into database: {e}.")
-            raise
+        return song_id
 
 
-    def delete_song(self, id_song):
+    def _store_song(self, file_path, file_name, content_hash, size, metadata, extracted):
         """
-        Deletes a song file from storage file and its metadata from database.
-        The song is identified by its ID.
+        Copies a song file into storage and inserts its metadata, for add_song, inside a journal operation.
 
         Args:
-            id_song (int): ID of the song to delete.
+            file_path (str): Song file path.
+            file_name (str): Name of the song file.
+            content_hash (str): SHA-256 hex digest of the file.
+            size (int): Size of the file.
+            metadata (tuple): The artist, song_name, release_date and tags.
+            extracted (dict): The metadata read from the file.
 
-        Raises:
-            ValueError: If the song ID doesn't exist in the database.
-            FileNotFoundError: If the song file doesn't exist in the storage folder.
-            Exception: If there are errors during deleting the song file from storage folder or database operations.
+        Returns:
+            int: ID of the added song.
         """
 
-        self.db_cursor.execute(
-            '''SELECT * FROM songs WHERE id = %s''',
-            (id_song,)
-        )
-
-        result = self.db_cursor.fetchone()
+        artist, song_name, release_date, tags = metadata
 
-        if not result:
-            raise ValueError(f"No song found with ID: {id_song}")
+        with self.pool.cursor() as cursor:
+            # Fisierul gasit in storage nu poate fi sters de o stergere concurenta pana la INSERT
+            self._lock_blobs(cursor, [content_hash])
 
-        file_name = result[1]
-        file_path = os.path.join(self.STORAGE_PATH, file_name)
+            try:
+                _, copied = self.blob_store.put(file_path, content_hash)  # Copiaza fișierul in Storage
+                if copied:
+                    print(f"File {file_name} copied successfully to storage as {content_hash}.")
+                else:
+                    print(f"File {file_name} is already in storage folder.")
+            except Exception as e:
+                print(f"Error while adding the song {file_name} into storage folder: {e}.")
+                raise
 
-        if os.path.exists(file_path):
             try:
-                os.remove(file_path)
-                print(f"File {file_name} has been removed from storage folder.")
+                cursor.execute(
+                    '''INSERT INTO blobs (content_hash, size) VALUES (%s, %s) ON CONFLICT (content_hash) DO NOTHING''',
+                    (content_hash, size)
+                )
+                cursor.execute(
+                    f'''
+                    INSERT INTO songs (file_name, artist, song_name, release_date, tags, content_hash,
+                                       {', '.join(TECHNICAL_COLUMNS)})
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    RETURNING {SONG_COLUMNS};
+                    ''',
+                    (file_name, artist, song_name, release_date, tags, content_hash)
+                    + tuple(extracted.get(column) for column in TECHNICAL_COLUMNS)
+                )
+
+                song = cursor.fetchone()
+                song_id = song[0]
             except Exception as e:
-                print(f"Error deleting the file from storage folder: {file_name}: {e}.")
+                print(f"Error while adding the song {file_name} into database: {e}.")
+
+                if copied:
+                    self.blob_store.delete(content_hash)
                 raise
-        else:
-            raise FileNotFoundError(f"File {file_name} does not exist in storage folder.")
 
-        try:
-            self.db_cursor.execute(
-                '''DELETE FROM songs WHERE id = %s''',
-                (id_song,)  # Tuplu
-            )
+        if self.cache:
+            self.cache.song_added(song)
 
-            print(f"Song successfully deleted with ID: {id_song}.")
-        except Exception as e:
-            print(f"Error while deleting song with ID: {id_song} : {e}.")
-            raise
+        print(f"Song added successfully with ID: {song_id}.")
+        return song_id
 
 
-    def modify_data(self, id_song, **metadata):
+    def add_songs(self, songs, batch_size=500, max_workers=8, progress=None, cancel_event=None):
         """
-        Modifies the metadata of a song existing in the database.
-        The song is identified by its ID.
+        Adds many song files to the storage folder and their metadata to the database.
+
+        The songs are processed in batches: the files are hashed and copied in parallel, the duplicates of a batch
+        are found with a single query and the metadata is inserted with multi-row INSERTs inside one transaction
+        (if a row is rejected, the songs of the batch are inserted one by one, each under its own savepoint).
+        The tags and technical data of the files are read as in add_song, on a pool of processes for the large
+        imports. An invalid song doesn't stop the import, its error is reported in the result instead.
 
         Args:
-            id_song (int): ID of the song to modify.
-            **metadata: Key-value pairs representing the fields to update and their new values.
+            songs (iterable): (file_path, metadata) pairs, metadata being a tuple containing artist, song_name,
+                release_date and tags information (None or empty for the ones to be read from the file).
+            batch_size (int): Number of songs processed in a batch.
+            max_workers (int): Maximum number of threads reading and copying files at the same time.
+            progress (callable): Called with the number of songs processed and their total (None if unknown)
+                after each batch.
+            cancel_event (threading.Event): When set, the batches not started yet are skipped, their songs
+                being reported with a CancelledError. The batches already added stay added.
 
         Returns:
-            None
-
-        Raises:
-             ValueError: If in the database isn't a song with the specified ID.
-             Exception: If an error occurs during the database operation or during the modifying process.
+            list: A (file_path, song_id, error) tuple for each song, in the input order. For an added song
+                error is None, otherwise song_id is None.
         """
 
-        self.db_cursor.execute(
-            '''SELECT * FROM songs WHERE id = %s''',
-            (id_song,)
-        )
+        results = []
+        batch = []
+        total = len(songs) if hasattr(songs, "__len__") else None
 
-        result = self.db_cursor.fetchone()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor, \
+                self.extractor.process_pool(total) as processes:
+            for file_path, metadata in songs:
+                batch.append((file_path, tuple(metadata)))
 
-        if not result:
-            raise ValueError(f"No song found with ID: {id_song}")
+                if len(batch) >= batch_size:
+                    results.extend(self._add_songs_batch(batch, executor, processes, cancel_event))
+                    batch = []
 
-        clauses = []
-        values = []
+                    if progress is not None:
+                        progress(len(results), total)
 
-        for clause, value in metadata.items():
-            clauses.append(f"{clause} = %s")
-            values.append(value)
+            if batch:
+                results.extend(self._add_songs_batch(batch, executor, processes, cancel_event))
 
-        values.append(id_song)
+                if progress is not None:
+                    progress(len(results), total)
 
-        query = f"UPDATE songs SET {', '.join(clauses)} WHERE id = %s"
-        try:
-            self.db_cursor.execute(query, tuple(values))
+        added = [song_id for _, song_id, _ in results if song_id is not None]
+        print(f"{len(added)} of {len(results)} songs added successfully.")
 
-            print(f"Song with ID: {id_song} succssfully modified.")
-        except Exception as e:
-            print(f"Error while modifying song with ID: {id_song} : {e}.")
+        if self.transcoder is not None and added:
+            self._ingest(added, batch_size, cancel_event)
 
+        return results
 
-    def search(self, **criteria):
+
+    def _add_songs_batch(self, batch, executor, processes=None, cancel_event=None):
         """
-        Searches for songs in the database that meet the criteria.
+        Adds a batch of songs for add_songs.
 
         Args:
-            **criteria: Key-value pairs representing the criteria for searching process.
+            batch (list): (file_path, metadata) pairs.
+            executor (ThreadPoolExecutor): Executor used for hashing and copying the files.
+            processes (ProcessPoolExecutor): Pool reading the tags of the files, None to read them here.
+            cancel_event (threading.Event): Skips the batch when set.
 
         Returns:
-            list: A list of matching songs.
-
-        Raises:
-            Exception: If there are errors in the database operation or in the search process.
+            list: A (file_path, song_id, error) tuple for each song of the batch.
         """
 
-        try:
-            clauses = []
-            values = []
-
-            for clause, value in criteria.items():
-                if clause == "format":
-                    clauses.append("file_name LIKE %s")
-                    values.append(f"%.{value}")
-                elif isinstance(value, list):  # Tags
-                    clauses.append(f"{clause} && %s")  # PostgreSQL overlap array operator
-                    values.append(value)
-                else:
-                    clauses.append(f"{clause} = %s")
-                    values.append(value)
+        if cancel_event is not None and cancel_event.is_set():
+            return [(file_path, None, CancelledError("The import was cancelled.")) for file_path, _ in batch]
 
-            where_clause = 'AND '.join(clauses)
+        errors = {}
+        hashes = {}
 
-            query = "SELECT * FROM songs"
-            if clauses:
-                query += f" WHERE {where_clause}"
+        for index, (file_path, metadata) in enumerate(batch):
+            if len(metadata) != 4:
+                errors[index] = ValueError("Expected 4 metadata arguments: artist, song_name, release_date, and tags.")
+            else:
+                hashes[index] = executor.submit(self.blob_store.hash_file, file_path)
 
-            self.db_cursor.execute(query, tuple(values))
+        # Tagurile sunt citite cat timp firele calculeaza hash-urile
+        extracted = dict(zip(hashes, self.extractor.extract_many([batch[index][0] for index in hashes], processes)))
+        batch = list(batch)
 
-            results = self.db_cursor.fetchall()
+        for index in list(hashes):
+            file_path, metadata = batch[index]
+            metadata = self.extractor.complete(metadata, extracted[index])
+            batch[index] = (file_path, metadata)
 
-            if not results:
-                print("No songs match the criteria.")
-                return []
+            if not metadata[0] or not metadata[1]:
+                errors[index] = ValueError(f"The artist and the song name of {file_path} are missing.")
+                hashes.pop(index).cancel()
 
-            return results
+        pending = {}  # index -> (file_name, content_hash, size)
+        keys = set()
+
+        for index, future in hashes.items():
+            file_path, (artist, song_name, _, _) = batch[index]
+
+            try:
+                content_hash, size = future.result()
+            except Exception as e:
+                print(f"Error while reading the song {file_path}: {e}.")
+                errors[index] = e
+                continue
+
+            if (content_hash, artist, song_name) in keys:
+                errors[index] = ValueError(f"Song {file_path} appears more than once in the import.")
+            else:
+                pending[index] = (os.path.basename(file_path), content_hash, size)
+                keys.add((content_hash, artist, song_name))
+
+        # Un singur SELECT pentru tot lotul
+        with self.pool.cursor() as cursor:
+            cursor.execute(
+                '''SELECT content_hash, artist, song_name FROM songs WHERE content_hash = ANY(%s)''',
+                (list({content_hash for _, content_hash, _ in pending.values()}),)
+            )
+            existing = set(cursor.fetchall())
+
+        for index, (_, content_hash, _) in list(pending.items()):
+            artist, song_name = batch[index][1][:2]
+
+            if (content_hash, artist, song_name) in existing:
+                errors[index] = ValueError(f"A song with the same data as {batch[index][0]} already exists in the database.")
+                del pending[index]
+
+        # Un singur articol de jurnal pentru tot lotul, inaintea copierii fisierelor. O operatie care esueaza
+        # ramane nefinalizata in jurnal, fisierele ei fiind verificate la urmatoarea recuperare
+        entry = self.journal.begin("add", [("blobs", content_hash) for _, content_hash, _ in pending.values()])
+        copied = set()
+        song_ids = {}
+
+        try:
+            # Toate randurile lotului intr-o singura tranzactie, care tine lacatele fisierelor de la copiere
+            # pana la commit, ca o stergere concurenta sa nu stearga un fisier gasit deja in storage
+            with self.pool.cursor() as cursor:
+                self._lock_blobs(cursor, [content_hash for _, content_hash, _ in pending.values()])
+
+                copies = {index: executor.submit(self.blob_store.put, batch[index][0], content_hash)
+                          for index, (_, content_hash, _) in pending.items()}
+
+                for index, copy in copies.items():
+                    try:
+                        content_hash, was_copied = copy.result()
+                        if was_copied:
+                            copied.add(content_hash)
+                    except Exception as e:
+                        print(f"Error while adding the song {pending[index][0]} into storage folder: {e}.")
+                        errors[index] = e
+                        del pending[index]
+
+                if pending:
+                    songs = {index: (batch[index][1], file_name, content_hash, size, extracted[index])
+                             for index, (file_name, content_hash, size) in pending.items()}
+
+                    try:
+                        cursor.execute("SAVEPOINT batch")
+                        song_ids = dict(zip(songs, self._insert_songs(cursor, list(songs.values()))))
+                    except DatabaseError as e:
+                        # Un singur rand invalid anuleaza tot lotul, asa ca randurile sunt reluate unul cate unul
+                        cursor.execute("ROLLBACK TO SAVEPOINT batch")
+                        print(f"Error while adding a batch of {len(pending)} songs into database, "
+                              f"adding them one by one: {e}.")
+                        song_ids = self._insert_songs_separately(cursor, songs, errors)
+
+                # Fisierele copiate acum care nu au metadate sunt sterse, cat timp lacatele sunt tinute
+                for content_hash in copied - {pending[index][1] for index in song_ids}:
+                    self.blob_store.delete(content_hash)
+
+            if song_ids and self.cache:
+                self.cache.song_added()
         except Exception as e:
-            print(f"Error while searching for songs: {e}")
-            raise
+            print(f"Error while adding a batch of {len(pending)} songs into database: {e}.")
+            song_ids = {}
+
+            for index in pending:
+                errors[index] = e
+
+            for content_hash in copied:
+                self._delete_blob(content_hash)
+
+        self.journal.done(entry)
 
+        return [(file_path, song_ids.get(index), errors.get(index))
+                for index, (file_path, _) in enumerate(batch)]
 
-    def create_save_list(self, arhive_path,**criteria):
+
+    def _insert_songs(self, cursor, songs):
         """
-        Create a ZIP archive containing the song files that meet the given criteria.
+        Inserts songs and their blobs, for _add_songs_batch.
 
         Args:
-            arhive_path (str): Path to the archive.
-            **criteria: Key-value pairs representing the criteria for searching songs process.
+            cursor (cursor): Cursor of the transaction.
+            songs (list): (metadata, file_name, content_hash, size, technical data) tuples.
 
         Returns:
-            list: A list of file names that has been added to the archive.
+            list: The IDs of the songs, in the same order.
+        """
 
-        Raises:
-            Exception: If no songs match the criteria or an error occurs during the process.
+        blobs = {content_hash: size for _, _, content_hash, size, _ in songs}
+        execute_values(
+            cursor,
+            '''INSERT INTO blobs (content_hash, size) VALUES %s ON CONFLICT (content_hash) DO NOTHING''',
+            list(blobs.items()),
+            page_size=len(blobs)
+        )
+
+        # ID-urile sunt rezervate dinainte, ca fiecare melodie sa-si stie ID-ul
+        cursor.execute(
+            '''SELECT nextval(pg_get_serial_sequence('songs', 'id')) FROM generate_series(1, %s)''',
+            (len(songs),)
+        )
+        song_ids = [row[0] for row in cursor.fetchall()]
+
+        rows = [(song_id, file_name) + metadata + (content_hash,)
+                + tuple(technical.get(column) for column in TECHNICAL_COLUMNS)
+                for song_id, (metadata, file_name, content_hash, _, technical) in zip(song_ids, songs)]
+        execute_values(
+            cursor,
+            f'''
+            INSERT INTO songs (id, file_name, artist, song_name, release_date, tags, content_hash,
+                               {', '.join(TECHNICAL_COLUMNS)})
+            VALUES %s
+            ''',
+            rows,
+            page_size=len(rows)
+        )
+
+        return song_ids
+
+
+    def _insert_songs_separately(self, cursor, songs, errors):
         """
+        Inserts the songs of a batch that failed as a whole, each under its own savepoint, so every error is
+        reported for its song and the valid songs are still added.
 
-        try:
-            songs = self.search(**criteria)
+        Args:
+            cursor (cursor): Cursor of the transaction of the batch.
+            songs (dict): index -> (metadata, file_name, content_hash, size, technical data).
+            errors (dict): index -> error, completed with the songs that can't be inserted.
 
-            if not songs:
-                print("No songs match the criteria.")
-                raise
+        Returns:
+            dict: index -> ID of the inserted songs.
+        """
 
-            song_names = []
+        song_ids = {}
 
-            with zipfile.ZipFile(arhive_path, 'w', zipfile.ZIP_DEFLATED) as arhive:
-                for song in songs:
-                    file_name = song[1]
-                    file_path = os.path.join(self.STORAGE_PATH, file_name)
+        for index, song in songs.items():
+            cursor.execute("SAVEPOINT song")
 
-                    if os.path.exists(file_path):
-                        print(f"Adding file: {file_path}.")
-                        arhive.write(file_path, file_name)
-                        print(f"Added {file_name} into arhive.")
-                        song_names.append(file_name)
-                    else:
-                        print(f"File {file_path} not found.")
+            try:
+                song_ids[index] = self._insert_songs(cursor, [song])[0]
+                cursor.execute("RELEASE SAVEPOINT song")
+            except DatabaseError as e:
+                cursor.execute("ROLLBACK TO SAVEPOINT song")
+                print(f"Error while adding the song {song[1]} into database: {e}.")
+                errors[index] = e
 
-            return song_names
-        except Exception as e:
-            print(f"Error while creating the archive: {e}.")
-            raise
+        return song_ids
 
 
-    def play(self, file_path):
+    @staticmethod
+    def _lock_blobs(cursor, content_hashes):
         """
-        Plays a song file.
+        Locks stored contents until the end of the transaction of the cursor. An add holds the lock from
+        the check of the stored file to the insert of its song, and a file no song uses is removed under
+        the same lock (see _delete_blob), so a concurrent delete never removes the file of a song being added.
 
         Args:
-            file_path (str): Path to the song file to play.
+            cursor (cursor): Cursor of the transaction.
+            content_hashes (iterable): SHA-256 hex digests of the contents.
         """
 
-        mixer.init()
-        mixer.music.load(file_path)
-        mixer.music.set_volume(0.7)
-        mixer.music.play()
+        # In aceeasi ordine in toate tranzactiile, ca doua adaugari sa nu se blocheze reciproc
+        cursor.execute(LOCK_BLOBS, (sorted(set(content_hashes)),))
 
-        # Play in consola
-        # while True:
-        #
-        #     print("Press 'p' to pause, 'r' to resume")
-        #     print("Press 'e' to exit the program")
-        #     query = input("  ")
-        #
-        #     if query == 'p':
-        #         mixer.music.pause()
-        #     elif query == 'r':
-        #         mixer.music.unpause()
-        #     elif query == 'e':
-        #         mixer.music.stop()
-        #         break
 
-
-    def pause(self):
+    def _delete_blob(self, content_hash):
         """
-        Pauses the currently playing song.
+        Removes a stored content no song uses, under its lock, unless a song added meanwhile uses it again.
+
+        Args:
+            content_hash (str): SHA-256 hex digest of the content.
+
+        Returns:
+            bool: True if the file was removed.
         """
 
-        mixer.music.pause()
+        with self.pool.cursor() as cursor:
+            self._lock_blobs(cursor, [content_hash])
+            cursor.execute('''SELECT 1 FROM blobs WHERE content_hash = %s''', (content_hash,))
 
+            if cursor.fetchone() is not None:
+                return False
 
-    def resume(self):
+            return self.blob_store.delete(content_hash)
+
+
+    def fill_audio_info(self, batch_size=500, progress=None):
         """
-        Resumes a paused song.
+        Reads the technical data (duration, bitrate, sample rate, codec) of the songs added before it was stored,
+        i.e. the songs without a codec. Only the files kept on the local disk are read.
+
+        Args:
+            batch_size (int): Number of songs read at a time.
+            progress (callable): Called with the number of songs checked and their total after each batch.
+
+        Returns:
+            int: Number of songs updated.
+        """
+
+        with self.pool.cursor() as cursor:
+            cursor.execute('''SELECT count(*) FROM songs WHERE codec IS NULL''')
+            total = cursor.fetchone()[0]
+
+        checked = updated = 0
+        last_id = 0
+
+        with self.extractor.process_pool(total) as processes:
+            while True:
+                # Paginare dupa ID, fisierele necitibile raman cu codec NULL
+                with self.pool.cursor() as cursor:
+                    cursor.execute(
+                        '''SELECT id, file_name, content_hash FROM songs
+                           WHERE codec IS NULL AND id > %s ORDER BY id LIMIT %s''',
+                        (last_id, batch_size)
+                    )
+                    songs = cursor.fetchall()
+
+                if not songs:
+                    break
+
+                last_id = songs[-1][0]
+                local = []
+
+                for id_song, file_name, content_hash in songs:
+                    backend, key = self._locate(file_name, content_hash)
+                    path = backend.local_path(key)
+
+                    if path and os.path.exists(path):
+                        local.append((id_song, path))
+
+                extracted = self.extractor.extract_many([path for _, path in local], processes)
+                rows = [(id_song,) + tuple(info.get(column) for column in TECHNICAL_COLUMNS)
+                        for (id_song, _), info in zip(local, extracted) if info]
+
+                if rows:
+                    with self.pool.cursor() as cursor:
+                        execute_values(
+                            cursor,
+                            '''
+                            UPDATE songs SET duration = v.duration, bitrate = v.bitrate,
+                                             sample_rate = v.sample_rate, codec = v.codec
+                            FROM (VALUES %s) AS v (id, duration, bitrate, sample_rate, codec)
+                            WHERE songs.id = v.id
+                            ''',
+                            rows,
+                            template="(%s, %s::REAL, %s::INTEGER, %s::INTEGER, %s)",
+                            page_size=len(rows)
+                        )
+
+                    if self.cache:
+                        for id_song, *_ in rows:
+                            self.cache.song_modified(id_song)
+
+                checked += len(songs)
+                updated += len(rows)
+
+                if progress is not None:
+                    progress(checked, total)
+
+        print(f"Audio data read for {updated} of {checked} songs.")
+        return updated
+
+
+    def transcode_songs(self, ids=None, batch_size=100, progress=None, cancel_event=None, transcoder=None,
+                        retry_failed=False):
         """
+        Converts the songs to the canonical format of the transcoder and measures their loudness, for the songs
+        not processed yet. The converted files (renditions) are stored by content like the originals and
+        tracked in the renditions table, so playback and archives use them without converting at request time.
 
-        mixer.music.unpause()
+        Each measurement is recorded in loudness_checked_at, so the songs whose loudness can't be measured
+        (e.g. not WAV files without ffmpeg, silent files) aren't read again at the next calls.
 
+        Args:
+            ids (list): IDs of the songs to process, all the songs if not provided.
+            batch_size (int): Number of songs processed at a time, on the process pool of the transcoder.
+            progress (callable): Called with the number of songs checked and their total after each batch.
+            cancel_event (threading.Event): Stops before the next batch when set.
+            transcoder (Transcoder): Transcoder used instead of the one of the storage (or a default one).
+            retry_failed (bool): Whether to measure again the songs whose loudness couldn't be measured before
+                (e.g. after installing ffmpeg).
 
-    def stop(self):
+        Returns:
+            int: Number of renditions made.
         """
-        Stops the currently playing song.
+
+        if ids is not None and not ids:
+            return 0
+
+        transcoder = transcoder or self.transcoder or Transcoder()
+        target = transcoder.target_format if transcoder.can_transcode else None
+
+        # Melodiile fara intensitate masurata (si neincercate) sau fara fisier in formatul tinta
+        condition = '''((s.loudness IS NULL AND (%(retry)s OR s.loudness_checked_at IS NULL))
+                        OR (%(target)s IS NOT NULL AND s.format IS DISTINCT FROM %(target)s
+                        AND NOT EXISTS (SELECT 1 FROM renditions r
+                                        WHERE r.song_id = s.id AND r.format = %(target)s)))
+                       AND (%(ids)s::INTEGER[] IS NULL OR s.id = ANY(%(ids)s::INTEGER[]))'''
+        parameters = {"target": target, "ids": list(ids) if ids is not None else None, "retry": retry_failed}
+
+        with self.pool.cursor() as cursor:
+            cursor.execute(f'''SELECT count(*) FROM songs s WHERE {condition}''', parameters)
+            total = cursor.fetchone()[0]
+
+        checked = made = 0
+        last_id = 0
+
+        with transcoder.process_pool(total) as processes:
+            while cancel_event is None or not cancel_event.is_set():
+                with self.pool.cursor() as cursor:
+                    cursor.execute(
+                        f'''SELECT s.id, s.file_name, s.content_hash, s.format, s.loudness IS NULL,
+                                   EXISTS (SELECT 1 FROM renditions r WHERE r.song_id = s.id AND r.format = %(target)s)
+                            FROM songs s WHERE {condition} AND s.id > %(last_id)s ORDER BY s.id LIMIT %(limit)s''',
+                        dict(parameters, last_id=last_id, limit=batch_size)
+                    )
+                    songs = cursor.fetchall()
+
+                if not songs:
+                    break
+
+                last_id = songs[-1][0]
+                files = []
+
+                for id_song, file_name, content_hash, file_format, _, has_rendition in songs:
+                    try:
+                        backend, key = self._locate(file_name, content_hash)
+                        file_path = self._local_file(backend, key)
+                    except Exception as e:
+                        print(f"Error while reading the song {file_name}: {e}.")
+                        continue
+
+                    transcode = not has_rendition and transcoder.needs_rendition(file_format)
+                    files.append((id_song, file_name, file_path, file_format, transcode))
+
+                results = transcoder.process_many([file[2:] for file in files], processes)
+                loudness = []
+
+                for (id_song, file_name, *_), result in zip(files, results):
+                    # Si masuratorile esuate sunt inregistrate
+                    loudness.append((id_song, result.get("loudness"), result.get("peak")))
+
+                    if "rendition" in result:
+                        made += self._add_rendition(id_song, file_name, transcoder.target_format, result["rendition"])
+
+                if loudness:
+                    with self.pool.cursor() as cursor:
+                        execute_values(
+                            cursor,
+                            '''
+                            UPDATE songs SET loudness = coalesce(v.loudness, songs.loudness),
+                                             peak = coalesce(v.peak, songs.peak), loudness_checked_at = now()
+                            FROM (VALUES %s) AS v (id, loudness, peak)
+                            WHERE songs.id = v.id
+                            ''',
+                            loudness,
+                            template="(%s, %s::REAL, %s::REAL)",
+                            page_size=len(loudness)
+                        )
+
+                if self.cache:
+                    for id_song, *_ in songs:
+                        self.cache.song_modified(id_song)
+
+                checked += len(songs)
+
+                if progress is not None:
+                    progress(checked, total)
+
+        print(f"{made} renditions made for {checked} songs.")
+        return made
+
+
+    def _ingest(self, ids, batch_size=100, cancel_event=None):
+        """
+        Runs the ingest stage of the transcoder on the songs just added. A failure doesn't undo the addition,
+        the songs can be processed again with transcode_songs.
+
+        Args:
+            ids (list): IDs of the added songs.
+            batch_size (int): Number of songs processed at a time.
+            cancel_event (threading.Event): Stops before the next batch when set.
         """
 
-        mixer.music.stop()
+        try:
+            self.transcode_songs(ids, batch_size, cancel_event=cancel_event)
+        except Exception as e:
+            print(f"Error while transcoding the added songs: {e}.")
 
 
-    def get_all_songs(self):
+    def _add_rendition(self, id_song, file_name, file_format, rendition):
         """
-        Gets all songs stored into database.
+        Stores a converted file of a song and records it in the renditions table. The file made by the
+        transcoder is removed afterwards.
+
+        Args:
+            id_song (int): ID of the song.
+            file_name (str): Name of the original file.
+            file_format (str): Format of the converted file.
+            rendition (dict): The path, codec, bitrate and sample_rate of the converted file.
 
         Returns:
-            list: A list of song records from database.
+            int: 1 if the rendition was stored, 0 otherwise.
         """
 
-        self.db_cursor.execute("SELECT * FROM songs")
-        return self.db_cursor.fetchall()
+        file_path = rendition["path"]
+        copied = False
 
+        try:
+            content_hash, size = self.blob_store.hash_file(file_path)
+            entry = self.journal.begin("add", [("blobs", content_hash)])
+
+            with self.pool.cursor() as cursor:
+                # Ca la adaugarea melodiilor, fisierul e protejat de stergeri pana la INSERT
+                self._lock_blobs(cursor, [content_hash])
+                _, copied = self.blob_store.put(file_path, content_hash)
+
+                cursor.execute(
+                    '''INSERT INTO blobs (content_hash, size) VALUES (%s, %s) ON CONFLICT (content_hash) DO NOTHING''',
+                    (content_hash, size)
+                )
+                cursor.execute(
+                    '''
+                    INSERT INTO renditions (song_id, format, file_name, content_hash, codec, bitrate, sample_rate)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s)
+                    ON CONFLICT (song_id, format) DO NOTHING
+                    ''',
+                    (id_song, file_format, f"{os.path.splitext(file_name)[0]}.{file_format}", content_hash,
+                     rendition.get("codec"), rendition.get("bitrate"), rendition.get("sample_rate"))
+                )
+                stored = cursor.rowcount
+
+                if not stored:
+                    # Melodia a fost convertita intre timp
+                    cursor.execute('''DELETE FROM blobs WHERE content_hash = %s AND refcount <= 0''', (content_hash,))
+
+                    if copied:
+                        self.blob_store.delete(content_hash)
+
+            self.journal.done(entry)
+            return stored
+        except Exception as e:
+            print(f"Error while storing the {file_format} rendition of {file_name}: {e}.")
 
-    def close_connection(self):
+            if copied:
+                self._delete_blob(content_hash)
+            return 0
+        finally:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+
+
+    def delete_song(self, id_song):
+        """
+        Deletes a song file from storage file and its metadata from database.
+        The song is identified by its ID. The file is kept while other songs have the same content.
+
+        Args:
+            id_song (int): ID of the song to delete.
+
+        Raises:
+            ValueError: If the song ID doesn't exist in the database.
+            FileNotFoundError: If the song file doesn't exist in the storage folder.
+            Exception: If there are errors during deleting the song file from storage folder or database operations.
+        """
+
+        result = self.get_song(id_song)
+
+        if not result:
+            raise ValueError(f"No song found with ID: {id_song}")
+
+        file_name = result[1]
+        content_hash = self._content_hash(id_song)
+        backend, key = self._locate(file_name, content_hash)
+
+        if not backend.exists(key):
+            raise FileNotFoundError(f"File {file_name} does not exist in storage folder.")
+
+        with self.pool.cursor() as cursor:
+            cursor.execute('''SELECT content_hash FROM renditions WHERE song_id = %s''', (id_song,))
+            renditions = [row[0] for row in cursor.fetchall()]
+
+        # Daca procesul cade dupa DELETE, fisierele ramase fara melodii sunt sterse la recuperare
+        entry = self.journal.begin(
+            "delete",
+            [("blobs" if content_hash else "legacy", key)] + [("blobs", rendition) for rendition in renditions]
+        )
+
+        self._delete_song(id_song, file_name, content_hash, backend, key, renditions)
+        self.journal.done(entry)
+
+
+    def _delete_song(self, id_song, file_name, content_hash, backend, key, renditions):
+        """
+        Deletes the metadata of a song, then its files if no other song uses them, for delete_song, inside
+        a journal operation.
+
+        Args:
+            id_song (int): ID of the song to delete.
+            file_name (str): Name of the song file.
+            content_hash (str): Hash of the song content, None for a song stored by name.
+            backend (StorageBackend): Backend holding the song file.
+            key (str): Key of the song file.
+            renditions (list): Hashes of the converted files of the song.
         """
-        Closes the database connection and cursor.
+
+        try:
+            with self.pool.cursor() as cursor:
+                cursor.execute(
+                    '''DELETE FROM songs WHERE id = %s''',
+                    (id_song,)  # Tuplu
+                )
+
+                # Fisierul e sters doar daca nicio alta melodie nu il mai foloseste
+                cursor.execute(
+                    '''DELETE FROM blobs WHERE content_hash = %s AND refcount <= 0 RETURNING content_hash''',
+                    (content_hash,)
+                )
+                unreferenced = cursor.fetchone() is not None or content_hash is None
+
+                # Fisierele convertite sunt sterse odata cu melodia (in cascada)
+                cursor.execute(
+                    '''DELETE FROM blobs WHERE content_hash = ANY(%s) AND refcount <= 0 RETURNING content_hash''',
+                    (renditions,)
+                )
+                unreferenced_renditions = [row[0] for row in cursor.fetchall()]
+
+            if self.cache:
+                self.cache.song_deleted(id_song)
+
+            print(f"Song successfully deleted with ID: {id_song}.")
+        except Exception as e:
+            print(f"Error while deleting song with ID: {id_song} : {e}.")
+            raise
+
+        if unreferenced:
+            try:
+                # Fisierele dupa continut sunt sterse sub lacatul lor, daca nu au fost adaugate din nou
+                removed = backend.delete(key) if content_hash is None else self._delete_blob(content_hash)
+
+                if removed:
+                    print(f"File {file_name} has been removed from storage folder.")
+            except Exception as e:
+                print(f"Error deleting the file from storage folder: {file_name}: {e}.")
+                raise
+
+            # Copia descarcata pentru redare, daca exista
+            if backend.local_path(key) is None and os.path.exists(os.path.join(DOWNLOAD_DIR, key)):
+                os.remove(os.path.join(DOWNLOAD_DIR, key))
+
+        for rendition_hash in unreferenced_renditions:
+            try:
+                self._delete_blob(rendition_hash)
+            except Exception as e:
+                print(f"Error deleting a rendition of {file_name} from storage folder: {e}.")
+
+            if self.backend.local_path(rendition_hash) is None and os.path.exists(os.path.join(DOWNLOAD_DIR, rendition_hash)):
+                os.remove(os.path.join(DOWNLOAD_DIR, rendition_hash))
+
+
+    def _bulk_where(self, songs):
         """
+        Builds the condition selecting the songs of a bulk operation.
+
+        Args:
+            songs (list | dict): IDs of the songs, or the criteria they meet (as for search).
+
+        Returns:
+            tuple: The condition and the list of its values.
+
+        Raises:
+            ValueError: If no song is selected, so the operation doesn't touch every song by mistake.
+        """
+
+        if isinstance(songs, dict):
+            where_clause, values = build_where(songs)
+        else:
+            where_clause, values = "id = ANY(%s::INTEGER[])", [[int(id_song) for id_song in songs]]
+
+        if not where_clause or values == [[]]:
+            raise ValueError("No songs selected.")
+
+        return where_clause, list(values)
+
+
+    def delete_songs(self, songs, max_workers=8):
+        """
+        Deletes many songs with a single statement, then the files no other song uses, in parallel.
+        The files are journaled before the transaction commits, so a crash at any point leaves the storage
+        consistent after recovery.
+
+        Args:
+            songs (list | dict): IDs of the songs, or the criteria they meet (as for search).
+            max_workers (int): Number of threads deleting files.
+
+        Returns:
+            list: IDs of the deleted songs; the IDs that didn't exist are skipped.
+
+        Raises:
+            ValueError: If no song is selected.
+            Exception: If there are errors during the database operations. The files that couldn't be deleted
+                are left for the recovery.
+        """
+
+        where_clause, values = self._bulk_where(songs)
+
+        try:
+            with self.pool.cursor() as cursor:
+                cursor.execute(
+                    f'''WITH deleted AS (DELETE FROM songs WHERE {where_clause}
+                                         RETURNING id, file_name, content_hash)
+                        SELECT d.id, d.file_name, d.content_hash,
+                               ARRAY(SELECT r.content_hash FROM renditions r WHERE r.song_id = d.id)
+                        FROM deleted d ORDER BY d.id''',
+                    tuple(values)
+                )
+                deleted = cursor.fetchall()
+
+                blob_hashes = sorted({row[2] for row in deleted if row[2]} |
+                                     {rendition for row in deleted for rendition in row[3]})
+                legacy_names = sorted({row[1] for row in deleted if row[2] is None})
+
+                # Inregistrate inainte de commit: daca procesul cade, recuperarea decide dupa baza de date
+                entry = None
+                if deleted:
+                    entry = self.journal.begin(
+                        "delete",
+                        [("blobs", key) for key in blob_hashes] + [("legacy", key) for key in legacy_names]
+                    )
+
+                # Fisierele sunt sterse doar daca nicio alta melodie nu le mai foloseste
+                cursor.execute(
+                    '''DELETE FROM blobs WHERE content_hash = ANY(%s) AND refcount <= 0 RETURNING content_hash''',
+                    (blob_hashes,)
+                )
+                unreferenced = [(self.backend, row[0]) for row in cursor.fetchall()]
+
+                cursor.execute(
+                    '''SELECT file_name FROM songs WHERE content_hash IS NULL AND file_name = ANY(%s)''',
+                    (legacy_names,)
+                )
+                used = {row[0] for row in cursor.fetchall()}
+                unreferenced += [(self.legacy_backend, name) for name in legacy_names if name not in used]
+
+            ids = [row[0] for row in deleted]
+
+            if self.cache and ids:
+                self.cache.songs_deleted(ids)
+
+            print(f"{len(ids)} songs successfully deleted.")
+        except Exception as e:
+            print(f"Error while deleting songs: {e}.")
+            raise
+
+        if entry is None:
+            return ids
+
+        def delete_file(location):
+            """
+            Deletes a file no song uses anymore, and its downloaded copy.
+
+            Args:
+                location (tuple): The storage backend holding the file and the key of the file.
+
+            Returns:
+                bool: False if the file couldn't be deleted.
+            """
+
+            backend, key = location
+
+            try:
+                # Fisierele dupa continut sunt sterse sub lacatul lor, daca nu au fost adaugate din nou
+                if backend is self.backend:
+                    self._delete_blob(key)
+                else:
+                    backend.delete(key)
+            except Exception as e:
+                print(f"Error deleting the file from storage folder: {key}: {e}.")
+                return False
+
+            # Copia descarcata pentru redare, daca exista
+            if backend.local_path(key) is None and os.path.exists(os.path.join(DOWNLOAD_DIR, key)):
+                os.remove(os.path.join(DOWNLOAD_DIR, key))
+
+            return True
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            removed = list(executor.map(delete_file, unreferenced))
+
+        print(f"{sum(removed)} files have been removed from storage folder.")
+
+        # Fisierele care nu au putut fi sterse raman pentru recuperare
+        if all(removed):
+            self.journal.done(entry)
+
+        return ids
+
+
+    def verify(self, plan_path="repair_plan.jsonl", hash_files=False, max_workers=None, progress=None,
+               cancel_event=None):
+        """
+        Checks that the storage matches the database and writes a repair plan, without changing anything:
+        the missing files, the files no song uses, the files with a wrong size (or content, when hashing) and
+        the temporary files left by interrupted copies. An interrupted verification resumes from its checkpoint.
+
+        Args:
+            plan_path (str): Path of the repair plan, a JSON object per line (see StorageScanner.scan).
+            hash_files (bool): Whether to hash the stored files on a pool of processes, finding the corrupted
+                ones. Much slower than comparing the listings.
+            max_workers (int): Number of processes hashing files, by default the number of CPUs.
+            progress (callable): Called with the number of files compared and the number expected by the database.
+            cancel_event (threading.Event): Stops the verification at its next checkpoint when set.
+
+        Returns:
+            dict: The number of files compared ("checked") and of the problems of each kind.
+
+        Raises:
+            CancelledError: If the verification was cancelled.
+        """
+
+        try:
+            scanner = StorageScanner(self.pool, {"blobs": self.backend, "legacy": self.legacy_backend},
+                                     hash_files=hash_files, max_workers=max_workers)
+            return scanner.scan(plan_path, progress, cancel_event)
+        except Exception as e:
+            print(f"Error while verifying the storage: {e}.")
+            raise
+
+
+    def _content_hash(self, id_song):
+        """
+        Gets the hash of the content of a song.
+
+        Args:
+            id_song (int): ID of the song.
+
+        Returns:
+            str: The hash, or None for the songs stored before the content-addressed storage.
+        """
+
+        with self.pool.cursor() as cursor:
+            cursor.execute('''SELECT content_hash FROM songs WHERE id = %s''', (id_song,))
+            row = cursor.fetchone()
+
+        return row[0] if row else None
+
+
+    def _stored_files(self, rendition=None, **criteria):
+        """
+        Gets the stored files of the songs that meet the criteria.
+
+        Args:
+            rendition (str): Which file of each song to get: None for the original, a format (e.g. "ogg") for
+                the rendition in that format or "smallest" for the smallest file. The original is used for
+                the songs without such a rendition.
+            **criteria: Key-value pairs representing the criteria for searching process.
+
+        Returns:
+            list: An (id, file_name, content_hash) tuple for each matching song.
+        """
+
+        query, values = build_stored_files(rendition, criteria)
+
+        with self.pool.cursor() as cursor:
+            cursor.execute(query, tuple(values))
+            return cursor.fetchall()
+
+
+    def _locate(self, file_name, content_hash):
+        """
+        Gets where the file of a song is stored.
+
+        Args:
+            file_name (str): Name of the song file.
+            content_hash (str): Hash of the song content, None for the songs stored by name.
+
+        Returns:
+            tuple: The storage backend holding the file and the key of the file.
+        """
+
+        if content_hash:
+            return self.backend, content_hash
+
+        return self.legacy_backend, file_name
+
+
+    def modify_data(self, id_song, **metadata):
+        """
+        Modifies the metadata of a song existing in the database.
+        The song is identified by its ID.
+
+        Args:
+            id_song (int): ID of the song to modify.
+            **metadata: Key-value pairs representing the fields to update and their new values; add_tags and
+                remove_tags change the tags as in modify_many.
+
+        Returns:
+            None
+
+        Raises:
+             ValueError: If in the database isn't a song with the specified ID, or a column can't be modified.
+             Exception: If an error occurs during the database operation or during the modifying process.
+        """
+
+        result = self.get_song(id_song)
+
+        if not result:
+            raise ValueError(f"No song found with ID: {id_song}")
+
+        clauses = []
+        values = []
+
+        # Doar coloanele permise ajung in SQL
+        for column, expression, expression_values in build_assignments(metadata):
+            clauses.append(f"{column} = {expression}")
+            values.extend(expression_values)
+
+        if not clauses:
+            return
+
+        values.append(id_song)
+
+        query = f"UPDATE songs SET {', '.join(clauses)} WHERE id = %s"
+        try:
+            with self.pool.cursor() as cursor:
+                cursor.execute(query, tuple(values))
+
+            if self.cache:
+                self.cache.song_modified(id_song)
+
+            print(f"Song with ID: {id_song} succssfully modified.")
+        except Exception as e:
+            print(f"Error while modifying song with ID: {id_song} : {e}.")
+
+
+    def modify_many(self, songs, **metadata):
+        """
+        Modifies the metadata of many songs with a single statement. The songs already having the new values
+        aren't rewritten.
+
+        Args:
+            songs (list | dict): IDs of the songs, or the criteria they meet (as for search).
+            **metadata: The new values of the columns; add_tags appends tags to the songs (skipping the ones
+                they have) and remove_tags removes tags from them.
+
+        Returns:
+            list: IDs of the modified songs.
+
+        Raises:
+            ValueError: If no song is selected, or a column can't be modified.
+            Exception: If an error occurs during the database operation.
+        """
+
+        where_clause, where_values = self._bulk_where(songs)
+        assignments = build_assignments(metadata)
+
+        if not assignments:
+            return []
+
+        clauses = []
+        changes = []
+        values = []
+
+        for column, expression, expression_values in assignments:
+            clauses.append(f"{column} = {expression}")
+            values.extend(expression_values)
+
+        # Conditia de schimbare repeta expresiile, deci si valorile lor
+        for column, expression, expression_values in assignments:
+            changes.append(f"{column} IS DISTINCT FROM {expression}")
+            where_values.extend(expression_values)
+
+        query = (f"UPDATE songs SET {', '.join(clauses)} "
+                 f"WHERE {where_clause} AND ({' OR '.join(changes)}) RETURNING id")
+
+        try:
+            with self.pool.cursor() as cursor:
+                cursor.execute(query, tuple(values + where_values))
+                ids = sorted(row[0] for row in cursor.fetchall())
+
+            if self.cache and ids:
+                self.cache.songs_modified(ids)
+
+            print(f"{len(ids)} songs successfully modified.")
+            return ids
+        except Exception as e:
+            print(f"Error while modifying songs: {e}.")
+            raise
+
+
+    def search(self, **criteria):
+        """
+        Searches for songs in the database that meet the criteria.
+
+        Args:
+            **criteria: Key-value pairs representing the criteria for searching process.
+
+        Returns:
+            list: A list of matching songs.
+
+        Raises:
+            Exception: If there are errors in the database operation or in the search process.
+        """
+
+        try:
+            where_clause, values = build_where(criteria)
+
+            query = f"SELECT {SONG_COLUMNS} FROM songs"
+            if where_clause:
+                query += f" WHERE {where_clause}"
+
+            if self.cache:
+                key = self.cache.search_key("search", **criteria)
+                results = self.cache.get_search(key)
+                if results is not None:
+                    return results
+
+            with self.pool.cursor() as cursor:
+                cursor.execute(query, tuple(values))
+
+                results = cursor.fetchall()
+
+            if self.cache:
+                self.cache.put_search(key, results)
+
+            if not results:
+                print("No songs match the criteria.")
+                return []
+
+            return results
+        except Exception as e:
+            print(f"Error while searching for songs: {e}")
+            raise
+
+
+    def search_ranked(self, text, limit=50, offset=0, min_similarity=0.3):
+        """
+        Searches for songs by free text, ignoring the case and tolerating typos, ordered by relevance.
+
+        The text is matched against the indexed full-text vector of artist, song name and tags, and by
+        trigram similarity against artist and song name, so "bruno mars" and "bruno mras" both find "Bruno Mars".
+
+        Args:
+            text (str): The text to search for.
+            limit (int): Maximum number of returned songs.
+            offset (int): Number of best matching songs to skip, for paging.
+            min_similarity (float): Minimum trigram similarity (0 to 1) for a fuzzy match.
+
+        Returns:
+            list: A list of matching songs, the most relevant first.
+
+        Raises:
+            Exception: If there are errors in the database operation or in the search process.
+        """
+
+        try:
+            if self.cache:
+                key = self.cache.search_key("ranked", text, limit, offset, min_similarity)
+                results = self.cache.get_search(key)
+                if results is not None:
+                    return results
+
+            with self.pool.cursor() as cursor:
+                # Pragul folosit de operatorul % din pg_trgm
+                cursor.execute("SELECT set_config('pg_trgm.similarity_threshold', %s, true)", (str(min_similarity),))
+                cursor.execute(
+                    f'''
+                    SELECT {SONG_COLUMNS} FROM songs, plainto_tsquery('simple', %(text)s) AS query
+                    WHERE search_vector @@ query OR artist %% %(text)s OR song_name %% %(text)s
+                    ORDER BY ts_rank(search_vector, query)
+                        + greatest(similarity(artist, %(text)s), similarity(song_name, %(text)s)) DESC, id
+                    LIMIT %(limit)s OFFSET %(offset)s
+                    ''',
+                    {"text": text, "limit": limit, "offset": offset}
+                )
+
+                results = cursor.fetchall()
+
+            if self.cache:
+                self.cache.put_search(key, results)
+
+            if not results:
+                print("No songs match the text.")
+
+            return results
+        except Exception as e:
+            print(f"Error while searching for songs: {e}")
+            raise
+
+
+    def iter_search(self, itersize=2000, keyset=True, **criteria):
+        """
+        Searches for songs in the database that meet the criteria, streaming the results instead of
+        loading all of them in memory.
+
+        By default every chunk of itersize rows is a separate query continuing after the last ID read
+        (keyset pagination), so no connection is held between chunks and the rows are returned ordered by ID.
+        Without keyset pagination the rows are read through a server-side cursor, which holds a pooled
+        connection until the iteration ends: a caller using the pool while iterating can then wait forever
+        for a connection on a small pool.
+
+        Args:
+            itersize (int): Number of rows fetched from the database at a time.
+            keyset (bool): Whether to use keyset pagination by ID instead of a server-side cursor.
+            **criteria: Key-value pairs representing the criteria for searching process.
+
+        Yields:
+            tuple: The matching songs, one at a time.
+
+        Raises:
+            Exception: If there are errors in the database operation or in the search process.
+        """
+
+        where_clause, values = build_where(criteria)
+
+        if not keyset:
+            query = f"SELECT {SONG_COLUMNS} FROM songs"
+            if where_clause:
+                query += f" WHERE {where_clause}"
+
+            with self.pool.connection() as conn:
+                # Cursor cu nume = cursor pe server, randurile vin in bucati de itersize
+                with conn.cursor(name=f"songs_stream_{uuid.uuid4().hex}") as cursor:
+                    cursor.itersize = itersize
+                    cursor.execute(query, tuple(values))
+
+                    yield from cursor
+            return
+
+        query = f"SELECT {SONG_COLUMNS} FROM songs WHERE id > %s"
+        if where_clause:
+            query += f" AND {where_clause}"
+        query += " ORDER BY id LIMIT %s"
+
+        last_id = 0
+        while True:
+            with self.pool.cursor() as cursor:
+                cursor.execute(query, (last_id, *values, itersize))
+                page = cursor.fetchall()
+
+            yield from page
+
+            if len(page) < itersize:
+                return
+
+            last_id = page[-1][0]
+
+
+    def explain_search(self, force_index=True, **criteria):
+        """
+        Checks with EXPLAIN whether a search with the given criteria can use an index.
+
+        On small tables PostgreSQL prefers a sequential scan even when an index exists, so by default the
+        sequential scans are discouraged for the checked query, showing if an index could be used at all.
+
+        Args:
+            force_index (bool): Whether to discourage sequential scans while planning the query.
+            **criteria: Key-value pairs representing the criteria for searching process.
+
+        Returns:
+            tuple: True if the plan uses an index and the list of the used index names.
+        """
+
+        where_clause, values = build_where(criteria)
+
+        query = f"EXPLAIN (FORMAT JSON) SELECT {SONG_COLUMNS} FROM songs"
+        if where_clause:
+            query += f" WHERE {where_clause}"
+
+        with self.pool.cursor() as cursor:
+            if force_index:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+
+            cursor.execute(query, tuple(values))
+            plan = cursor.fetchone()[0]
+
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+
+        indexes = []
+        nodes = [plan[0]["Plan"]]
+
+        while nodes:
+            node = nodes.pop()
+            if "Index Name" in node:
+                indexes.append(node["Index Name"])
+            nodes.extend(node.get("Plans", []))
+
+        return bool(indexes), indexes
+
+
+    def check_search_indexes(self):
+        """
+        Reports whether each search shape (a search by one criterion) is served by an index.
+
+        Returns:
+            dict: The criterion mapped to the (uses_index, index_names) result of explain_search.
+        """
+
+        report = {}
+
+        for criterion, value in SEARCH_SHAPES.items():
+            report[criterion] = self.explain_search(**{criterion: value})
+
+            uses_index, indexes = report[criterion]
+            if uses_index:
+                print(f"Search by {criterion} uses {', '.join(indexes)}.")
+            else:
+                print(f"Search by {criterion} does a sequential scan.")
+
+        return report
+
+
+    def create_save_list(self, arhive_path, archive_format=None, compress_audio=False, incremental=False,
+                         progress=None, cancel_event=None, rendition=None, **criteria):
+        """
+        Create an archive containing the song files that meet the given criteria.
+
+        The files are read in parallel and written as they arrive, already compressed audio being stored
+        without compression. The archive can also be streamed to a file-like object (e.g. a socket).
+
+        Args:
+            arhive_path (str or file): Path to the archive, or a writable binary file-like object.
+            archive_format (str): "zip", "tar", "tar.gz", "tar.bz2", "tar.xz" or "tar.zst". By default it is
+                chosen by the extension of the archive path (ZIP for unknown extensions and file-like objects).
+            compress_audio (bool): Whether to compress the already compressed audio formats too.
+            incremental (bool): Whether to update an existing archive instead of rebuilding it, using the
+                manifest saved next to it, and to resume an interrupted build. Only for ZIP archive paths.
+            progress (callable): Called with the number of files written and their total after each file.
+            cancel_event (threading.Event): Stops the archive when set. A cancelled incremental save list is
+                resumed by the next call, another archive is removed.
+            rendition (str): Archive the renditions in this format (e.g. "ogg") instead of the originals, or
+                "smallest" for the smallest file of each song. The originals of the songs without a rendition
+                are archived.
+            **criteria: Key-value pairs representing the criteria for searching songs process.
+
+        Returns:
+            list: A list of file names that has been added to the archive (all the files in the archive
+                for an incremental save list).
+
+        Raises:
+            CancelledError: If the archive was cancelled.
+            Exception: If no songs match the criteria or an error occurs during the process.
+        """
+
+        try:
+            songs = self._stored_files(rendition, **criteria)
+
+            if not songs:
+                print("No songs match the criteria.")
+                raise ValueError("No songs match the criteria.")
+
+            if archive_format is None:
+                archive_format = detect_format(arhive_path) if isinstance(arhive_path, str) else "zip"
+
+            builder = ArchiveBuilder(archive_format, compress_audio=compress_audio)
+
+            if incremental:
+                if not isinstance(arhive_path, (str, os.PathLike)):
+                    raise ValueError("An incremental save list must be written to a path.")
+
+                return IncrementalArchive(arhive_path, builder).update(
+                    [(id_song, file_name) + self._locate(file_name, content_hash) + (content_hash,)
+                     for id_song, file_name, content_hash in songs],
+                    progress,
+                    cancel_event
+                )
+
+            names = set()
+            entries = [(unique_arcname(file_name, id_song, names),) + self._locate(file_name, content_hash)
+                       for id_song, file_name, content_hash in songs]
+
+            return builder.build(entries, arhive_path, progress, cancel_event)
+        except Exception as e:
+            print(f"Error while creating the archive: {e}.")
+            raise
+
+
+    def play(self, file_path, start=0.0):
+        """
+        Plays a song file. The mixer is initialized once and the decoded songs are cached, see Player.
+
+        Args:
+            file_path (str): Path to the song file to play.
+            start (float): Second from which the song starts.
+        """
+
+        self.player.play(file_path, start)
+
+
+    def _song_location(self, id_song):
+        """
+        Gets where the file played for a song is stored, from the cache if possible: the original if the player
+        can decode it, otherwise the smallest rendition it can decode (or the original, if there is none).
+
+        Args:
+            id_song (int): ID of the song.
+
+        Returns:
+            tuple: The file name and the content hash of the played file.
+
+        Raises:
+            ValueError: If there is no song with this ID.
+        """
+
+        location = self.cache.get_location(id_song) if self.cache else None
+
+        if location is None:
+            with self.pool.cursor() as cursor:
+                cursor.execute(
+                    '''SELECT file_name, content_hash FROM song_renditions WHERE song_id = %s
+                       ORDER BY format = ANY(%s) DESC, original DESC, size NULLS LAST LIMIT 1''',
+                    (id_song, list(PLAYABLE_FORMATS))
+                )
+                location = cursor.fetchone()
+
+            if not location:
+                raise ValueError(f"No song found with ID: {id_song}")
+
+            if self.cache:
+                self.cache.put_location(id_song, location)
+
+        return location
+
+
+    def song_file(self, song, download=True):
+        """
+        Gets the path of the file of a song, for playing it. The files of a remote storage are downloaded
+        once to the Cache folder.
+
+        Args:
+            song (int or tuple): ID of the song, or its record (e.g. from a search result).
+            download (bool): Whether to download a remote file, instead of returning None.
+
+        Returns:
+            str: Path to the song file, None for a remote file that isn't downloaded.
+
+        Raises:
+            ValueError: If there is no song with this ID.
+        """
+
+        id_song = song[0] if isinstance(song, (tuple, list)) else song
+        backend, key = self._locate(*self._song_location(id_song))
+
+        return self._local_file(backend, key, download)
+
+
+    def _local_file(self, backend, key, download=True):
+        """
+        Gets a stored file on the local disk, downloading the files of a remote storage once to the Cache folder.
+
+        Args:
+            backend (StorageBackend): Backend holding the file.
+            key (str): Key of the file.
+            download (bool): Whether to download a remote file, instead of returning None.
+
+        Returns:
+            str: Path to the file, None for a remote file that isn't downloaded.
+        """
+
+        file_path = backend.local_path(key)
+        if file_path is not None:
+            return file_path
+
+        file_path = os.path.join(DOWNLOAD_DIR, key)
+        if os.path.exists(file_path) or not download:
+            return file_path if os.path.exists(file_path) else None
+
+        os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+        temp_path = f"{file_path}.{uuid.uuid4().hex}.tmp"
+
+        try:
+            backend.get(key, temp_path)
+            os.replace(temp_path, file_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+        return file_path
+
+
+    def play_song(self, id_song, start=0.0):
+        """
+        Plays a song of the catalog. A song on the local disk (or already downloaded) is decoded and cached
+        by the player; a song of a remote storage is streamed with range reads, the playback starting before
+        the file is downloaded.
+
+        Args:
+            id_song (int): ID of the song.
+            start (float): Second from which the song starts.
+
+        Raises:
+            ValueError: If there is no song with this ID.
+            FileNotFoundError: If the song file doesn't exist in storage.
+        """
+
+        # O oprire ceruta cat timp melodia e cautata o impiedica sa porneasca
+        generation = self.player.generation
+
+        # Locatia e cautata o singura data, pentru fisierul local si pentru redarea in flux
+        file_name, content_hash = self._song_location(id_song)
+        backend, key = self._locate(file_name, content_hash)
+        file_path = self._local_file(backend, key, download=False)
+
+        if file_path is not None:
+            self.player.play(file_path, start, generation=generation)
+            return
+
+        # Numele fisierului spune formatul decodorului
+        self.player.stream(RangeReader(backend, key), file_name, start, generation)
+
+
+    def get_audio_info(self, id_song):
+        """
+        Gets the technical data of a song, as read from its file when it was added.
+
+        Args:
+            id_song (int): ID of the song.
+
+        Returns:
+            dict: The duration (seconds), bitrate, sample_rate, codec, loudness (LUFS), peak (dBFS) and
+                replay_gain (dB), None for the unknown ones, or None if there is no song with this ID.
+        """
+
+        columns = TECHNICAL_COLUMNS + LOUDNESS_COLUMNS
+
+        with self.pool.cursor() as cursor:
+            cursor.execute(
+                f'''SELECT {', '.join(columns)} FROM songs WHERE id = %s''',
+                (id_song,)
+            )
+            row = cursor.fetchone()
+
+        if not row:
+            return None
+
+        info = dict(zip(columns, row))
+        info["replay_gain"] = replay_gain(info["loudness"])
+        return info
+
+
+    def playback_queue(self):
+        """
+        Gets the queue playing lists of songs, created on first use. Subscribe to it for the track changes.
+
+        Returns:
+            PlaybackQueue: The queue, whose items are song IDs or records.
+        """
+
+        if self._queue is None:
+            self._queue = PlaybackQueue(self.player, self.song_file)
+
+        return self._queue
+
+
+    def play_songs(self, songs, start=0):
+        """
+        Plays songs one after another without gaps, the next one being decoded while the current one plays.
+
+        Args:
+            songs (iterable): Song IDs or records, e.g. a search result.
+            start (int): Position of the first song played.
+
+        Returns:
+            PlaybackQueue: The queue playing the songs.
+        """
+
+        queue = self.playback_queue()
+        queue.set_items(songs, start)
+        return queue
+
+
+    def pause(self):
+        """
+        Pauses the currently playing song.
+        """
+
+        self.player.pause()
+
+
+    def resume(self):
+        """
+        Resumes a paused song.
+        """
+
+        self.player.resume()
+
+
+    def stop(self):
+        """
+        Stops the currently playing song.
+        """
+
+        self.player.stop()
+
+
+    def get_all_songs(self):
+        """
+        Gets all songs stored into database.
+
+        Returns:
+            list: A list of song records from database.
+        """
+
+        with self.pool.cursor() as cursor:
+            cursor.execute(f"SELECT {SONG_COLUMNS} FROM songs")
+            return cursor.fetchall()
+
+
+    def iter_all_songs(self, itersize=2000, keyset=True):
+        """
+        Gets all songs stored into database, streaming them in chunks. See iter_search.
+
+        Args:
+            itersize (int): Number of rows fetched from the database at a time.
+            keyset (bool): Whether to use keyset pagination by ID instead of a server-side cursor.
+
+        Yields:
+            tuple: The song records from database, one at a time.
+        """
+
+        yield from self.iter_search(itersize=itersize, keyset=keyset)
+
+
+    def fetch_songs_page(self, order_by="id", descending=False, after=None, limit=100, offset=0):
+        """
+        Gets a page of songs sorted by a column, ties broken by ID.
+
+        The next page is fetched by keyset: it continues after the sort key of the last row of the previous
+        page, so its cost doesn't depend on how deep the page is. Fetching in the opposite direction after
+        the first row of a page gives the previous page (in reverse order). The offset is only meant for
+        jumping to an arbitrary position.
+
+        Args:
+            order_by (str): The column to sort by, one of SORTABLE_COLUMNS.
+            descending (bool): Whether to sort in descending order. NULL values come last in ascending order.
+            after (tuple): The (value of the column, ID) of the row after which the page starts, None to start
+                from the beginning.
+            limit (int): Maximum number of songs in the page.
+            offset (int): Number of songs skipped, when after isn't given.
+
+        Returns:
+            list: The song records of the page.
+
+        Raises:
+            ValueError: If the column can't be sorted by.
+        """
+
+        if order_by not in SORTABLE_COLUMNS:
+            raise ValueError(f"Songs can't be sorted by {order_by}.")
+
+        direction = "DESC" if descending else "ASC"
+        comparison = "<" if descending else ">"
+
+        if order_by == "id":
+            order = f"id {direction}"
+        else:
+            order = f"{order_by} {direction} NULLS {'FIRST' if descending else 'LAST'}, id {direction}"
+
+        if after is None:
+            with self.pool.cursor() as cursor:
+                cursor.execute(f"SELECT {SONG_COLUMNS} FROM songs ORDER BY {order} LIMIT %s OFFSET %s", (limit, offset))
+                return cursor.fetchall()
+
+        value, id_song = after
+
+        # Randurile cu NULL nu pot fi comparate, asa ca sunt cerute separat, dupa (sau inainte de) celelalte
+        if order_by == "id":
+            segments = [(f"id {comparison} %s", (id_song,))]
+        elif value is None:
+            segments = [(f"{order_by} IS NULL AND id {comparison} %s", (id_song,))]
+            if descending:
+                segments.append((f"{order_by} IS NOT NULL", ()))
+        else:
+            segments = [(f"({order_by}, id) {comparison} (%s, %s)", (value, id_song))]
+            if not descending:
+                segments.append((f"{order_by} IS NULL", ()))
+
+        songs = []
+
+        with self.pool.cursor() as cursor:
+            for where_clause, values in segments:
+                cursor.execute(
+                    f"SELECT {SONG_COLUMNS} FROM songs WHERE {where_clause} ORDER BY {order} LIMIT %s",
+                    (*values, limit - len(songs))
+                )
+                songs.extend(cursor.fetchall())
+
+                if len(songs) >= limit:
+                    break
+
+        return songs
+
+
+    def count_songs(self, exact=False):
+        """
+        Counts the songs. Unless an exact count is requested, large tables are estimated from the planner
+        statistics instead of being scanned.
+
+        Args:
+            exact (bool): Whether to count the songs exactly whatever the size of the table.
+
+        Returns:
+            int: The (estimated) number of songs.
+        """
+
+        with self.pool.cursor() as cursor:
+            if not exact:
+                cursor.execute("SELECT reltuples::BIGINT FROM pg_class WHERE oid = 'songs'::regclass")
+                estimate = cursor.fetchone()[0]
+
+                # -1 inseamna ca tabelul nu a fost inca analizat
+                if estimate >= EXACT_COUNT_LIMIT:
+                    return estimate
+
+            cursor.execute("SELECT count(*) FROM songs")
+            return cursor.fetchone()[0]
+
+
+    def get_songs(self, ids):
+        """
+        Gets many songs by their IDs with a single query, bypassing the cache.
+
+        Args:
+            ids (list): IDs of the songs.
+
+        Returns:
+            list: The records of the songs that exist, in no particular order.
+        """
+
+        with self.pool.cursor() as cursor:
+            cursor.execute(f"SELECT {SONG_COLUMNS} FROM songs WHERE id = ANY(%s)", ([int(id_song) for id_song in ids],))
+            return cursor.fetchall()
+
+
+    def stats(self):
+        """
+        Gets a summary of the stored songs, computed by the database.
+
+        Returns:
+            dict: The number of songs, of stored files and of renditions, the size of the files stored by their
+                content in bytes, the total duration in seconds (of the songs whose duration is known) and the number of songs
+                of each format.
+        """
+
+        with self.pool.cursor() as cursor:
+            cursor.execute('''SELECT count(*), coalesce(sum(duration), 0) FROM songs''')
+            songs, duration = cursor.fetchone()
+
+            cursor.execute('''SELECT count(*), coalesce(sum(size), 0) FROM blobs''')
+            files, size = cursor.fetchone()
+
+            # Melodiile vechi, stocate dupa nume, nu au rand in blobs
+            cursor.execute('''SELECT count(DISTINCT file_name) FROM songs WHERE content_hash IS NULL''')
+            files += cursor.fetchone()[0]
+
+            cursor.execute('''SELECT count(*) FROM renditions''')
+            renditions = cursor.fetchone()[0]
+
+            cursor.execute('''SELECT coalesce(format, ''), count(*) FROM songs GROUP BY 1 ORDER BY 2 DESC''')
+            formats = dict(cursor.fetchall())
+
+        return {"songs": songs, "files": files, "renditions": renditions, "bytes": int(size),
+                "duration": float(duration), "formats": formats}
+
+
+    def change_feed(self):
+        """
+        Gets the feed of the changes made to the songs by any process (see ChangeFeed), started on first use.
+        A single feed, using one connection, is shared by all the users of this instance.
+
+        Returns:
+            ChangeFeed: The feed.
+        """
+
+        if self._feed is None:
+            self._feed = ChangeFeed(self.pool)
+            self._feed.start()
+
+        return self._feed
+
+
+    def subscribe_changes(self, callback):
+        """
+        Calls a function, on the listener thread, for every change made to the songs by any process.
+
+        Args:
+            callback (callable): Receives {"op": "INSERT" | "UPDATE" | "DELETE", "id": ...}, or {"op": "RESYNC"}
+                after a reconnection.
+
+        Returns:
+            callable: The callback, to be passed to unsubscribe_changes.
+        """
+
+        return self.change_feed().subscribe(callback)
+
+
+    def unsubscribe_changes(self, callback):
+        """
+        Stops calling a function registered with subscribe_changes.
+
+        Args:
+            callback (callable): The callback.
+        """
+
+        if self._feed is not None:
+            self._feed.unsubscribe(callback)
+
+
+    def iter_changes(self, timeout=None):
+        """
+        Yields the changes made to the songs by any process, as they arrive.
+
+        Args:
+            timeout (float): Seconds without changes after which the iteration ends, None to never end.
+
+        Yields:
+            dict: The changes, see subscribe_changes.
+        """
+
+        yield from self.change_feed().iter_changes(timeout)
+
+
+    def close_connection(self):
+        """
+        Closes the database connections of the pool created for this instance.
+        A shared pool stays open for the other users, it is closed with ConnectionPool.close_pool.
+        """
+
+        if self._feed is not None:
+            self._feed.stop()
+            self._feed = None
+
+        if self._queue is not None:
+            self._queue.close()
+            self._queue = None
+
+        self.journal.close()
 
-        self.db_cursor.close()
-        self.db_conn.close()
\ No newline at end of file
+        if self._owns_pool:
+            self.pool.closeall()
\ No newline at end of file
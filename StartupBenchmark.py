@@ -0,0 +1,135 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Modulele incarcate doar cand e deschisa o fereastra
+WINDOW_MODULES = ("pygame", "PIL", "meth.open_add_song_window", "meth.open_delete_song_window",
+                  "meth.open_modify_song_window", "meth.open_search_songs_windo",
+                  "meth.open_create_save_list_window", "meth.open_play_song_window")
+
+# Modulele care nu trebuie incarcate odata cu main.py sau cli.py (psycopg2 e incarcat in fundal, dupa import)
+HEAVY_MODULES = WINDOW_MODULES + ("psycopg2", "psycopg", "SongStorage")
+
+# Rulat intr-un interpretor nou pentru fiecare masuratoare, ca importurile sa nu fie deja in memorie
+IMPORT_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+print(json.dumps({{"import": time.perf_counter() - start,
+                   "heavy": [name for name in {heavy!r} if name in sys.modules]}}))
+"""
+
+PAINT_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import main
+times = {{"import": time.perf_counter() - start}}
+
+def painted(root):
+    times["paint"] = time.perf_counter() - start
+    times["heavy"] = [name for name in {heavy!r} if name in sys.modules]
+
+def ready(root):
+    times["ready"] = time.perf_counter() - start
+    root.destroy()
+
+main.main(on_paint=painted, on_ready=ready)
+print(json.dumps(times))
+"""
+
+
+def run_script(script, timeout=60):
+    """
+    Runs a measuring script in a new interpreter, from the folder of the project.
+
+    Args:
+        script (str): The Python code, printing its measurements as a JSON object on the last line.
+        timeout (float): Seconds after which the run is stopped.
+
+    Returns:
+        dict: The measurements.
+    """
+
+    directory = os.path.dirname(os.path.abspath(__file__))
+    result = subprocess.run([sys.executable, "-c", script], cwd=directory, capture_output=True, text=True,
+                            timeout=timeout, check=True)
+
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def has_display():
+    """
+    Checks if a window can be opened.
+
+    Returns:
+        bool: False on a Unix system without X display (e.g. a server).
+    """
+
+    if sys.platform in ("win32", "darwin"):
+        return True
+
+    return bool(os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY"))
+
+
+def benchmark(runs=5, paint=True):
+    """
+    Measures the cold start of the entry points: the import time of main.py and cli.py and, if a display is
+    available, the time until the main window is drawn and until the first songs are shown.
+
+    Args:
+        runs (int): Number of runs of each measurement; the median is reported.
+        paint (bool): Whether to open the main window.
+
+    Returns:
+        dict: For each measurement, the median in seconds, and the heavy modules loaded at startup.
+    """
+
+    report = {}
+    heavy = set()
+
+    for module in ("main", "cli"):
+        samples = [run_script(IMPORT_SCRIPT.format(module=module, heavy=HEAVY_MODULES)) for _ in range(runs)]
+        report[f"{module}_import"] = statistics.median(sample["import"] for sample in samples)
+        heavy.update(name for sample in samples for name in sample["heavy"])
+
+    if paint and has_display():
+        samples = [run_script(PAINT_SCRIPT.format(heavy=WINDOW_MODULES)) for _ in range(runs)]
+
+        for key in ("paint", "ready"):
+            report[f"main_{key}"] = statistics.median(sample[key] for sample in samples)
+
+        heavy.update(name for sample in samples for name in sample["heavy"])
+
+    report["heavy_modules"] = sorted(heavy)
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Measures the startup time of SongStorage and checks it "
+                                                 "against budgets, to catch regressions.")
+    parser.add_argument("--runs", type=int, default=5, help="runs of each measurement")
+    parser.add_argument("--no-paint", action="store_true", help="don't open the main window")
+    parser.add_argument("--max-import", type=float, default=0.3, help="budget of an import, in seconds")
+    parser.add_argument("--max-paint", type=float, default=0.5, help="budget of the first paint, in seconds")
+    arguments = parser.parse_args()
+
+    report = benchmark(arguments.runs, not arguments.no_paint)
+    print(json.dumps(report, indent=2))
+
+    failures = [f"{key} took {report[key]:.3f}s" for key in ("main_import", "cli_import")
+                if report[key] > arguments.max_import]
+
+    if report.get("main_paint", 0) > arguments.max_paint:
+        failures.append(f"main_paint took {report['main_paint']:.3f}s")
+
+    if report["heavy_modules"]:
+        failures.append(f"loaded at startup: {', '.join(report['heavy_modules'])}")
+
+    for failure in failures:
+        print(f"Startup regression: {failure}.", file=sys.stderr)
+
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,645 @@
+import hashlib
+import io
+import os
+import re
+import shutil
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+CHUNK_SIZE = 1024 * 1024
+HEX_DIGEST = re.compile(r"^[0-9a-f]{16,}$")
+
+
+def fsync_directory(path):
+    """
+    Makes the renames and removals in a directory durable. Does nothing where directories can't be opened
+    (Windows), the file system committing the renames itself.
+
+    Args:
+        path (str): The directory.
+    """
+
+    try:
+        fd = os.open(path or ".", os.O_RDONLY)
+    except OSError:
+        return
+
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class StorageBackend:
+    """
+    The interface of the places where the song files are kept. A file is identified by a key
+    (its content hash, or its name for the songs stored before the content-addressed storage).
+    """
+
+    def put(self, key, file_path):
+        """
+        Stores a local file under a key, replacing any file with the same key.
+
+        Args:
+            key (str): Key of the file.
+            file_path (str): Path of the local file to store.
+        """
+
+        raise NotImplementedError
+
+
+    def get(self, key, file_path):
+        """
+        Copies a stored file to a local path.
+
+        Args:
+            key (str): Key of the file.
+            file_path (str): Local destination path.
+
+        Raises:
+            FileNotFoundError: If there is no file with this key.
+        """
+
+        with self.open_stream(key) as source, open(file_path, "wb") as destination:
+            shutil.copyfileobj(source, destination, CHUNK_SIZE)
+
+
+    def delete(self, key):
+        """
+        Removes a stored file.
+
+        Args:
+            key (str): Key of the file.
+
+        Returns:
+            bool: True if the file was removed, False if it didn't exist.
+        """
+
+        raise NotImplementedError
+
+
+    def stat(self, key):
+        """
+        Gets the size and modification time of a stored file.
+
+        Args:
+            key (str): Key of the file.
+
+        Returns:
+            dict: The "size" in bytes and the "mtime" timestamp, or None if there is no file with this key.
+        """
+
+        raise NotImplementedError
+
+
+    def exists(self, key):
+        """
+        Checks if a file is stored.
+
+        Args:
+            key (str): Key of the file.
+
+        Returns:
+            bool: True if the file is stored.
+        """
+
+        return self.stat(key) is not None
+
+
+    def open_stream(self, key):
+        """
+        Opens a stored file for reading.
+
+        Args:
+            key (str): Key of the file.
+
+        Returns:
+            file: A binary file-like object, to be closed by the caller.
+
+        Raises:
+            FileNotFoundError: If there is no file with this key.
+        """
+
+        raise NotImplementedError
+
+
+    def read_range(self, key, offset, size):
+        """
+        Reads a part of a stored file.
+
+        Args:
+            key (str): Key of the file.
+            offset (int): Position of the first byte read.
+            size (int): Number of bytes read.
+
+        Returns:
+            bytes: The bytes read, fewer than size at the end of the file.
+
+        Raises:
+            FileNotFoundError: If there is no file with this key.
+        """
+
+        with self.open_stream(key) as stream:
+            if stream.seekable():
+                stream.seek(offset)
+            else:
+                while offset > 0:
+                    skipped = len(stream.read(min(offset, CHUNK_SIZE)))
+                    if not skipped:
+                        return b""
+                    offset -= skipped
+
+            return stream.read(size)
+
+
+    def iter_files(self, after=None):
+        """
+        Lists the stored files in the order of their keys, streaming, for comparing the storage with
+        the database without loading either in memory.
+
+        Args:
+            after (str): Only the keys greater than this one are listed, for resuming a listing.
+
+        Yields:
+            tuple: The key and the size of each file.
+        """
+
+        raise NotImplementedError
+
+
+    def local_path(self, key):
+        """
+        Gets the local path of a stored file, for the users that need a real file (e.g. the audio player).
+
+        Args:
+            key (str): Key of the file.
+
+        Returns:
+            str: The path, or None if the backend doesn't keep the files on the local disk.
+        """
+
+        return None
+
+
+class LocalStorageBackend(StorageBackend):
+    """
+    Stores the files directly in a local directory, named by their key.
+    """
+
+    def __init__(self, root):
+        """
+        Initialize the backend.
+
+        Args:
+            root (str): Directory holding the files.
+        """
+
+        self.root = root
+
+
+    def local_path(self, key):
+        return os.path.join(self.root, key)
+
+
+    def put(self, key, file_path):
+        path = self.local_path(key)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        # Copiat sub un nume temporar si redenumit, ca fisierul sa nu fie vazut pe jumatate scris
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(file_path, "rb") as source, open(temp_path, "wb") as destination:
+                shutil.copyfileobj(source, destination, CHUNK_SIZE)
+                destination.flush()
+                # Continutul ajunge pe disc inaintea redenumirii, altfel o cadere lasa un fisier gol
+                os.fsync(destination.fileno())
+
+            os.replace(temp_path, path)
+            fsync_directory(os.path.dirname(path))
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+
+    def delete(self, key):
+        try:
+            os.remove(self.local_path(key))
+            return True
+        except FileNotFoundError:
+            return False
+
+
+    def stat(self, key):
+        try:
+            result = os.stat(self.local_path(key))
+        except FileNotFoundError:
+            return None
+
+        return {"size": result.st_size, "mtime": result.st_mtime}
+
+
+    def open_stream(self, key):
+        return open(self.local_path(key), "rb")
+
+
+    def iter_files(self, after=None):
+        # Doar fisierele direct in director, subdirectoarele sunt ale altor stocari
+        try:
+            entries = sorted((entry for entry in os.scandir(self.root) if entry.is_file(follow_symlinks=False)),
+                             key=lambda entry: entry.name)
+        except FileNotFoundError:
+            return
+
+        for entry in entries:
+            if after is None or entry.name > after:
+                yield entry.name, entry.stat(follow_symlinks=False).st_size
+
+
+class ShardedLocalStorageBackend(LocalStorageBackend):
+    """
+    Stores the files in a local directory, spread over subdirectories (root/ab/cd/key) so no directory
+    holds millions of files. Keys that are hex digests are sharded by their own first characters,
+    other keys by the SHA-256 of the key.
+    """
+
+    def __init__(self, root, shard_levels=2):
+        """
+        Initialize the backend.
+
+        Args:
+            root (str): Directory holding the subdirectories.
+            shard_levels (int): Number of subdirectory levels, each named by 2 hex characters.
+        """
+
+        super().__init__(root)
+        self.shard_levels = shard_levels
+
+
+    @staticmethod
+    def _digest(key):
+        """
+        Gets the hex string whose first characters name the subdirectories of a key.
+
+        Args:
+            key (str): Key of the file.
+
+        Returns:
+            str: The key if it is a hex digest, otherwise the SHA-256 of the key.
+        """
+
+        return key if HEX_DIGEST.match(key) else hashlib.sha256(key.encode()).hexdigest()
+
+
+    def local_path(self, key):
+        digest = self._digest(key)
+        shards = [digest[2 * level:2 * level + 2] for level in range(self.shard_levels)]
+        return os.path.join(self.root, *shards, key)
+
+
+    def iter_files(self, after=None):
+        # Subdirectoarele sunt prefixele cheilor, parcurse in ordine dau cheile sortate
+        yield from self._iter_shard(self.root, 0, after, self._digest(after) if after is not None else None)
+
+
+    def _iter_shard(self, directory, level, after, digest):
+        """
+        Lists the files of a subdirectory in the order of their keys, for iter_files.
+
+        Args:
+            directory (str): The subdirectory.
+            level (int): Its depth, 0 for the root.
+            after (str): Only the keys greater than this one are listed, None if the subdirectory isn't on
+                the path of this key.
+            digest (str): The hex string naming the subdirectories of this key.
+
+        Yields:
+            tuple: The key and the size of each file.
+        """
+
+        try:
+            entries = sorted(os.scandir(directory), key=lambda entry: entry.name)
+        except FileNotFoundError:
+            return
+
+        if level == self.shard_levels:
+            for entry in entries:
+                if entry.is_file(follow_symlinks=False) and (after is None or entry.name > after):
+                    yield entry.name, entry.stat(follow_symlinks=False).st_size
+            return
+
+        for entry in entries:
+            if len(entry.name) != 2 or not entry.is_dir(follow_symlinks=False):
+                continue  # Fisierele stocate dupa nume, direct in radacina
+
+            # Cheile care nu sunt hash-uri sunt in subdirectoarele hash-ului lor, nu ale numelui
+            shard = digest[2 * level:2 * level + 2] if after is not None else None
+
+            # Subdirectoarele dinaintea cheii au fost deja parcurse
+            if shard is not None and entry.name < shard:
+                continue
+
+            if entry.name == shard:
+                yield from self._iter_shard(entry.path, level + 1, after, digest)
+            else:
+                yield from self._iter_shard(entry.path, level + 1, None, None)
+
+
+class S3StorageBackend(StorageBackend):
+    """
+    Stores the files in a bucket of an S3-compatible object storage (AWS S3, MinIO, ...).
+    Large files are uploaded in parts, several parts at a time. Requires boto3.
+    """
+
+    def __init__(self, bucket, prefix="", endpoint_url=None, multipart_threshold=8 * CHUNK_SIZE,
+                 multipart_chunksize=8 * CHUNK_SIZE, max_concurrency=8, client=None, **client_options):
+        """
+        Initialize the backend.
+
+        Args:
+            bucket (str): Name of the bucket.
+            prefix (str): Prefix added to every key, e.g. "songs/".
+            endpoint_url (str): URL of an S3-compatible server, None for AWS S3.
+            multipart_threshold (int): Size from which files are uploaded in parts.
+            multipart_chunksize (int): Size of a part.
+            max_concurrency (int): Number of parts transferred at the same time.
+            client: An existing boto3 S3 client, created if not provided.
+            **client_options: Other options for the boto3 client (region_name, aws_access_key_id, ...).
+
+        Raises:
+            ImportError: If boto3 isn't installed.
+        """
+
+        try:
+            import boto3
+            from boto3.s3.transfer import TransferConfig
+            from botocore.exceptions import ClientError
+        except ImportError as e:
+            raise ImportError("The S3 storage backend requires boto3 (pip install boto3).") from e
+
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client = client or boto3.client("s3", endpoint_url=endpoint_url, **client_options)
+        self.transfer_config = TransferConfig(
+            multipart_threshold=multipart_threshold,
+            multipart_chunksize=multipart_chunksize,
+            max_concurrency=max_concurrency,
+            use_threads=True
+        )
+        self._client_error = ClientError
+
+
+    def _is_missing(self, error):
+        """
+        Checks if a boto3 error means the object doesn't exist.
+
+        Args:
+            error (ClientError): The error.
+
+        Returns:
+            bool: True for a "not found" error.
+        """
+
+        return error.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound")
+
+
+    def put(self, key, file_path):
+        self.client.upload_file(file_path, self.bucket, self.prefix + key, Config=self.transfer_config)
+
+
+    def get(self, key, file_path):
+        try:
+            self.client.download_file(self.bucket, self.prefix + key, file_path, Config=self.transfer_config)
+        except self._client_error as e:
+            if self._is_missing(e):
+                raise FileNotFoundError(f"File {key} does not exist in storage.") from e
+            raise
+
+
+    def delete(self, key):
+        if not self.exists(key):
+            return False
+
+        self.client.delete_object(Bucket=self.bucket, Key=self.prefix + key)
+        return True
+
+
+    def stat(self, key):
+        try:
+            result = self.client.head_object(Bucket=self.bucket, Key=self.prefix + key)
+        except self._client_error as e:
+            if self._is_missing(e):
+                return None
+            raise
+
+        return {"size": result["ContentLength"], "mtime": result["LastModified"].timestamp()}
+
+
+    def iter_files(self, after=None):
+        # S3 listeaza cheile in ordinea octetilor lor UTF-8, 1000 pe cerere
+        arguments = {"Bucket": self.bucket, "Prefix": self.prefix}
+        if after is not None:
+            arguments["StartAfter"] = self.prefix + after
+
+        for page in self.client.get_paginator("list_objects_v2").paginate(**arguments):
+            for item in page.get("Contents", []):
+                yield item["Key"][len(self.prefix):], item["Size"]
+
+
+    def open_stream(self, key):
+        try:
+            body = self.client.get_object(Bucket=self.bucket, Key=self.prefix + key)["Body"]
+        except self._client_error as e:
+            if self._is_missing(e):
+                raise FileNotFoundError(f"File {key} does not exist in storage.") from e
+            raise
+
+        return io.BufferedReader(_StreamReader(body), CHUNK_SIZE)
+
+
+    def read_range(self, key, offset, size):
+        if size <= 0:
+            return b""
+
+        try:
+            # Doar octetii ceruti sunt descarcati
+            body = self.client.get_object(
+                Bucket=self.bucket, Key=self.prefix + key, Range=f"bytes={offset}-{offset + size - 1}"
+            )["Body"]
+        except self._client_error as e:
+            if self._is_missing(e):
+                raise FileNotFoundError(f"File {key} does not exist in storage.") from e
+            if e.response.get("Error", {}).get("Code") == "InvalidRange":  # Dupa sfarsitul fisierului
+                return b""
+            raise
+
+        with body:
+            return body.read()
+
+
+class _StreamReader(io.RawIOBase):
+    """
+    Adapts a stream that only has read() (such as a boto3 response body) to a raw binary file.
+    """
+
+    def __init__(self, stream):
+        self._stream = stream
+
+
+    def readable(self):
+        return True
+
+
+    def readinto(self, buffer):
+        data = self._stream.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+    def close(self):
+        if not self.closed:
+            self._stream.close()
+        super().close()
+
+
+class RangeReader(io.RawIOBase):
+    """
+    A seekable binary file over a stored file, read in chunks with range reads. The chunks following the one
+    being read are downloaded ahead on background threads, so a consumer reading the file in order (e.g. an
+    audio decoder) can start before the whole file is downloaded, and rarely waits afterwards.
+    Only a few chunks before the read position are kept, so seeking back a little doesn't download them again
+    while a long song isn't kept whole in memory.
+    """
+
+    def __init__(self, backend, key, size=None, chunk_size=256 * 1024, read_ahead=8, keep_behind=4, max_workers=2):
+        """
+        Initialize the reader.
+
+        Args:
+            backend (StorageBackend): Backend holding the file.
+            key (str): Key of the file.
+            size (int): Size of the file, read with backend.stat if not provided.
+            chunk_size (int): Size of a range read.
+            read_ahead (int): Number of chunks downloaded ahead of the read position.
+            keep_behind (int): Number of chunks kept before the one being read.
+            max_workers (int): Number of chunks downloaded at the same time.
+
+        Raises:
+            FileNotFoundError: If there is no file with this key.
+        """
+
+        super().__init__()
+
+        if size is None:
+            stat = backend.stat(key)
+            if stat is None:
+                raise FileNotFoundError(f"File {key} does not exist in storage.")
+            size = stat["size"]
+
+        self.backend = backend
+        self.key = key
+        self.size = size
+        self.chunk_size = chunk_size
+        self.read_ahead = read_ahead
+        self.keep_behind = keep_behind
+
+        self._position = 0
+        self._chunks = {}  # index -> bytes
+        self._pending = {}  # index -> Future, pentru bucatile in curs de descarcare
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="range-read")
+
+
+    def readable(self):
+        return True
+
+
+    def seekable(self):
+        return True
+
+
+    def tell(self):
+        return self._position
+
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self.size
+
+        self._position = max(0, offset)
+        return self._position
+
+
+    def readinto(self, buffer):
+        view = memoryview(buffer).cast("B")
+        filled = 0
+
+        # Citirile care trec peste marginea unei bucati sunt completate din urmatoarea
+        while filled < len(view) and self._position < self.size:
+            index, start = divmod(self._position, self.chunk_size)
+            data = self._chunk(index)[start:start + len(view) - filled]
+
+            if not data:
+                break
+
+            view[filled:filled + len(data)] = data
+            filled += len(data)
+            self._position += len(data)
+
+        return filled
+
+
+    def _chunk(self, index):
+        """
+        Gets a chunk of the file, waiting for its download, and schedules the download of the next chunks.
+        The chunks outside the window around it are dropped.
+
+        Args:
+            index (int): Position of the chunk.
+
+        Returns:
+            bytes: The chunk.
+        """
+
+        last = (self.size - 1) // self.chunk_size
+
+        with self._lock:
+            for ahead in range(index, min(index + self.read_ahead, last) + 1):
+                if ahead not in self._chunks and ahead not in self._pending:
+                    self._pending[ahead] = self._executor.submit(
+                        self.backend.read_range, self.key, ahead * self.chunk_size, self.chunk_size
+                    )
+
+            # Doar bucatile din jurul pozitiei raman in memorie, cele ramase in urma dupa un salt sunt renuntate
+            low, high = index - self.keep_behind, index + self.read_ahead
+            for dropped in [dropped for dropped in self._chunks if not low <= dropped <= high]:
+                del self._chunks[dropped]
+            for dropped in [dropped for dropped in self._pending if not low <= dropped <= high]:
+                self._pending.pop(dropped).cancel()
+
+            chunk = self._chunks.get(index)
+            future = self._pending.get(index)
+
+        if chunk is not None:
+            return chunk
+
+        try:
+            chunk = future.result()
+        finally:
+            with self._lock:
+                self._pending.pop(index, None)
+
+        with self._lock:
+            self._chunks[index] = chunk
+
+        return chunk
+
+
+    def close(self):
+        if not self.closed:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        super().close()
@@ -0,0 +1,435 @@
+import contextlib
+import json
+import os
+from collections import deque
+from concurrent.futures import CancelledError, ProcessPoolExecutor
+from BlobStore import BlobStore
+from StorageBackend import HEX_DIGEST
+
+# Fisierele asteptate de baza de date in fiecare stocare, sortate ca listarea fisierelor
+STORE_QUERIES = {
+    # Fisierele dupa continut (melodii si fisiere convertite), cu marimea si numarul de utilizari
+    "blobs": '''SELECT content_hash, size, refcount FROM blobs
+                WHERE content_hash > %s ORDER BY content_hash LIMIT %s''',
+    # Melodiile adaugate inainte de stocarea dupa continut, ordonate dupa octetii numelui
+    "legacy": '''SELECT file_name COLLATE "C", NULL::BIGINT, count(*) FROM songs
+                 WHERE content_hash IS NULL AND file_name COLLATE "C" > %s
+                 GROUP BY 1 ORDER BY 1 LIMIT %s''',
+}
+
+SONG_QUERIES = {
+    "blobs": '''SELECT content_hash, array_agg(DISTINCT id) FROM (
+                    SELECT content_hash, id FROM songs WHERE content_hash = ANY(%(keys)s)
+                    UNION ALL
+                    SELECT content_hash, song_id FROM renditions WHERE content_hash = ANY(%(keys)s)
+                ) AS users GROUP BY content_hash''',
+    "legacy": '''SELECT file_name, array_agg(id) FROM songs
+                 WHERE content_hash IS NULL AND file_name = ANY(%(keys)s) GROUP BY file_name''',
+}
+
+REPORT_KEYS = ("checked", "missing", "orphaned", "temporary", "unreferenced", "corrupt", "hashed")
+
+
+class StorageScanner:
+    """
+    Finds the drift between the database and the storage: files missing from the storage, files nobody uses,
+    files whose size (or, optionally, content hash) differs from the database, and temporary files left by
+    interrupted copies. It writes a repair plan instead of changing anything.
+
+    The database rows and the storage listing are both read in key order and compared with a sorted merge, so
+    memory stays constant on millions of files. The files are hashed on a pool of processes. The scan saves a
+    checkpoint regularly and resumes from it after an interruption.
+    """
+
+    def __init__(self, pool, stores, hash_files=False, max_workers=None, checkpoint_every=20000, page_size=5000):
+        """
+        Initialize the scanner.
+
+        Args:
+            pool (ConnectionPool): Pool of the SongStorage database.
+            stores (dict): The storage backend of each kind of stored file, "blobs" for the files stored by
+                content and "legacy" for the songs stored by name.
+            hash_files (bool): Whether to hash the files stored by content, finding the corrupted ones.
+            max_workers (int): Number of processes hashing files, by default the number of CPUs.
+            checkpoint_every (int): Number of keys compared between two checkpoints.
+            page_size (int): Number of database rows read at a time.
+        """
+
+        self.pool = pool
+        self.stores = stores
+        self.hash_files = hash_files
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.checkpoint_every = checkpoint_every
+        self.page_size = page_size
+
+
+    def scan(self, plan_path, progress=None, cancel_event=None):
+        """
+        Compares the database with the storage and writes the repair plan, resuming an interrupted scan of
+        the same plan.
+
+        The plan has a JSON object per line, with the "action" ("delete_file", "delete_blob" for a file and its
+        unused database row, or "restore_file"), the "store", the "key" of the file, the "reason" ("orphaned",
+        "temporary", "unreferenced", "missing", "size_mismatch", "hash_mismatch" or "unreadable") and, for the
+        files to restore, the "songs" using them.
+
+        Args:
+            plan_path (str): Path of the repair plan. Its checkpoint is saved next to it, as
+                <plan>.checkpoint.json, and removed when the scan ends.
+            progress (callable): Called with the number of keys compared and the number of files expected by
+                the database at each checkpoint.
+            cancel_event (threading.Event): Stops the scan at the next checkpoint when set.
+
+        Returns:
+            dict: The number of keys compared ("checked") and of the problems of each kind.
+
+        Raises:
+            CancelledError: If the scan was cancelled. The next scan of the same plan resumes it.
+        """
+
+        checkpoint_path = f"{plan_path}.checkpoint.json"
+        checkpoint = self._load_checkpoint(checkpoint_path)
+
+        if checkpoint is not None:
+            report = checkpoint["report"]
+            print(f"Resuming the scan after {report['checked']} keys.")
+        else:
+            report = dict.fromkeys(REPORT_KEYS, 0)
+
+        total = self._expected_files()
+        names = list(self.stores)
+        start = names.index(checkpoint["store"]) if checkpoint is not None else 0
+
+        # Planul e trunchiat la marimea de la ultimul punct de control, fara randuri duble
+        with open(plan_path, "ab") as plan:
+            plan.truncate(checkpoint["plan_size"] if checkpoint is not None else 0)
+
+        with open(plan_path, "a", encoding="utf-8") as plan, \
+                ProcessPoolExecutor(self.max_workers) if self.hash_files else contextlib.nullcontext() as processes:
+            for name in names[start:]:
+                after = checkpoint["after"] if checkpoint is not None and checkpoint["store"] == name else ""
+                state = _StoreScan(self, name, plan, report, processes)
+
+                for key in state.merge(after):
+                    if state.since_checkpoint >= self.checkpoint_every:
+                        state.flush()
+                        self._save_checkpoint(checkpoint_path, name, key, plan, report)
+
+                        if progress is not None:
+                            progress(report["checked"], total)
+
+                        if cancel_event is not None and cancel_event.is_set():
+                            raise CancelledError("The scan was cancelled, it resumes from its checkpoint.")
+
+                state.flush()
+
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+
+        if progress is not None:
+            progress(report["checked"], total)
+
+        problems = sum(report[key] for key in REPORT_KEYS if key not in ("checked", "hashed"))
+        print(f"Scan finished: {report['checked']} keys compared, {problems} problems written to {plan_path}.")
+        return report
+
+
+    def _expected_files(self):
+        """
+        Counts the files expected by the database, for the progress.
+
+        Returns:
+            int: The number of files.
+        """
+
+        with self.pool.cursor() as cursor:
+            cursor.execute(
+                '''SELECT (SELECT count(*) FROM blobs)
+                        + (SELECT count(DISTINCT file_name) FROM songs WHERE content_hash IS NULL)'''
+            )
+            return cursor.fetchone()[0]
+
+
+    def _rows(self, name, after):
+        """
+        Reads the files expected by the database in a store, in key order, a page at a time, without holding
+        a connection between pages.
+
+        Args:
+            name (str): The store.
+            after (str): Only the keys greater than this one are read.
+
+        Yields:
+            tuple: The key, the expected size (None if unknown) and the number of users of each file.
+        """
+
+        while True:
+            with self.pool.cursor() as cursor:
+                cursor.execute(STORE_QUERIES[name], (after, self.page_size))
+                page = cursor.fetchall()
+
+            yield from page
+
+            if len(page) < self.page_size:
+                return
+
+            after = page[-1][0]
+
+
+    def songs_using(self, name, keys):
+        """
+        Finds the songs using some files, for the files the plan restores.
+
+        Args:
+            name (str): The store.
+            keys (list): Keys of the files.
+
+        Returns:
+            dict: The sorted song IDs of each key.
+        """
+
+        with self.pool.cursor() as cursor:
+            cursor.execute(SONG_QUERIES[name], {"keys": keys})
+            return {key: sorted(ids) for key, ids in cursor.fetchall()}
+
+
+    @staticmethod
+    def _load_checkpoint(checkpoint_path):
+        """
+        Reads the checkpoint of a scan.
+
+        Args:
+            checkpoint_path (str): Path of the checkpoint.
+
+        Returns:
+            dict: The store being scanned, the last key compared, the report and the size of the plan, or None
+                if there is no (valid) checkpoint.
+        """
+
+        try:
+            with open(checkpoint_path, encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+
+    @staticmethod
+    def _save_checkpoint(checkpoint_path, name, key, plan, report):
+        """
+        Saves the checkpoint of a scan, atomically, after the plan lines written so far are on disk.
+
+        Args:
+            checkpoint_path (str): Path of the checkpoint.
+            name (str): The store being scanned.
+            key (str): The last key compared.
+            plan (file): The plan file.
+            report (dict): The counts so far.
+        """
+
+        plan.flush()
+        os.fsync(plan.fileno())
+
+        temp_path = f"{checkpoint_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump({"store": name, "after": key, "report": report, "plan_size": plan.tell()}, file)
+
+        os.replace(temp_path, checkpoint_path)
+
+
+class _StoreScan:
+    """
+    The sorted merge of the database rows and of the files of one store.
+    """
+
+    def __init__(self, scanner, name, plan, report, processes):
+        """
+        Initialize the merge.
+
+        Args:
+            scanner (StorageScanner): The scanner.
+            name (str): The store.
+            plan (file): The plan file, open for appending.
+            report (dict): The counts, updated in place.
+            processes (ProcessPoolExecutor): Pool hashing the files, None to not hash them.
+        """
+
+        self.scanner = scanner
+        self.name = name
+        self.backend = scanner.stores[name]
+        self.plan = plan
+        self.report = report
+        self.processes = processes if name == "blobs" else None
+        self.hashing = deque()  # (key, size, future)
+        self.actions = []
+        self.since_checkpoint = 0
+
+
+    def _files(self, after):
+        """
+        Lists the files of the store in key order, marking the files that can't be keys (temporary copies, names
+        that aren't hashes), which don't take part in the merge.
+
+        Args:
+            after (str): Only the keys greater than this one are listed.
+
+        Yields:
+            tuple: The key, the size and, for the files that can't be keys, the reason of their deletion.
+        """
+
+        for key, size in self.backend.iter_files(after or None):
+            if key.endswith(".tmp"):
+                yield key, size, "temporary"
+            elif self.name == "blobs" and not (len(key) == 64 and HEX_DIGEST.match(key)):
+                yield key, size, "orphaned"
+            else:
+                yield key, size, None
+
+
+    def merge(self, after):
+        """
+        Compares the database rows with the files.
+
+        Args:
+            after (str): The last key compared before, "" to start from the beginning.
+
+        Yields:
+            str: Each key compared, after its problems were recorded.
+        """
+
+        rows = self.scanner._rows(self.name, after)
+        files = self._files(after)
+        row = next(rows, None)
+        file = next(files, None)
+
+        while True:
+            # Fisierele citite in avans sunt raportate abia dupa checkpoint-ul cheii anterioare,
+            # altfel o reluare de la acea cheie le-ar raporta de doua ori
+            while file is not None and file[2] is not None:
+                self._add("delete_file", file[0], file[2])
+                file = next(files, None)
+
+            if row is None and file is None:
+                break
+
+            if file is None or (row is not None and row[0] < file[0]):
+                key, expected_size, users = row
+                # Un rand fara utilizatori nu mai trebuie restaurat
+                self._add("delete_blob" if not users else "restore_file", key,
+                          "unreferenced" if not users else "missing")
+                row = next(rows, None)
+            elif row is None or file[0] < row[0]:
+                key = file[0]
+                self._add("delete_file", key, "orphaned")
+                file = next(files, None)
+            else:
+                key, expected_size, users = row
+                size = file[1]
+
+                if not users:
+                    self._add("delete_blob", key, "unreferenced")
+                elif expected_size is not None and size != expected_size:
+                    self._add("restore_file", key, "size_mismatch", expected_size=expected_size, size=size)
+                elif self.processes is not None:
+                    self._hash(key)
+
+                row = next(rows, None)
+                file = next(files, None)
+
+            self.report["checked"] += 1
+            self.since_checkpoint += 1
+            yield key
+
+
+    def _hash(self, key):
+        """
+        Hashes a file on the process pool, keeping a bounded number of files in work.
+
+        Args:
+            key (str): Key (and expected hash) of the file.
+        """
+
+        file_path = self.backend.local_path(key)
+
+        if file_path is None:
+            return  # Fisierele la distanta nu sunt descarcate pentru verificare
+
+        self.hashing.append((key, self.processes.submit(BlobStore.hash_file, file_path)))
+
+        while len(self.hashing) > 4 * self.scanner.max_workers:
+            self._hashed()
+
+
+    def _hashed(self):
+        """
+        Waits for the oldest file being hashed and records it if it is corrupted.
+        """
+
+        key, future = self.hashing.popleft()
+
+        try:
+            content_hash, _ = future.result()
+        except OSError as e:
+            self._add("restore_file", key, "unreadable", error=str(e))
+            return
+
+        self.report["hashed"] += 1
+
+        if content_hash != key:
+            self._add("restore_file", key, "hash_mismatch", content_hash=content_hash)
+
+
+    def _add(self, action, key, reason, **details):
+        """
+        Records a problem, written to the plan at the next flush.
+
+        Args:
+            action (str): The repair.
+            key (str): Key of the file.
+            reason (str): The problem.
+            **details: Other fields of the plan line.
+        """
+
+        self.actions.append(dict(action=action, store=self.name, key=key, reason=reason, **details))
+        self.report["corrupt" if reason in ("size_mismatch", "hash_mismatch", "unreadable") else reason] += 1
+
+
+    def flush(self):
+        """
+        Waits for the files being hashed and writes the recorded problems to the plan, with the songs using
+        the files to restore.
+        """
+
+        while self.hashing:
+            self._hashed()
+
+        restore = [action["key"] for action in self.actions if action["action"] == "restore_file"]
+        songs = self.scanner.songs_using(self.name, restore) if restore else {}
+
+        for action in self.actions:
+            if action["action"] == "restore_file":
+                action["songs"] = songs.get(action["key"], [])
+
+            self.plan.write(json.dumps(action) + "\n")
+
+        self.actions = []
+        self.since_checkpoint = 0
+
+
+
+if __name__ == "__main__":
+    import argparse
+    from SongStorage import SongStorage
+
+    parser = argparse.ArgumentParser(description="Checks that the Storage folder matches the songs database.")
+    parser.add_argument("--plan", default="repair_plan.jsonl", help="path of the repair plan (JSON lines)")
+    parser.add_argument("--hash", action="store_true", help="hash the stored files to find corrupted ones")
+    parser.add_argument("--workers", type=int, default=None, help="number of processes hashing files")
+    arguments = parser.parse_args()
+
+    storage = SongStorage()
+    try:
+        report = storage.verify(arguments.plan, arguments.hash, arguments.workers,
+                                progress=lambda checked, total: print(f"{checked} / {total} files compared."))
+        print(json.dumps(report, indent=2))
+    finally:
+        storage.close_connection()
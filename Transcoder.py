@@ -0,0 +1,450 @@
+import contextlib
+import math
+import os
+import re
+import shutil
+import subprocess
+import sys
+import uuid
+import wave
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from MetadataExtractor import read_audio_metadata
+
+# Coloanele cu intensitatea sonora masurata a melodiei
+LOUDNESS_COLUMNS = ("loudness", "peak")
+
+# Nivelul de referinta ReplayGain 2.0, in LUFS
+REFERENCE_LOUDNESS = -18.0
+
+# Optiunile ffmpeg ale formatelor in care pot fi convertite melodiile
+RENDITION_FORMATS = {
+    "ogg": ["-c:a", "libvorbis"],
+    "opus": ["-c:a", "libopus"],
+    "mp3": ["-c:a", "libmp3lame"],
+    "flac": ["-c:a", "flac"],
+    "wav": ["-c:a", "pcm_s16le"],
+}
+
+LOSSLESS_FORMATS = ("flac", "wav")
+
+TRANSCODE_DIR = os.path.join("Cache", "transcode")
+
+# Ponderile canalelor in BS.1770 (5.1: L, R, C, LFE, Ls, Rs), celelalte au ponderea 1
+CHANNEL_WEIGHTS = {6: (1.0, 1.0, 1.0, 0.0, 1.41, 1.41)}
+
+SUMMARY_LOUDNESS = re.compile(r"I:\s+(-?[\d.]+|-inf) LUFS")
+SUMMARY_PEAK = re.compile(r"Peak:\s+(-?[\d.]+|-inf) dBFS")
+
+
+def replay_gain(loudness):
+    """
+    Gets the ReplayGain of a song, the gain bringing it to the reference loudness.
+
+    Args:
+        loudness (float): Integrated loudness of the song, in LUFS.
+
+    Returns:
+        float: The gain in dB, None if the loudness is unknown.
+    """
+
+    return None if loudness is None else round(REFERENCE_LOUDNESS - loudness, 2)
+
+
+def run_ffmpeg(ffmpeg, source_path, output_path=None, codec_options=(), sample_rate=None):
+    """
+    Decodes a file once with ffmpeg, measuring its loudness (EBU R128) and optionally encoding it to another file.
+
+    Args:
+        ffmpeg (str): Path to the ffmpeg program.
+        source_path (str): Path to the audio file.
+        output_path (str): Path of the encoded file, None to only measure the loudness.
+        codec_options (list): ffmpeg options of the output codec.
+        sample_rate (int): Sample rate of the output, by default the one of the source.
+
+    Returns:
+        dict: The integrated loudness (LUFS) and the true peak (dBFS), None for a silent file.
+
+    Raises:
+        RuntimeError: If ffmpeg fails.
+    """
+
+    command = [ffmpeg, "-hide_banner", "-nostats", "-nostdin", "-y", "-i", source_path,
+               "-map", "0:a:0", "-af", "ebur128=peak=true"]
+
+    if output_path is None:
+        command += ["-f", "null", "-"]
+    else:
+        command += ["-map_metadata", "0"] + list(codec_options)
+        if sample_rate:
+            command += ["-ar", str(sample_rate)]
+        command.append(output_path)
+
+    process = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, errors="replace")
+
+    if process.returncode != 0:
+        raise RuntimeError(process.stderr.strip().splitlines()[-1] if process.stderr.strip() else "ffmpeg failed")
+
+    # Rezumatul filtrului ebur128, la sfarsitul iesirii
+    summary = process.stderr[process.stderr.rfind("Summary:"):]
+    loudness = SUMMARY_LOUDNESS.search(summary)
+    peak = SUMMARY_PEAK.search(summary)
+
+    return {
+        "loudness": float(loudness.group(1)) if loudness and loudness.group(1) != "-inf" else None,
+        "peak": float(peak.group(1)) if peak and peak.group(1) != "-inf" else None,
+    }
+
+
+class _KWeighting:
+    """
+    The K-weighting filter of BS.1770 (a high shelf followed by a high pass), for one channel.
+    """
+
+    def __init__(self, rate):
+        """
+        Computes the coefficients of the filter for a sample rate.
+
+        Args:
+            rate (int): Sample rate, in Hz.
+        """
+
+        # Raft de +4 dB peste 1500 Hz (capul)
+        gain, q, frequency = 4.0, 1 / math.sqrt(2), 1500.0
+        a = 10 ** (gain / 40)
+        w0 = 2 * math.pi * frequency / rate
+        alpha = math.sin(w0) / (2 * q)
+        cos_w0 = math.cos(w0)
+
+        a0 = (a + 1) - (a - 1) * cos_w0 + 2 * math.sqrt(a) * alpha
+        self.shelf = (
+            a * ((a + 1) + (a - 1) * cos_w0 + 2 * math.sqrt(a) * alpha) / a0,
+            -2 * a * ((a - 1) + (a + 1) * cos_w0) / a0,
+            a * ((a + 1) + (a - 1) * cos_w0 - 2 * math.sqrt(a) * alpha) / a0,
+            2 * ((a - 1) - (a + 1) * cos_w0) / a0,
+            ((a + 1) - (a - 1) * cos_w0 - 2 * math.sqrt(a) * alpha) / a0,
+        )
+
+        # Trece-sus la 38 Hz
+        q, frequency = 0.5, 38.0
+        w0 = 2 * math.pi * frequency / rate
+        alpha = math.sin(w0) / (2 * q)
+        cos_w0 = math.cos(w0)
+
+        a0 = 1 + alpha
+        self.high_pass = (
+            (1 + cos_w0) / 2 / a0,
+            -(1 + cos_w0) / a0,
+            (1 + cos_w0) / 2 / a0,
+            -2 * cos_w0 / a0,
+            (1 - alpha) / a0,
+        )
+
+        self.state = [0.0] * 6
+
+
+    def energy(self, samples):
+        """
+        Filters samples, continuing from the previous ones.
+
+        Args:
+            samples (iterable): The samples, between -1 and 1.
+
+        Returns:
+            float: Sum of the squares of the filtered samples.
+        """
+
+        b0, b1, b2, a1, a2 = self.shelf
+        c0, c1, c2, d1, d2 = self.high_pass
+        x1, x2, y1, y2, z1, z2 = self.state
+        total = 0.0
+
+        for x in samples:
+            y = b0 * x + b1 * x1 + b2 * x2 - a1 * y1 - a2 * y2
+            z = c0 * y + c1 * y1 + c2 * y2 - d1 * z1 - d2 * z2
+            x2, x1 = x1, x
+            y2, y1 = y1, y
+            z2, z1 = z1, z
+            total += z * z
+
+        self.state = [x1, x2, y1, y2, z1, z2]
+        return total
+
+
+def _decode_pcm(frames, width):
+    """
+    Decodes little-endian PCM samples.
+
+    Args:
+        frames (bytes): The samples.
+        width (int): Bytes per sample, 1 (unsigned) to 4.
+
+    Returns:
+        list: The samples, between -1 and 1.
+    """
+
+    if width == 3:
+        return [int.from_bytes(frames[index:index + 3], "little", signed=True) / 8388608
+                for index in range(0, len(frames) - 2, 3)]
+
+    samples = array({1: "B", 2: "h", 4: "i"}[width])
+    samples.frombytes(frames[:len(frames) - len(frames) % width])
+
+    if width > 1 and sys.byteorder == "big":
+        samples.byteswap()
+
+    if width == 1:
+        return [(sample - 128) / 128 for sample in samples]
+
+    scale = float(1 << (8 * width - 1))
+    return [sample / scale for sample in samples]
+
+
+def measure_wave_loudness(file_path):
+    """
+    Measures the loudness of a WAV file in pure Python, as in BS.1770 / EBU R128: the K-weighted power of
+    400 ms blocks overlapping by 75%, gated at -70 LUFS and 10 LU below the ungated loudness.
+
+    Args:
+        file_path (str): Path to the WAV file.
+
+    Returns:
+        dict: The integrated loudness (LUFS) and the sample peak (dBFS), None for a silent or too short file.
+
+    Raises:
+        wave.Error: If the file isn't a PCM WAV file.
+    """
+
+    with wave.open(file_path, "rb") as wav:
+        channels, width, rate = wav.getnchannels(), wav.getsampwidth(), wav.getframerate()
+        weights = CHANNEL_WEIGHTS.get(channels, (1.0,) * channels)
+        filters = [_KWeighting(rate) for _ in range(channels)]
+        step = rate // 10  # 100 ms
+        segments = []
+        peak = 0.0
+
+        while True:
+            frames = wav.readframes(step)
+            samples = _decode_pcm(frames, width)
+            count = len(samples) // channels
+
+            if count < step:
+                break
+
+            energy = 0.0
+            for channel in range(channels):
+                channel_samples = samples[channel::channels]
+                peak = max(peak, max(channel_samples), -min(channel_samples))
+
+                if weights[channel]:
+                    energy += weights[channel] * filters[channel].energy(channel_samples)
+
+            segments.append(energy / step)
+
+    # Blocuri de 400 ms, din 4 segmente de 100 ms
+    blocks = [sum(segments[index:index + 4]) / 4 for index in range(len(segments) - 3)]
+    blocks = [power for power in blocks if power > 0 and -0.691 + 10 * math.log10(power) > -70]
+
+    if not blocks:
+        return {"loudness": None, "peak": 20 * math.log10(peak) if peak else None}
+
+    threshold = -0.691 + 10 * math.log10(sum(blocks) / len(blocks)) - 10
+    gated = [power for power in blocks if -0.691 + 10 * math.log10(power) > threshold]
+
+    return {
+        "loudness": round(-0.691 + 10 * math.log10(sum(gated) / len(gated)), 2),
+        "peak": round(20 * math.log10(peak), 2) if peak else None,
+    }
+
+
+def process_file(task):
+    """
+    Measures the loudness of a song file and, if asked, encodes it to another format. A module level function,
+    so it can run on a process pool. A file that can't be processed is reported instead of failing.
+
+    Args:
+        task (tuple): The path to the file, its format (extension), the ffmpeg path (None if ffmpeg isn't
+            installed), the output path (None for no rendition), the ffmpeg options of the output codec and the
+            output sample rate.
+
+    Returns:
+        dict: The loudness and the peak, None if they can't be measured, and for an encoded file a "rendition"
+            dict with its path, codec, bitrate and sample_rate. Empty if the file can't be processed.
+    """
+
+    file_path, file_format, ffmpeg, output_path, codec_options, sample_rate = task
+
+    try:
+        if ffmpeg:
+            result = run_ffmpeg(ffmpeg, file_path, output_path, codec_options, sample_rate)
+        elif (file_format or "").lower() in ("wav", "wave"):
+            result = measure_wave_loudness(file_path)
+        else:
+            return {"loudness": None, "peak": None}
+
+        if ffmpeg and output_path:
+            try:
+                info = read_audio_metadata(output_path)
+            except Exception:
+                info = {}
+
+            result["rendition"] = {
+                "path": output_path,
+                "codec": info.get("codec"),
+                "bitrate": info.get("bitrate"),
+                "sample_rate": info.get("sample_rate"),
+            }
+
+        return result
+    except Exception as e:
+        print(f"Error while transcoding {os.path.basename(file_path)}: {e}.")
+
+        if output_path and os.path.exists(output_path):
+            os.remove(output_path)
+        return {}
+
+
+class Transcoder:
+    """
+    The optional ingest stage of the songs: converts the files to a canonical format, so the formats the player
+    can't decode are converted once instead of at every playback, and measures their loudness (EBU R128, from
+    which the ReplayGain follows). The files are processed on a pool of processes.
+
+    Uses a local ffmpeg. Without it the loudness of the WAV files is measured in pure Python and nothing is
+    converted.
+    """
+
+    def __init__(self, target_format="ogg", bitrate="160k", sample_rate=None, max_workers=None,
+                 process_threshold=4, work_dir=TRANSCODE_DIR, ffmpeg=None):
+        """
+        Initialize the transcoder.
+
+        Args:
+            target_format (str): Format of the renditions, one of RENDITION_FORMATS. None to only measure
+                the loudness.
+            bitrate (str): Bitrate of the lossy renditions, in ffmpeg notation.
+            sample_rate (int): Sample rate of the renditions, by default the one of the original.
+            max_workers (int): Number of processes, by default the number of CPUs.
+            process_threshold (int): Batches of at least this many files use the process pool.
+            work_dir (str): Folder of the renditions before they are stored.
+            ffmpeg (str): Path to the ffmpeg program, searched in PATH if not provided.
+
+        Raises:
+            ValueError: If the format isn't supported.
+        """
+
+        if target_format is not None and target_format not in RENDITION_FORMATS:
+            raise ValueError(f"Unsupported rendition format: {target_format}.")
+
+        self.target_format = target_format
+        self.bitrate = bitrate
+        self.sample_rate = sample_rate
+        self.max_workers = max_workers
+        self.process_threshold = process_threshold
+        self.work_dir = work_dir
+        self.ffmpeg = ffmpeg or shutil.which("ffmpeg")
+
+
+    @property
+    def can_transcode(self):
+        """
+        Whether renditions can be made, i.e. a target format is set and ffmpeg is installed.
+        """
+
+        return self.target_format is not None and self.ffmpeg is not None
+
+
+    def needs_rendition(self, file_format):
+        """
+        Checks if a song needs a rendition in the target format.
+
+        Args:
+            file_format (str): Format (extension) of the original file.
+
+        Returns:
+            bool: True if the original has another format and it can be converted.
+        """
+
+        return self.can_transcode and (file_format or "").lower() != self.target_format
+
+
+    def _task(self, file_path, file_format, transcode):
+        """
+        Builds the task of a file for process_file.
+
+        Args:
+            file_path (str): Path to the file.
+            file_format (str): Format (extension) of the file, the stored files having no extension.
+            transcode (bool): Whether to make a rendition.
+
+        Returns:
+            tuple: The task.
+        """
+
+        if not (transcode and self.can_transcode):
+            return file_path, file_format, self.ffmpeg, None, (), None
+
+        os.makedirs(self.work_dir, exist_ok=True)
+        output_path = os.path.join(self.work_dir, f"{uuid.uuid4().hex}.{self.target_format}")
+        options = list(RENDITION_FORMATS[self.target_format])
+
+        if self.target_format not in LOSSLESS_FORMATS:
+            options += ["-b:a", self.bitrate]
+
+        return file_path, file_format, self.ffmpeg, output_path, options, self.sample_rate
+
+
+    def process(self, file_path, file_format=None, transcode=True):
+        """
+        Processes a file in the calling process.
+
+        Args:
+            file_path (str): Path to the file.
+            file_format (str): Format (extension) of the file, by default the extension of its path.
+            transcode (bool): Whether to make a rendition.
+
+        Returns:
+            dict: See process_file. The rendition file belongs to the caller.
+        """
+
+        if file_format is None:
+            file_format = os.path.splitext(file_path)[1].lstrip(".")
+
+        return process_file(self._task(file_path, file_format, transcode))
+
+
+    def process_many(self, files, processes=None):
+        """
+        Processes many files.
+
+        Args:
+            files (list): (file_path, file_format, transcode) tuples.
+            processes (ProcessPoolExecutor): Pool processing the files, from process_pool. None to process them here.
+
+        Returns:
+            list: The result of each file (see process_file), in the input order.
+        """
+
+        tasks = [self._task(file_path, file_format, transcode) for file_path, file_format, transcode in files]
+
+        if processes is None:
+            return [process_file(task) for task in tasks]
+
+        return list(processes.map(process_file, tasks))
+
+
+    def process_pool(self, count=None):
+        """
+        Gets the pool of processes for a batch of files, to be used as a context manager around it.
+
+        Args:
+            count (int): Number of files, None if unknown.
+
+        Returns:
+            ContextManager: A ProcessPoolExecutor for the large batches, otherwise a context giving None.
+        """
+
+        if count is not None and count < self.process_threshold:
+            return contextlib.nullcontext(None)
+
+        return ProcessPoolExecutor(max_workers=self.max_workers)
@@ -0,0 +1,430 @@
+import argparse
+import contextlib
+import csv
+import itertools
+import json
+import shlex
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+# Doar modulele standard sunt incarcate la pornire; SongStorage (psycopg2) la prima comanda, Tk si pygame niciodata
+
+
+def search_columns():
+    """
+    Gets the columns the songs can be searched by.
+
+    Returns:
+        set: The names of the columns.
+    """
+
+    from SongQueries import SEARCH_COLUMNS
+
+    return set(SEARCH_COLUMNS)
+
+
+def parse_criteria(pairs):
+    """
+    Parses the search criteria given on the command line.
+
+    Args:
+        pairs (list): "column=value" strings. The tags are separated by commas (matching the songs having any
+            of them) and an interval is written as "minimum..maximum", either end being optional.
+
+    Returns:
+        dict: The criteria, as taken by SongStorage.search.
+
+    Raises:
+        ValueError: If a criterion isn't "column=value" or its column is unknown.
+    """
+
+    columns = search_columns()
+    criteria = {}
+
+    for pair in pairs or ():
+        column, separator, value = pair.partition("=")
+
+        if not separator or column not in columns:
+            raise ValueError(f"Invalid criterion: {pair} (expected column=value, column one of "
+                             f"{', '.join(sorted(columns))})")
+
+        if column == "tags":
+            criteria[column] = [tag.strip() for tag in value.split(",") if tag.strip()]
+        elif ".." in value:
+            low, high = value.split("..", 1)
+            criteria[column] = (low or None, high or None)
+        else:
+            criteria[column] = value
+
+    return criteria
+
+
+def read_records(path, input_format=None):
+    """
+    Reads the records of an input file, one at a time.
+
+    Args:
+        path (str): Path of the file, "-" for the standard input.
+        input_format (str): "jsonl" (a JSON object per line) or "csv" (with a header). By default it is chosen by
+            the extension of the path, JSON lines for the standard input.
+
+    Yields:
+        dict: The records.
+    """
+
+    input_format = input_format or ("csv" if path.lower().endswith(".csv") else "jsonl")
+
+    if path == "-":
+        file = contextlib.nullcontext(sys.stdin)
+    else:
+        file = open(path, newline="", encoding="utf-8")
+
+    with file as lines:
+        if input_format == "csv":
+            yield from csv.DictReader(lines)
+        else:
+            for line in lines:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+
+class RecordWriter:
+    """
+    Writes the results of the commands to a stream as they are produced, as JSON lines or CSV.
+    """
+
+    def __init__(self, stream, output_format="jsonl"):
+        """
+        Initialize the writer.
+
+        Args:
+            stream (file): The text stream written, usually the standard output.
+            output_format (str): "jsonl" or "csv". The CSV header is taken from the first record.
+        """
+
+        self.stream = stream
+        self.output_format = output_format
+        self._csv = None
+
+
+    def write(self, record):
+        """
+        Writes a record.
+
+        Args:
+            record (dict): The record. The dates are written as text; in CSV the lists are joined with commas
+                and the other nested values are written as JSON.
+        """
+
+        if self.output_format == "jsonl":
+            self.stream.write(json.dumps(record, default=str) + "\n")
+        else:
+            if self._csv is None:
+                self._csv = csv.DictWriter(self.stream, fieldnames=list(record), extrasaction="ignore")
+                self._csv.writeheader()
+
+            self._csv.writerow({key: self._csv_value(value) for key, value in record.items()})
+
+        self.stream.flush()  # Programul urmator din pipe primeste rezultatele imediat
+
+
+    @staticmethod
+    def _csv_value(value):
+        """
+        Converts a value for a CSV cell.
+
+        Args:
+            value: The value.
+
+        Returns:
+            The value as written in the cell.
+        """
+
+        if isinstance(value, list):
+            return ",".join(str(item) for item in value)
+        if isinstance(value, dict):
+            return json.dumps(value, default=str)
+
+        return value
+
+
+def song_record(row):
+    """
+    Converts a song row to a record.
+
+    Args:
+        row (tuple): The song, with the columns of SONG_COLUMNS.
+
+    Returns:
+        dict: The song, by column name.
+    """
+
+    from SongQueries import SONG_COLUMNS
+
+    return dict(zip(SONG_COLUMNS.split(", "), row))
+
+
+def run_import(storage, arguments):
+    """
+    Adds song files given as arguments or listed in an input file (with file_path and optionally artist,
+    song_name, release_date and tags, comma separated in CSV).
+
+    Yields:
+        dict: The file path, the ID of the added song and the error, for each song in the input order.
+    """
+
+    songs = [(file_path, (None, None, None, None)) for file_path in arguments.files]
+
+    if arguments.input:
+        for record in read_records(arguments.input, arguments.input_format):
+            tags = record.get("tags")
+            if isinstance(tags, str):
+                tags = [tag.strip() for tag in tags.split(",") if tag.strip()]
+
+            metadata = (record.get("artist") or None, record.get("song_name") or None,
+                        record.get("release_date") or None, tags or None)
+            songs.append((record["file_path"], metadata))
+
+    for file_path, song_id, error in storage.add_songs(songs, batch_size=arguments.batch_size,
+                                                        max_workers=arguments.workers):
+        yield {"file_path": file_path, "id": song_id, "error": None if error is None else str(error)}
+
+
+def run_search(storage, arguments):
+    """
+    Searches the songs by criteria, streaming them by ID, or by relevance for a text.
+
+    Yields:
+        dict: The matching songs.
+    """
+
+    criteria = parse_criteria(arguments.where)
+
+    if arguments.text:
+        if criteria:
+            raise ValueError("--text can't be combined with --where.")
+        rows = storage.search_ranked(arguments.text, limit=arguments.limit or 50)
+    else:
+        rows = itertools.islice(storage.iter_search(**criteria), arguments.limit)
+
+    for row in rows:
+        yield song_record(row)
+
+
+def run_export(storage, arguments):
+    """
+    Creates a save list of the songs meeting the criteria.
+
+    Yields:
+        dict: The name of each file added to the archive.
+    """
+
+    criteria = parse_criteria(arguments.where)
+    file_names = storage.create_save_list(arguments.archive, arguments.archive_format,
+                                          compress_audio=arguments.compress_audio,
+                                          incremental=arguments.incremental, rendition=arguments.rendition,
+                                          **criteria)
+
+    for file_name in file_names:
+        yield {"file_name": file_name}
+
+
+def run_delete(storage, arguments):
+    """
+    Deletes the songs given by ID (as arguments or in an input file with an id column), or meeting criteria.
+
+    Yields:
+        dict: The ID of each deleted song.
+    """
+
+    ids = [int(id_song) for id_song in arguments.ids]
+
+    if arguments.input:
+        ids.extend(int(record["id"]) for record in read_records(arguments.input, arguments.input_format))
+
+    criteria = parse_criteria(arguments.where)
+
+    if ids and criteria:
+        raise ValueError("The songs are deleted either by ID or by --where, not both.")
+
+    for id_song in storage.delete_songs(criteria or ids, max_workers=arguments.workers):
+        yield {"id": id_song}
+
+
+def run_verify(storage, arguments):
+    """
+    Checks the storage against the database, writing a repair plan.
+
+    Yields:
+        dict: The report of the verification.
+    """
+
+    yield storage.verify(arguments.plan, arguments.hash, arguments.workers,
+                         progress=lambda checked, total: print(f"{checked} / {total} files compared."))
+
+
+def run_stats(storage, arguments):
+    """
+    Summarizes the stored songs.
+
+    Yields:
+        dict: The statistics, see SongStorage.stats.
+    """
+
+    yield storage.stats()
+
+
+def run_batch(storage, arguments):
+    """
+    Runs many commands in parallel on the same storage. Each input line is a command, written as on the
+    command line (e.g. "delete 4 5") or as a JSON list of arguments.
+
+    Yields:
+        dict: The records of every command, in the input order, with the number of the input line; a command
+            that fails yields a single record with its error.
+    """
+
+    parser = build_parser()
+
+    def run_line(numbered):
+        """
+        Runs the command of an input line.
+
+        Args:
+            numbered (tuple): The number of the line and the line.
+
+        Returns:
+            list: The records of the command.
+        """
+
+        number, line = numbered
+
+        try:
+            command = json.loads(line) if line.startswith("[") else shlex.split(line)
+            command_arguments = parser.parse_args(command)
+
+            if command_arguments.handler is run_batch:
+                raise ValueError("A batch can't run other batches.")
+
+            return [{"line": number, **record} for record in command_arguments.handler(storage, command_arguments)]
+        except SystemExit:  # argparse a afisat deja eroarea
+            return [{"line": number, "error": f"Invalid command: {line}"}]
+        except Exception as e:
+            return [{"line": number, "error": str(e)}]
+
+    if arguments.input == "-":
+        file = contextlib.nullcontext(sys.stdin)
+    else:
+        file = open(arguments.input, encoding="utf-8")
+
+    with file as lines, ThreadPoolExecutor(max_workers=arguments.workers) as executor:
+        commands = ((number, line.strip()) for number, line in enumerate(lines, 1) if line.strip())
+
+        for records in executor.map(run_line, commands):
+            yield from records
+
+
+def build_parser():
+    """
+    Builds the parser of the command line.
+
+    Returns:
+        argparse.ArgumentParser: The parser; the chosen command is in the handler attribute of the parsed
+            arguments.
+    """
+
+    output = argparse.ArgumentParser(add_help=False)
+    output.add_argument("--output-format", choices=("jsonl", "csv"), default="jsonl",
+                        help="format of the results written to the standard output")
+
+    criteria = argparse.ArgumentParser(add_help=False)
+    criteria.add_argument("--where", action="append", metavar="COLUMN=VALUE",
+                          help="search criterion, repeatable (tags=rock,pop  duration=180..240)")
+
+    records = argparse.ArgumentParser(add_help=False)
+    records.add_argument("--input", metavar="PATH", help="input file (JSON lines or CSV), - for the standard input")
+    records.add_argument("--input-format", choices=("jsonl", "csv"), help="format of the input file")
+
+    parser = argparse.ArgumentParser(prog="python cli.py", description="Manages the songs of SongStorage without the GUI.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("import", parents=[output, records], help="add song files")
+    command.add_argument("files", nargs="*", help="paths of the song files")
+    command.add_argument("--batch-size", type=int, default=500, help="songs added in a transaction")
+    command.add_argument("--workers", type=int, default=8, help="threads copying files")
+    command.set_defaults(handler=run_import)
+
+    command = commands.add_parser("search", parents=[output, criteria], help="search songs")
+    command.add_argument("--text", help="search artist, song name and tags by relevance")
+    command.add_argument("--limit", type=int, help="maximum number of songs")
+    command.set_defaults(handler=run_search)
+
+    command = commands.add_parser("export", parents=[output, criteria], help="create a save list")
+    command.add_argument("archive", help="path of the archive")
+    command.add_argument("--archive-format", help="zip, tar, tar.gz, tar.bz2, tar.xz or tar.zst")
+    command.add_argument("--compress-audio", action="store_true", help="compress the compressed audio too")
+    command.add_argument("--incremental", action="store_true", help="update an existing ZIP save list")
+    command.add_argument("--rendition", help="archive the renditions in this format, or smallest")
+    command.set_defaults(handler=run_export)
+
+    command = commands.add_parser("delete", parents=[output, records, criteria], help="delete songs")
+    command.add_argument("ids", nargs="*", help="IDs of the songs")
+    command.add_argument("--workers", type=int, default=8, help="threads deleting files")
+    command.set_defaults(handler=run_delete)
+
+    command = commands.add_parser("verify", parents=[output], help="check the storage against the database")
+    command.add_argument("--plan", default="repair_plan.jsonl", help="path of the repair plan (JSON lines)")
+    command.add_argument("--hash", action="store_true", help="hash the stored files to find corrupted ones")
+    command.add_argument("--workers", type=int, default=None, help="number of processes hashing files")
+    command.set_defaults(handler=run_verify)
+
+    command = commands.add_parser("stats", parents=[output], help="summarize the stored songs")
+    command.set_defaults(handler=run_stats)
+
+    command = commands.add_parser("batch", parents=[output], help="run the commands of an input file in parallel")
+    command.add_argument("--input", metavar="PATH", default="-", help="file of commands, - for the standard input")
+    command.add_argument("--workers", type=int, default=4, help="commands run at the same time")
+    command.set_defaults(handler=run_batch)
+
+    return parser
+
+
+def main(argv=None):
+    """
+    Runs a command of the command line, writing its results to the standard output and the messages of
+    the storage to the standard error, so the results can be piped to other programs.
+
+    Args:
+        argv (list): The arguments, by default those of the process.
+
+    Returns:
+        int: The exit status: 0 on success, 1 if the command failed, 2 if some of its records have errors.
+    """
+
+    arguments = build_parser().parse_args(argv)
+    writer = RecordWriter(sys.stdout, arguments.output_format)
+    status = 0
+
+    with contextlib.redirect_stdout(sys.stderr):
+        from SongStorage import SongStorage
+
+        storage = SongStorage()
+
+        try:
+            for record in arguments.handler(storage, arguments):
+                writer.write(record)
+
+                if record.get("error"):
+                    status = 2
+        except Exception as e:
+            print(f"Error while running {arguments.command}: {e}.")
+            return 1
+        finally:
+            storage.close_connection()
+
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
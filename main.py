@@ -1,74 +1,144 @@
+import importlib
 import tkinter as tk
-from tkinter import ttk, filedialog
-from PIL import Image, ImageTk
-from SongStorage import SongStorage
-from meth.open_add_song_window import open_add_song_window, button_style
-from meth.open_delete_song_window import open_delete_song_window
-from meth.open_create_save_list_window import open_create_save_list_window
-from meth.open_play_song_window import open_play_song_window
-from meth.open_modify_song_window import open_modify_song_window
-from meth.open_search_songs_windo import open_search_songs_window
-
-def main():
+from tkinter import messagebox
+from meth.song_table import VirtualSongTable
+from meth.background import BackgroundRunner
+
+button_style = {
+        "bg": "#2B4C93", # Background colour
+        "fg": "white", # Font colour
+        "activebackground": "#3D65D5", # Background colour cand butonul e apasat
+        "relief": "raised" # Stil margine
+    }
+
+
+def open_window(module, *args):
+    """
+    Opens a window of the meth package, importing its module the first time it is used (the play window loads
+    PIL and pygame, which would otherwise slow down the start of the application).
+
+    Args:
+        module (str): Name of the module, also the name of the function opening the window.
+        *args: Arguments of the function.
+    """
+
+    function = module.replace("_windo", "_window")  # open_search_songs_windo
+    getattr(importlib.import_module(f"meth.{module}"), function)(*args)
+
+
+def open_storage():
+    """
+    Creates the storage and its cache, on a worker thread, so psycopg2 is loaded and the database is contacted
+    after the main window is drawn.
+
+    Returns:
+        tuple: The SongStorage and the change feed followed by its cache.
+    """
+
+    from SongStorage import SongStorage
+    from SongCache import SongCache
+
+    cache = SongCache()
+    storage = SongStorage(cache = cache)
+    feed = storage.change_feed()
+    cache.listen(feed) # Cache-ul ramane corect si cand alte procese modifica melodiile
+
+    return storage, feed
+
+
+def main(on_paint=None, on_ready=None):
     """
     This function initialize the SongStorage system, creates the main application window using Tkinter where all
     the data from database will be displayed in a table and set up the buttons for various operations (add, delete,
     modify, search, play, create save list).
 
+    The window is drawn first; the storage is opened and the first songs are read in the background, the buttons
+    being enabled once the storage is ready.
+
     Args:
-        None
+        on_paint (callable): Called with the main window once it is drawn (used by StartupBenchmark).
+        on_ready (callable): Called with the main window once the first songs are shown.
 
     Returns:
         None
     """
 
-    storage = SongStorage()
-
     root = tk.Tk()
     root.title("Song Storage")
     root.geometry("1200x600")
 
+    # Operatiile lente ruleaza in fundal, rezultatele revin prin root.after
+    runner = BackgroundRunner(root)
+    storage = None
+
     button_frame = tk.Frame(root)
     button_frame.pack(pady = 20) # Adauga un spatiu vertical intre frame si restul ferestrei
 
-    save_button = tk.Button(button_frame, text="Add Song", command = lambda: open_add_song_window(storage, tree), **button_style)
-    save_button.pack(side = tk.LEFT, padx = 20) # Spatiu intre butoane
+    buttons = [
+        ("Add Song", lambda: open_window("open_add_song_window", storage, table, runner)),
+        ("Delete Song", lambda: open_window("open_delete_song_window", storage, table, runner)),
+        ("Modify Song", lambda: open_window("open_modify_song_window", storage, table, runner)),
+        ("Search Songs", lambda: open_window("open_search_songs_windo", storage, runner)),
+        ("Create Save List", lambda: open_window("open_create_save_list_window", storage, runner)),
+        ("Play Song", lambda: open_window("open_play_song_window", storage, runner, table)),
+    ]
+
+    for text, command in buttons:
+        # Butoanele sunt active doar dupa ce baza de date raspunde
+        button = tk.Button(button_frame, text = text, command = command, state = tk.DISABLED, **button_style)
+        button.pack(side = tk.LEFT, padx = 20) # Spatiu intre butoane
+
+    # Doar randurile vizibile sunt citite din baza de date
+    table = VirtualSongTable(root, None, runner)
+    table.pack(fill = tk.BOTH, expand = True)
+
+    def storage_opened(result):
+        """
+        Shows the songs and enables the buttons, once the storage is open.
 
-    delete_button = tk.Button(button_frame, text="Delete Song", command=lambda: open_delete_song_window(storage, tree), **button_style)
-    delete_button.pack(side = tk.LEFT, padx = 20)
+        Args:
+            result (tuple): The storage and the change feed.
+        """
 
-    modify_button = tk.Button(button_frame, text="Modify Song", command=lambda: open_modify_song_window(storage, tree), **button_style)
-    modify_button.pack(side = tk.LEFT, padx = 20)
+        nonlocal storage
+        storage, feed = result
 
-    search_button = tk.Button(button_frame, text="Search Songs", command=lambda: open_search_songs_window(storage), **button_style)
-    search_button.pack(side=tk.LEFT, padx=20)
+        table.storage = storage
+        table.load(on_done = songs_shown)
+        table.follow_changes(feed, runner) # Tabelul vede si modificarile facute de alte procese
 
-    create_save_list_button = tk.Button(button_frame, text="Create Save List",command=lambda: open_create_save_list_window(storage),
-                              **button_style)
-    create_save_list_button.pack(side=tk.LEFT, padx=20)
+    def songs_shown():
+        """
+        Enables the buttons once the first songs are shown.
+        """
 
-    play_button = tk.Button(button_frame, text="Play Song", command=lambda: open_play_song_window(storage), **button_style)
-    play_button.pack(side = tk.LEFT, padx = 20)
+        for button in button_frame.winfo_children():
+            button.config(state = tk.NORMAL)
 
-    columns = ("id", "file_name", "artist", "song_name", "release_date", "tags")
-    tree = ttk.Treeview(root, columns=columns, show='headings')
+        if on_ready is not None:
+            on_ready(root)
 
-    tree.heading("id", text = "ID")
-    tree.heading("file_name", text = "File Name")
-    tree.heading("artist", text = "Artist")
-    tree.heading("song_name", text = "Song Name")
-    tree.heading("release_date", text = "Release Date")
-    tree.heading("tags", text = "Tags")
+    def storage_failed(e):
+        """
+        Shows why the storage couldn't be opened.
 
-    tree.column("id", width = 20)
-    tree.column("release_date", width = 50)
+        Args:
+            e (Exception): The error.
+        """
 
-    songs = storage.get_all_songs()
-    for song in songs:
-        tree.insert("", tk.END, values = song)
+        print(f"Error while opening the storage: {e}.")
+        messagebox.showerror("Error", f"Error while opening the storage: {e}.")
+
+    runner.submit(open_storage, on_done = storage_opened, on_error = storage_failed)
+
+    if on_paint is not None:
+        root.after_idle(on_paint, root)
 
-    tree.pack(fill = tk.BOTH, expand = True)
     root.mainloop()
+    runner.shutdown()
+
+    if storage is not None:
+        storage.close_connection()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,271 @@
+import queue
+import threading
+import time
+import tkinter as tk
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+from tkinter import ttk
+
+
+class Task:
+    """
+    A function running on a thread of a BackgroundRunner.
+    """
+
+    def __init__(self, runner, on_progress=None):
+        """
+        Initialize the task.
+
+        Args:
+            runner (BackgroundRunner): The runner executing the task.
+            on_progress (callable): Called on the Tk thread with the values reported by progress.
+        """
+
+        self.cancel_event = threading.Event()
+        self.future = None
+
+        self._runner = runner
+        self._on_progress = on_progress
+
+
+    def progress(self, *values):
+        """
+        Reports the progress of the task, from its thread. The values are passed to on_progress on the Tk thread.
+
+        Args:
+            *values: The progress, e.g. the number of items done and their total.
+        """
+
+        if self._on_progress is not None:
+            self._runner.dispatch(self._on_progress, *values)
+
+
+    def cancel(self):
+        """
+        Asks the task to stop. A task that didn't start yet doesn't run its function (its on_error receives
+        a CancelledError), a running one stops at its next check of cancel_event.
+        """
+
+        self.cancel_event.set()
+
+
+    def cancelled(self):
+        """
+        Checks if the task was asked to stop.
+
+        Returns:
+            bool: True if cancel was called.
+        """
+
+        return self.cancel_event.is_set()
+
+
+class BackgroundRunner:
+    """
+    Runs the slow operations (database queries, file copies, archives) on a pool of threads, so the
+    window stays responsive. The results, errors and progress reports are put in a queue that the Tk
+    thread empties periodically with root.after, so the callbacks can safely update the widgets.
+    """
+
+    def __init__(self, root, max_workers=4, poll_interval=50, poll_budget=0.02):
+        """
+        Initialize the runner and start polling the result queue.
+
+        Args:
+            root (tk.Tk): The main window.
+            max_workers (int): Number of threads running tasks.
+            poll_interval (int): Milliseconds between two checks of the result queue.
+            poll_budget (float): Maximum seconds spent running callbacks in a check, so a flood of
+                progress reports doesn't freeze the window.
+        """
+
+        self.root = root
+        self.poll_interval = poll_interval
+        self.poll_budget = poll_budget
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="songstorage")
+        self._queue = queue.SimpleQueue()
+
+        self.root.after(self.poll_interval, self._poll)
+
+
+    def submit(self, function, *args, on_done=None, on_error=None, on_progress=None, cancellable=False, **kwargs):
+        """
+        Runs a function in the background.
+
+        Args:
+            function (callable): The function to run.
+            *args: Positional arguments of the function.
+            on_done (callable): Called on the Tk thread with the result of the function.
+            on_error (callable): Called on the Tk thread with the exception raised by the function.
+                By default the error is printed.
+            on_progress (callable): Called on the Tk thread with the progress reports. If provided, the function
+                receives a progress keyword argument to report them.
+            cancellable (bool): Whether the function receives a cancel_event keyword argument (a threading.Event)
+                telling it to stop.
+            **kwargs: Keyword arguments of the function.
+
+        Returns:
+            Task: The task running the function.
+        """
+
+        task = Task(self, on_progress)
+
+        if on_progress is not None:
+            kwargs["progress"] = task.progress
+
+        if cancellable:
+            kwargs["cancel_event"] = task.cancel_event
+
+        def run():
+            """
+            Runs the function on the worker thread and queues its outcome.
+            """
+
+            try:
+                # Anulat inainte sa porneasca: callback-urile tot sunt apelate, ca fereastra sa se actualizeze
+                if task.cancel_event.is_set():
+                    raise CancelledError("The task was cancelled before it started.")
+
+                result = function(*args, **kwargs)
+            except Exception as e:
+                self.dispatch(on_error or self._print_error, e)
+                return
+
+            if on_done is not None:
+                self.dispatch(on_done, result)
+
+        task.future = self._executor.submit(run)
+        return task
+
+
+    def dispatch(self, callback, *args):
+        """
+        Schedules a call on the Tk thread. Safe to call from any thread.
+
+        Args:
+            callback (callable): The function to call.
+            *args: Its arguments.
+        """
+
+        self._queue.put((callback, args))
+
+
+    def shutdown(self):
+        """
+        Stops the threads, dropping the tasks that didn't start yet.
+        """
+
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+    def _poll(self):
+        """
+        Runs the queued callbacks on the Tk thread, for at most poll_budget seconds, and schedules the next check.
+        """
+
+        deadline = time.monotonic() + self.poll_budget
+
+        while time.monotonic() < deadline:
+            try:
+                callback, args = self._queue.get_nowait()
+            except queue.Empty:
+                break
+
+            try:
+                callback(*args)
+            except Exception as e:
+                print(f"Error while handling a background task result: {e}.")
+
+        self.root.after(self.poll_interval, self._poll)
+
+
+    @staticmethod
+    def _print_error(error):
+        """
+        Default error callback.
+
+        Args:
+            error (Exception): The error raised by a task.
+        """
+
+        print(f"Error in a background task: {error}.")
+
+
+class ProgressPanel(tk.Frame):
+    """
+    A progress bar with a Cancel button, showing the progress of a Task.
+    """
+
+    def __init__(self, master):
+        """
+        Initialize the panel, hidden until a task is tracked.
+
+        Args:
+            master (tk.Widget): The parent widget.
+        """
+
+        super().__init__(master)
+
+        self.task = None
+
+        self.bar = ttk.Progressbar(self, length=300, mode="determinate")
+        self.bar.pack(side=tk.LEFT, padx=5)
+
+        self.label = tk.Label(self, text="")
+        self.label.pack(side=tk.LEFT, padx=5)
+
+        self.cancel_button = tk.Button(self, text="Cancel", command=self.cancel)
+        self.cancel_button.pack(side=tk.LEFT, padx=5)
+
+
+    def track(self, task):
+        """
+        Shows the panel for a task.
+
+        Args:
+            task (Task): The task, cancelled by the Cancel button.
+        """
+
+        self.task = task
+        self.bar.config(mode="determinate", value=0)
+        self.label.config(text="Working...")
+        self.cancel_button.config(state=tk.NORMAL)
+        self.pack(pady=5)
+
+
+    def update_progress(self, done, total=None):
+        """
+        Shows the progress of the task.
+
+        Args:
+            done (int): Number of items done.
+            total (int): Total number of items, None if unknown.
+        """
+
+        if total:
+            self.bar.config(mode="determinate", value=100 * done / total)
+            self.label.config(text=f"{done} / {total}")
+        else:
+            self.bar.config(mode="indeterminate")
+            self.bar.step(5)
+            self.label.config(text=f"{done}")
+
+
+    def cancel(self):
+        """
+        Cancels the tracked task.
+        """
+
+        if self.task is not None:
+            self.task.cancel()
+            self.label.config(text="Cancelling...")
+            self.cancel_button.config(state=tk.DISABLED)
+
+
+    def finish(self):
+        """
+        Hides the panel once the task is over.
+        """
+
+        self.task = None
+        self.pack_forget()
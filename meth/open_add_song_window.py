@@ -12,23 +12,25 @@ button_style = {
 song_label = None
 
 
-def open_add_song_window(storage, tree):
+def open_add_song_window(storage, table, runner):
     """
     Opens a window for adding a song, including its metadata and file.
 
     This function creates a GUI window where the user can input the artist, song_name, release_date, tags.
-    The user can also browse for an audio file to join the song. After entering the information, the user can save the song
-    and all the metadata will be displayed in the principal window(tree). Also, a success message is displayed in current window.
+    The user can also browse for an audio file to join the song; the empty fields are then filled from the tags of the file.
+    After entering the information, the user can save the song and all the metadata will be displayed in the principal
+    window(table). Also, a success message is displayed in current window.
 
     Args:
         storage (SongStorage): An instance of SongStorage class used to add the song.
-        tree (ttk.Treeview): The treeview widget representing main window.
+        table (VirtualSongTable): The song table of the main window.
+        runner (BackgroundRunner): Runs the storage operations without blocking the window.
 
     Returns:
         None
 
     Raises:
-        ValueError: If any required fields (artist, song name, release date, tags or file) are missing.
+        ValueError: If no file is selected.
         Exception: If there are errors adding the song to the storage folder or database or displaying it into the main window.
     """
 
@@ -79,6 +81,26 @@ def open_add_song_window(storage, tree):
             file_name = os.path.basename(file_path)
             file_label.config(text=f"Selected file: {file_name}")
 
+            # Tagurile sunt citite in fundal si completeaza campurile goale
+            runner.submit(storage.extractor.extract, file_path, on_done = fill_entries)
+
+    def fill_entries(extracted):
+        """
+        Fills the empty fields with the metadata read from the selected file.
+
+        Args:
+            extracted (dict): The metadata read from the file.
+        """
+
+        fields = [(artist_entry, extracted.get("artist")),
+                  (song_name_entry, extracted.get("song_name")),
+                  (release_date_entry, extracted.get("release_date")),
+                  (tags_entry, ", ".join(extracted.get("tags", [])))]
+
+        for entry, value in fields:
+            if value and not entry.get():
+                entry.insert(0, value)
+
     browse_button = tk.Button(add_song_window, text = "Browse File", command = browse_file, **button_style)
     browse_button.pack(pady = 10)
 
@@ -96,35 +118,16 @@ def open_add_song_window(storage, tree):
             None
 
         Raises:
-            ValueError: If any required fields (artist, song name, release date, tags or file) are missing.
+            ValueError: If no file is selected.
             Exception: If there are errors adding the song to the storage folder or database or displaying it into the main window.
         """
 
         global song_label
-        artist = artist_entry.get()
-        song_name = song_name_entry.get()
-        release_date = release_date_entry.get()
-        tags = tags_entry.get().split(",")
-
-        if not artist:
-            print("No artist!")
-            tk.messagebox.showerror("Error", "Please provide the artist.")
-            raise ValueError("No artist!")
-
-        if not song_name:
-            print("No song name!")
-            tk.messagebox.showerror("Error", "Please provide the song name.")
-            raise ValueError("No song name!")
-
-        if not release_date:
-            print("No release date!")
-            tk.messagebox.showerror("Error", "Please provide the release date.")
-            raise ValueError("No release date!")
-
-        if not tags:
-            print("No tags!")
-            tk.messagebox.showerror("Error", "Please provide the tags.")
-            raise ValueError("No tags!")
+        # Campurile goale sunt completate din tagurile fisierului
+        artist = artist_entry.get().strip() or None
+        song_name = song_name_entry.get().strip() or None
+        release_date = release_date_entry.get().strip() or None
+        tags = [tag.strip() for tag in tags_entry.get().split(",") if tag.strip()]
 
         if not file_path:
             print("No file selected!")
@@ -134,20 +137,51 @@ def open_add_song_window(storage, tree):
         if song_label:
             song_label.config(text="")
 
-        try:
-            song_id = storage.add_song(file_path, artist, song_name, release_date, tags)
-            print(f"Song added with ID: {song_id}.")
+        # Fisierul poate fi schimbat din fereastra pana se termina adaugarea
+        song_path = file_path
+
+        def add_and_fetch():
+            """
+            Adds the song and reads it back, with the metadata completed from the file.
 
-            song_id_label = tk.Label(add_song_window, text = f"Song added with ID: {song_id}.")
+            Returns:
+                tuple: The added song record.
+            """
+
+            return storage.get_song(storage.add_song(song_path, artist, song_name, release_date, tags))
+
+        def song_added(song):
+            """
+            Shows the added song, once the storage operation is done.
+
+            Args:
+                song (tuple): The added song record.
+            """
+
+            save_button.config(state = tk.NORMAL)
+            print(f"Song added with ID: {song[0]}.")
+
+            song_id_label = tk.Label(add_song_window, text = f"Song added with ID: {song[0]}.")
             song_id_label.pack()
 
             # Adaug in root window inregistrarea
-            song = (song_id, file_path.split("/")[-1], artist, song_name, release_date, tags)
-            tree.insert("", tk.END, values=song)
-        except Exception as e:
+            table.song_added(song)
+
+        def add_failed(e):
+            """
+            Shows the error of the storage operation.
+
+            Args:
+                e (Exception): The error.
+            """
+
+            save_button.config(state = tk.NORMAL)
             tk.messagebox.showerror("Error", f"Error adding song: {e}.")
             print(f"Error adding song: {e}.")
-            raise
+
+        # Copierea fisierului si INSERT-ul ruleaza in fundal, fereastra ramane activa
+        save_button.config(state = tk.DISABLED)
+        runner.submit(add_and_fetch, on_done = song_added, on_error = add_failed)
 
     save_button = tk.Button(add_song_window, text = "Save", command = save_song, **button_style)
     save_button.pack(pady = 15)
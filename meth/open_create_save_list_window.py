@@ -1,6 +1,8 @@
 import tkinter as tk
 from tkinter import filedialog
 import os
+from concurrent.futures import CancelledError
+from meth.background import ProgressPanel
 
 button_style = {
         "bg": "#2B4C93", # Background colour
@@ -12,7 +14,7 @@ button_style = {
 song_label = None
 
 
-def open_create_save_list_window(storage):
+def open_create_save_list_window(storage, runner):
     """
     Opens a window for creating a song archive based on various criteria.
 
@@ -22,6 +24,7 @@ def open_create_save_list_window(storage):
 
      Args:
         storage (SongStorage): An instance of SongStorage class used for creating the save list and handling the archive.
+        runner (BackgroundRunner): Runs the archive without blocking the window, showing its progress.
 
     Returns:
          None
@@ -71,25 +74,16 @@ def open_create_save_list_window(storage):
         """
 
         nonlocal arhive_path
-        arhive_path = filedialog.askopenfilename(title="Select a Arhive File",
+        arhive_path = filedialog.asksaveasfilename(title="Select a Arhive File",
                                                  filetypes=[
                                                      ("ZIP Archive", "*.zip"),
                                                      ("TAR Archive", "*.tar"),
-                                                     ("Gzipped TAR Archive", "*.tar.gz"),
-                                                     ("RAR Archive", "*.rar"),
-                                                     ("7z Archive", "*.7z"),
-                                                     ("Bzip2 Archive", "*.bz2"),
-                                                     ("XZ Archive", "*.xz"),
-                                                     ("CAB Archive", "*.cab"),
-                                                     ("ARJ Archive", "*.arj"),
-                                                     ("LZH Archive", "*.lzh"),
-                                                     ("Z Archive", "*.z"),
-                                                     ("ISO Image", "*.iso"),
-                                                     ("DMG Image", "*.dmg"),
-                                                     ("LZMA TAR Archive", "*.tar.lzma"),
-                                                     ("CPIO Archive", "*.cpio"),
+                                                     ("Gzipped TAR Archive", "*.tar.gz;*.tgz"),
+                                                     ("Bzip2 TAR Archive", "*.tar.bz2"),
+                                                     ("XZ TAR Archive", "*.tar.xz"),
+                                                     ("Zstandard TAR Archive", "*.tar.zst"),
                                                      ("All Archive Files",
-                                                      "*.zip;*.tar;*.tar.gz;*.tar.bz2;*.tar.xz;*.rar;*.7z;*.bz2;*.xz;*.cab;*.arj;*.lzh;*.z;*.iso;*.dmg;*.tar.lzma;*.cpio")
+                                                      "*.zip;*.tar;*.tar.gz;*.tgz;*.tar.bz2;*.tar.xz;*.tar.zst")
                                                  ])
         if arhive_path:
             file_name = os.path.basename(arhive_path)
@@ -128,7 +122,6 @@ def open_create_save_list_window(storage):
             raise ValueError("No file selected!")
 
         try:
-            global song_label
             data = {}
 
             if artist:
@@ -147,25 +140,59 @@ def open_create_save_list_window(storage):
             if format:
                 data["format"] = format
 
-            songs = storage.create_save_list(arhive_path, **data)
+            def save_list_created(songs):
+                """
+                Shows the files added to the archive, once it is written.
 
-            if song_label:
-                song_label.config(text = "")
+                Args:
+                    songs (list): The names of the files added to the archive.
+                """
 
-            if songs:
-                song_names = "\n".join(songs)
-                print(f"Songs added info arhive: {song_names}.")
+                global song_label
+                progress_panel.finish()
+                create_save_list_button.config(state = tk.NORMAL)
 
-                song_label = tk.Label(create_save_list_window, text = "")
-                song_label.config(text = f"Songs added info arhive:\n" + song_names)
-                song_label.pack()
-            else:
-                print("No songs were added.")
+                if song_label:
+                    song_label.config(text = "")
 
-                song_label = tk.Label(create_save_list_window, text = "No songs were added.")
-                song_label.pack()
+                if songs:
+                    song_names = "\n".join(songs)
+                    print(f"Songs added info arhive: {song_names}.")
 
-                raise ValueError("No songs were added.")
+                    song_label = tk.Label(create_save_list_window, text = "")
+                    song_label.config(text = f"Songs added info arhive:\n" + song_names)
+                    song_label.pack()
+                else:
+                    print("No songs were added.")
+
+                    song_label = tk.Label(create_save_list_window, text = "No songs were added.")
+                    song_label.pack()
+
+                    tk.messagebox.showerror("Error", "Error during creating arhive: No songs were added.")
+
+            def save_list_failed(e):
+                """
+                Shows the error of the archive.
+
+                Args:
+                    e (Exception): The error.
+                """
+
+                progress_panel.finish()
+                create_save_list_button.config(state = tk.NORMAL)
+
+                if isinstance(e, CancelledError):
+                    print("Creating the arhive was cancelled.")
+                    return
+
+                tk.messagebox.showerror("Error", f"Error during creating arhive: {e}.")
+                print(f"Error during creating arhive: {e}.")
+
+            create_save_list_button.config(state = tk.DISABLED)
+            task = runner.submit(storage.create_save_list, arhive_path, on_done = save_list_created,
+                                 on_error = save_list_failed, on_progress = progress_panel.update_progress,
+                                 cancellable = True, **data)
+            progress_panel.track(task)
 
         except Exception as e:
             tk.messagebox.showerror("Error", f"Error during creating arhive: {e}.")
@@ -174,4 +201,6 @@ def open_create_save_list_window(storage):
     create_save_list_button = tk.Button(create_save_list_window, text = "Create Save List", command = create_save_list, **button_style)
     create_save_list_button.pack(pady = 15)
 
+    progress_panel = ProgressPanel(create_save_list_window)
+
     create_save_list_window.mainloop()
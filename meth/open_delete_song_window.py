@@ -11,16 +11,48 @@ button_style = {
 song_label = None
 
 
-def open_delete_song_window(storage, tree):
+def parse_ids(text):
     """
-    Open a window that allows the user to delete a song from storage folder and database.
+    Parses the song IDs typed by the user, separated by commas, with ranges written as "10-20".
 
-    This function creates a GUI window where the user can input the song ID to delete. After the song is deleted,
-    the entry corresponding the ID is also removed from main window and a success message is displayed in current window.
+    Args:
+        text (str): The typed IDs, e.g. "1, 4, 10-20".
+
+    Returns:
+        list: The IDs, in the typed order.
+
+    Raises:
+        ValueError: If an ID or a range isn't valid.
+    """
+
+    ids = []
+
+    for part in text.replace(" ", "").split(","):
+        if not part:
+            continue
+
+        if "-" in part:
+            first, last = (int(bound) for bound in part.split("-", 1))
+            if first > last:
+                raise ValueError(f"Invalid range: {part}")
+            ids.extend(range(first, last + 1))
+        else:
+            ids.append(int(part))
+
+    return ids
+
+
+def open_delete_song_window(storage, table, runner):
+    """
+    Open a window that allows the user to delete songs from storage folder and database.
+
+    This function creates a GUI window where the user can input the IDs of the songs to delete, separated by commas
+    and with ranges such as "10-20". After the songs are deleted, their entries are also removed from main window and a success message is displayed in current window.
 
     Args:
         storage (SongStorage): An instance of SongStorage class used to delete the song.
-        tree (ttk.Treeview): The treeview widget representing main window.
+        table (VirtualSongTable): The song table of the main window.
+        runner (BackgroundRunner): Runs the storage operations without blocking the window.
 
     Returns:
         None
@@ -34,14 +66,13 @@ def open_delete_song_window(storage, tree):
     delete_song_window.title("Delete Song")
     delete_song_window.geometry("600x600")
 
-    tk.Label(delete_song_window, text="ID:").pack()
+    tk.Label(delete_song_window, text="IDs (e.g. 1, 4, 10-20):").pack()
     id_entry = tk.Entry(delete_song_window)
     id_entry.pack(pady = 5)
 
     def delete_song():
         """
-        Searches for a song based on the ID provided by the user and attempts to delete it from database and
-        storage folder.
+        Deletes the songs with the IDs provided by the user from database and storage folder, all at once.
 
         Args:
             None
@@ -50,14 +81,19 @@ def open_delete_song_window(storage, tree):
             None
 
         Raises:
-            ValueError: If the song ID is missing.
+            ValueError: If the song IDs are missing or invalid.
             Exception: If there are errors in the deleting process or updating the main window.
         """
 
         global song_label
-        song_id = id_entry.get()
 
-        if not song_id:
+        try:
+            song_ids = parse_ids(id_entry.get())
+        except ValueError as e:
+            tk.messagebox.showerror("Error", f"Invalid song ids: {e}.")
+            raise
+
+        if not song_ids:
             print("No id!")
             tk.messagebox.showerror("Error", "Please provide the song id.")
             raise ValueError("No id!")
@@ -65,24 +101,48 @@ def open_delete_song_window(storage, tree):
         if song_label:
             song_label.config(text="")
 
-        try:
-            storage.delete_song(song_id)
-            print(f"Song deleted with ID: {song_id}.")
+        def songs_deleted(deleted):
+            """
+            Shows the deletion, once the storage operation is done.
+
+            Args:
+                deleted (list): IDs of the deleted songs.
+            """
+
+            global song_label
+            delete_buton.config(state = tk.NORMAL)
+
+            if len(deleted) == 1:
+                message = f"Song deleted with ID: {deleted[0]}."
+            else:
+                message = f"{len(deleted)} songs deleted."
 
-            song_label = tk.Label(delete_song_window, text = f"Song deleted with ID: {song_id}.")
+            missing = len(set(song_ids)) - len(deleted)
+            if missing:
+                message += f" {missing} IDs were not found."
+
+            print(message)
+
+            song_label = tk.Label(delete_song_window, text = message)
             song_label.pack()
 
-            # Elimin din root window inregistrarea
-            for item in tree.get_children():
-                tree_id = tree.item(item)["values"][0]
+            # Elimin din root window inregistrarile
+            table.songs_deleted(deleted)
+
+        def delete_failed(e):
+            """
+            Shows the error of the storage operation.
 
-                if str(tree_id) == str(song_id):
-                    tree.delete(item)
-                    break
-        except Exception as e:
+            Args:
+                e (Exception): The error.
+            """
+
+            delete_buton.config(state = tk.NORMAL)
             tk.messagebox.showerror("Error", f"Error deleting song: {e}.")
             print(f"Error deleting song: {e}.")
-            raise
+
+        delete_buton.config(state = tk.DISABLED)
+        runner.submit(storage.delete_songs, song_ids, on_done = songs_deleted, on_error = delete_failed)
 
     delete_buton = tk.Button(delete_song_window, text="Delete", command=delete_song, **button_style)
     delete_buton.pack(pady = 15)
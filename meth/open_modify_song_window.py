@@ -12,7 +12,7 @@ button_style = {
 song_label = None
 
 
-def open_modify_song_window(storage, tree):
+def open_modify_song_window(storage, table, runner):
     """
     Open a window to modify the metadata of an existing song in the database.
 
@@ -23,7 +23,8 @@ def open_modify_song_window(storage, tree):
 
     Args:
         storage (SongStorage): An instance of SongStorage class used to modify the song.
-        tree (ttk.Treeview): The treeview widget representing main window.
+        table (VirtualSongTable): The song table of the main window.
+        runner (BackgroundRunner): Runs the storage operations without blocking the window.
 
     Returns:
         None
@@ -109,27 +110,46 @@ def open_modify_song_window(storage, tree):
             if song_label:
                 song_label.config(text = "")
 
-            storage.modify_data(song_id, **updated_data)
-            print(f"Song modified with ID: {song_id}.")
-
-            song_label = tk.Label(modify_song_window, text = f"Song modified with ID: {song_id}.")
-            song_label.pack()
-
-            # Modific in root window inregistrarea
-            for item in tree.get_children():
-                tree_values = tree.item(item)["values"]
-
-                if str(tree_values[0]) == str(song_id):
-                    new_values = (
-                        song_id,
-                        tree_values[1],
-                        artist if artist else tree_values[2],
-                        song_name if song_name else tree_values[3],
-                        release_date if release_date else tree_values[4],
-                        " ".join(tags) if tags else tree_values[5],
-                    )
-                    tree.item(item, values = new_values)
-                    break
+            def modify_and_fetch():
+                """
+                Modifies the song on a worker thread and reads its new record.
+
+                Returns:
+                    tuple: The modified song record.
+                """
+
+                storage.modify_data(song_id, **updated_data)
+                return storage.get_song(song_id)
+
+            def song_modified(song):
+                """
+                Shows the modification, once the storage operation is done.
+
+                Args:
+                    song (tuple): The modified song record.
+                """
+
+                global song_label
+                print(f"Song modified with ID: {song_id}.")
+
+                song_label = tk.Label(modify_song_window, text = f"Song modified with ID: {song_id}.")
+                song_label.pack()
+
+                # Modific in root window inregistrarea, direct prin indexul dupa ID
+                table.song_modified(song if song else song_id)
+
+            def modify_failed(e):
+                """
+                Shows the error of the storage operation.
+
+                Args:
+                    e (Exception): The error.
+                """
+
+                tk.messagebox.showerror("Error", f"Error modifying song: {e}.")
+                print(f"Error modifying song: {e}.")
+
+            runner.submit(modify_and_fetch, on_done = song_modified, on_error = modify_failed)
         except Exception as e:
             tk.messagebox.showerror("Error", f"Error modifying song: {e}.")
             print(f"Error modifying song: {e}.")
@@ -1,5 +1,5 @@
 import tkinter as tk
-from tkinter import filedialog
+from PIL import Image, ImageTk
 import os
 
 button_style = {
@@ -12,62 +12,258 @@ button_style = {
 song_label = None
 
 
-def open_play_song_window(storage):
+def open_play_song_window(storage, runner, table):
     """
     Opens a window for playing, pausing and stopping a song.
 
-    This function creates a new GUI window with option for browsing and select an audio file,
-    button for playing, pausing and stopping the selected song.
+    This function creates a new GUI window where the user enters the ID of a song from the catalog (the song
+    selected in the main window by default), with buttons for playing, pausing and stopping it. The song is loaded
+    in the background and its waveform is drawn as a seek bar: clicking or dragging on it moves the playback.
+    The songs of a remote storage are streamed, starting before their download ends.
 
     Args:
         storage (SongStorage): An instance of SongStorage class used to control song playback.
+        runner (BackgroundRunner): Loads the song and computes its waveform without blocking the window.
+        table (VirtualSongTable): The song table of the main window, whose selected song is proposed.
 
     Returns:
         None
 
     Raises:
-        ValueError: If no song file is selected before attempting to play a song.
+        ValueError: If no song is loaded before attempting to play a song.
         Exception: If there are errors during the playback process.
     """
 
     play_song_window = tk.Toplevel()
     play_song_window.title("Play Song")
-    play_song_window.geometry("400x200")
+    play_song_window.geometry("400x300")
 
-    file_path = None
+    song_id = None
     is_playing = False
     is_paused = False
+    starting = False  # Pornirea ruleaza in fundal
+    play_request = 0  # Creste la fiecare pornire sau oprire, o pornire mai veche e oprita
+    seeking = False
+    seek_target = None  # Ultima pozitie ceruta in timpul unei cautari
+    duration = None
+    peaks = None
+
+    tk.Label(play_song_window, text="Song ID:").pack()
+    song_id_entry = tk.Entry(play_song_window)
+    song_id_entry.pack(pady = 5)
+
+    def select_song(event = None):
+        """
+        Loads the song whose ID was entered.
+
+        Args:
+            event (tk.Event): The Return key event, if the song was chosen with it.
 
-    def browse_file():
+        Returns:
+            None
         """
-        Opens a file dialog for browsing and selecting an audio file.
 
-        Updates the file path once is selected and display the file name in the current window.
+        nonlocal song_id, duration, peaks
+
+        try:
+            song_id = int(song_id_entry.get())
+        except ValueError:
+            tk.messagebox.showerror("Error", "Please provide a valid song ID.")
+            return
+
+        if is_playing or starting:
+            stop_song()
+
+        file_label.config(text = "Loading...")
+
+        # Melodia e decodata in fundal, pornirea si cautarea sunt apoi instantanee
+        duration = None
+        peaks = None
+        draw_waveform()
+        runner.submit(load_song, song_id, on_done = song_loaded, on_error = load_failed)
+
+    def load_song(id_song):
+        """
+        Gets a song, its duration and its waveform, on a background thread. The remote songs aren't decoded,
+        their duration comes from the catalog and they have no waveform.
 
         Args:
-            None
+            id_song (int): ID of the song.
 
         Returns:
-            None
+            tuple: The ID, the song record, its duration and its waveform peaks (None for a remote song).
+
+        Raises:
+            ValueError: If there is no song with this ID.
+        """
+
+        song = storage.get_song(id_song)
+
+        if not song:
+            raise ValueError(f"No song found with ID: {id_song}")
+
+        file_path = storage.song_file(id_song, download = False)
+
+        if file_path is None:
+            return id_song, song, (storage.get_audio_info(id_song) or {}).get("duration"), None
+
+        return id_song, song, storage.player.duration(file_path), storage.player.waveform(file_path)
+
+    def song_loaded(result):
+        """
+        Shows the loaded song and its waveform.
+
+        Args:
+            result (tuple): The ID, the song record, its duration and its waveform peaks.
+        """
+
+        nonlocal duration, peaks
+        id_song, song, song_duration, song_peaks = result
+
+        if id_song == song_id:  # Intre timp poate fi aleasa alta melodie
+            file_label.config(text = f"{song[2]} - {song[3]}")
+            duration, peaks = song_duration, song_peaks
+            draw_waveform()
+
+    def load_failed(e):
         """
+        Reports a song that can't be loaded.
 
-        nonlocal file_path
-        file_path = filedialog.askopenfilename(title="Select a Song File",
-                                               filetypes=[("Audio Files",
-                                                           "*.mp3;*.wav;*.flac;*.aac;*.ogg;*.m4a;*.wma;*.aiff;*.opus;*.amr;*.alac;*.mka;*.dts;"
-                                                           "*.eac3;*.midi;*.mid;*.flv;*.ape;*.vqf;*.tta;*.spx;*.raw;*.wv;*.snd;*.mpc;*.la;*.shn;"
-                                                           "*.aifc;*.ac3;*.cda;*.dff;*.dsf;*.xm;*.mod;*.s3m;*.it;*.mtm;*.m4b;*.pcaf;*.oga;*.aif;"
-                                                           "*.m3u;*.mpd;*.f4a;*.f4b;*.caf;*.w64")])
-        if file_path:
-            file_name = os.path.basename(file_path)
-            file_label.config(text=f"Selected file: {file_name}")
+        Args:
+            e (Exception): The error.
+        """
 
-    browse_button = tk.Button(play_song_window, text="Browse File", command=browse_file, **button_style)
-    browse_button.pack(pady = 5)
+        print(f"Error loading song: {e}.")
+        file_label.config(text = f"{e}")
+        seek_bar.delete("all")
+        seek_bar.create_text(int(seek_bar["width"]) // 2, int(seek_bar["height"]) // 2,
+                             text = "Can't load this song.", fill = "white")
 
-    file_label = tk.Label(play_song_window, text="No file selected.")
+    song_id_entry.bind("<Return>", select_song)
+
+    load_button = tk.Button(play_song_window, text="Load Song", command=select_song, **button_style)
+    load_button.pack(pady = 5)
+
+    file_label = tk.Label(play_song_window, text="No song selected.")
     file_label.pack(pady = 10)
 
+    seek_bar = tk.Canvas(play_song_window, width = 360, height = 60, bg = "#1B2A4A", highlightthickness = 0)
+    seek_bar.pack(pady = 5)
+
+    time_label = tk.Label(play_song_window, text="0:00 / 0:00")
+    time_label.pack()
+
+    def draw_waveform():
+        """
+        Draws the waveform of the selected song on the seek bar.
+        """
+
+        seek_bar.delete("all")
+
+        width = int(seek_bar["width"])
+        middle = int(seek_bar["height"]) // 2
+
+        if peaks:
+            # Un varf pe pixel, cel mai mare din segmentele care cad pe el
+            for x in range(width):
+                start = x * len(peaks) // width
+                end = max(start + 1, (x + 1) * len(peaks) // width)
+                height = max(peaks[start:end]) * (middle - 2)
+                seek_bar.create_line(x, middle - height, x, middle + height + 1, fill = "#3D65D5", tags = "wave")
+        elif duration:
+            # Melodie redata in flux, fara forma de unda
+            seek_bar.create_line(0, middle, width, middle, fill = "#3D65D5", width = 2, tags = "wave")
+
+        if duration:
+            seek_bar.create_line(0, 0, 0, 2 * middle, fill = "white", width = 2, tags = "cursor")
+
+    def format_time(seconds):
+        """
+        Formats a duration as minutes:seconds.
+
+        Args:
+            seconds (float): The duration.
+
+        Returns:
+            str: The formatted duration.
+        """
+
+        return f"{int(seconds) // 60}:{int(seconds) % 60:02d}"
+
+    def update_position():
+        """
+        Moves the cursor of the seek bar with the playback, and resets the buttons when the song ends.
+        """
+
+        if not play_song_window.winfo_exists():
+            return
+
+        if is_playing and not is_paused and not storage.player.is_playing():
+            stop_song()
+
+        if duration:
+            position = min(storage.player.position(), duration) if is_playing else 0.0
+            x = position / duration * int(seek_bar["width"])
+            seek_bar.coords("cursor", x, 0, x, int(seek_bar["height"]))
+            time_label.config(text = f"{format_time(position)} / {format_time(duration)}")
+
+        play_song_window.after(200, update_position)
+
+    def seek(event):
+        """
+        Moves the playback to the clicked position of the seek bar, starting the song if needed. The seeks run
+        in the background (a streamed song reads from the storage), one at a time: while dragging, only
+        the last position is sought next.
+
+        Args:
+            event (tk.Event): The click or drag event.
+        """
+
+        nonlocal seek_target
+
+        if not duration:
+            return
+
+        position = max(0, min(event.x, int(seek_bar["width"]))) / int(seek_bar["width"]) * duration
+
+        if not is_playing:
+            play_song(start = position)
+            return
+
+        seek_target = position
+
+        if not seeking:
+            start_seek()
+
+    def start_seek():
+        """
+        Seeks the last requested position, on a background thread.
+        """
+
+        nonlocal seeking, seek_target
+
+        seeking = True
+        position, seek_target = seek_target, None
+        runner.submit(storage.player.seek, position, on_done = seek_done, on_error = seek_done)
+
+    def seek_done(_):
+        """
+        Seeks the position requested meanwhile, if any.
+
+        Args:
+            _ (object): The result or the error of the seek.
+        """
+
+        nonlocal seeking
+
+        seeking = False
+
+        if seek_target is not None and is_playing:
+            start_seek()
+
+    seek_bar.bind("<Button-1>", seek)
+    seek_bar.bind("<B1-Motion>", seek)
+
     play_icon_path = os.path.join("icons", "play-button.png")
     pause_icon_path = os.path.join("icons", "pause-button.png")
     stop_icon_path = os.path.join("icons", "stop-button.png")
@@ -105,8 +301,9 @@ def open_play_song_window(storage):
             None
         """
 
-        nonlocal is_playing, is_paused
+        nonlocal is_playing, is_paused, play_request
 
+        play_request += 1
         storage.stop()
         play_button.config(image = stop_icon)
         is_playing = False
@@ -116,36 +313,42 @@ def open_play_song_window(storage):
 
     stop_button = tk.Button(button_frame, image = stop_icon, command=stop_song)
 
-    def play_song():
+    def play_song(start = 0.0):
         """
         Play, pause and resume the song.
 
-        If the song is not playing, it starts the playback, els it toggles between pause and resume.
+        If the song is not playing, it starts the playback in the background (the song is looked up, and a remote
+        one opened for streaming), els it toggles between pause and resume.
 
         Args:
-            None
+            start (float): Second from which a song that isn't playing starts.
 
         Returns:
             None
 
         Raises:
-            ValueError: If no song file is selected.
+            ValueError: If no song is selected.
             Exception: If an error occurs during the process.
         """
 
-        nonlocal is_playing, is_paused
+        nonlocal is_playing, is_paused, starting, play_request
 
-        if not file_path:
-            print("No file selected!")
-            tk.messagebox.showerror("Error", "No file selected.")
-            raise ValueError("No file selected!")
+        if song_id is None:
+            print("No song selected!")
+            tk.messagebox.showerror("Error", "No song selected.")
+            raise ValueError("No song selected!")
+
+        if starting:
+            return
 
         try:
             if not is_playing:
-                storage.play(file_path)
-                is_playing = True
-                play_button.config(image = pause_icon)
-                stop_button.pack(side=tk.LEFT, padx = 5)
+                starting = True
+                play_request += 1
+                request = play_request
+                play_button.config(state = tk.DISABLED)
+                runner.submit(storage.play_song, song_id, start, on_done = lambda _: song_started(request),
+                              on_error = lambda e: start_failed(request, e))
             elif is_paused:
                 storage.resume()
                 is_paused = False
@@ -159,9 +362,64 @@ def open_play_song_window(storage):
             print(f"Error playing song: {e}.")
             raise
 
+    def song_started(request):
+        """
+        Shows the started song, or stops it if it was stopped (or another song chosen) while starting.
+
+        Args:
+            request (int): The play request of the start.
+        """
+
+        nonlocal is_playing, starting
+
+        if request != play_request:
+            storage.stop()
+
+        if not play_song_window.winfo_exists():
+            return
+
+        starting = False
+        play_button.config(state = tk.NORMAL)
+
+        if request != play_request:
+            return
+
+        is_playing = True
+        play_button.config(image = pause_icon)
+        stop_button.pack(side=tk.LEFT, padx = 5)
+
+    def start_failed(request, e):
+        """
+        Reports a song that couldn't be started.
+
+        Args:
+            request (int): The play request of the start.
+            e (Exception): The error.
+        """
+
+        nonlocal starting
+
+        print(f"Error playing song: {e}.")
+
+        if not play_song_window.winfo_exists():
+            return
+
+        starting = False
+        play_button.config(state = tk.NORMAL)
+
+        if request == play_request:
+            tk.messagebox.showerror("Error", f"Error playing song: {e}.")
+
     play_button = tk.Button(button_frame, image = play_icon, command=play_song)
     play_button.pack(side=tk.LEFT, padx = 5)
 
+    update_position()
+
+    # Melodia selectata in fereastra principala
+    if table.selected_id is not None:
+        song_id_entry.insert(0, str(table.selected_id))
+        select_song()
+
     def on_close():
         """
         Stops the song playback when the window is closed.
@@ -173,6 +431,9 @@ def open_play_song_window(storage):
             None
         """
 
+        nonlocal play_request
+
+        play_request += 1 # O pornire inca in desfasurare e oprita cand se termina
         storage.stop()
         play_song_window.destroy()
 
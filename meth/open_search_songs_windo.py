@@ -1,5 +1,7 @@
 import tkinter as tk
 from tkinter import ttk
+from concurrent.futures import CancelledError
+from meth.background import ProgressPanel
 
 button_style = {
         "bg": "#2B4C93", # Background colour
@@ -11,16 +13,19 @@ button_style = {
 song_label = None
 
 
-def open_search_songs_window(storage):
+def open_search_songs_window(storage, runner):
     """
     Opens a window for searching song based on various criteria.
 
     This function opens a GUI window where the user can input the criteria for searching, such as artist, song name, release date,
     tags, format. After submitting the results will appear in a table in the current window. If no input is provided all datas from
-    database will represent the result.
+    database will represent the result. A free text can be provided instead, the results being then ordered by relevance.
+    The results can be played one after another, from the selected one, the playing song being highlighted.
 
      Args:
         storage (SongStorage): An instance of SongStorage class used to search songs.
+        runner (BackgroundRunner): Runs the search without blocking the window, the results being shown as they arrive.
+            Also passes the playback events to the window.
 
     Returns:
          None
@@ -33,6 +38,10 @@ def open_search_songs_window(storage):
     search_songs_window.title("Search Songs")
     search_songs_window.geometry("1200x600")
 
+    tk.Label(search_songs_window, text="Text (artist, song name or tags):").pack()
+    text_entry = tk.Entry(search_songs_window)
+    text_entry.pack(pady = 5)
+
     tk.Label(search_songs_window, text="Artist:").pack()
     artist_entry = tk.Entry(search_songs_window)
     artist_entry.pack(pady = 5)
@@ -54,6 +63,7 @@ def open_search_songs_window(storage):
     format_entry.pack(pady=5)
 
     tree_search = None
+    search_task = None
 
     def search_songs():
         """
@@ -69,8 +79,9 @@ def open_search_songs_window(storage):
             Exception: If there are errors during the search process.
         """
 
-        nonlocal tree_search
+        nonlocal tree_search, search_task
 
+        text = text_entry.get()
         artist = artist_entry.get()
         song_name = song_name_entry.get()
         release_date = release_date_entry.get()
@@ -96,7 +107,97 @@ def open_search_songs_window(storage):
             if format:
                 data["format"] = format
 
-            results = storage.search(**data)
+            def run_search(progress, cancel_event):
+                """
+                Runs the search on a worker thread, reporting the results in chunks.
+
+                Args:
+                    progress (callable): Receives each chunk of songs.
+                    cancel_event (threading.Event): Stops the search when set.
+
+                Returns:
+                    int: The number of songs found.
+                """
+
+                if text:
+                    results = storage.search_ranked(text, limit = 500)
+                else:
+                    results = storage.iter_search(**data)
+
+                count = 0
+                chunk = []
+
+                for song in results:
+                    if cancel_event.is_set():
+                        raise CancelledError("The search was cancelled.")
+
+                    chunk.append(song)
+                    count += 1
+
+                    # Randurile ajung in fereastra in bucati, nu cate unul
+                    if len(chunk) == 500:
+                        progress(chunk, count)
+                        chunk = []
+
+                if chunk:
+                    progress(chunk, count)
+
+                return count
+
+            def show_songs(songs, count):
+                """
+                Adds a chunk of results to the table.
+
+                Args:
+                    songs (list): The songs found.
+                    count (int): The number of songs found so far.
+                """
+
+                # Rezultate intarziate ale unei cautari inlocuite
+                if results_tree is not tree_search:
+                    return
+
+                for song in songs:
+                    results_tree.insert("", tk.END, values=song)
+
+                progress_panel.update_progress(count)
+
+            def search_done(count):
+                """
+                Ends the search.
+
+                Args:
+                    count (int): The number of songs found.
+                """
+
+                if results_tree is not tree_search:
+                    return
+
+                progress_panel.finish()
+                print(f"Search results: {count} songs.")
+
+            def search_failed(e):
+                """
+                Shows the error of the search.
+
+                Args:
+                    e (Exception): The error.
+                """
+
+                if results_tree is not tree_search:
+                    return
+
+                progress_panel.finish()
+
+                if isinstance(e, CancelledError):
+                    print("Search cancelled.")
+                    return
+
+                tk.messagebox.showerror("Error", f"Error searching songs: {e}.")
+                print(f"Error searching songs: {e}.")
+
+            if search_task:
+                search_task.cancel()
 
             if tree_search:
                 tree_search.destroy()
@@ -114,11 +215,12 @@ def open_search_songs_window(storage):
             tree_search.column("id", width=20)
             tree_search.column("release_date", width=50)
 
-            for song in results:
-                tree_search.insert("", tk.END, values=song)
-
             tree_search.pack(fill=tk.BOTH, expand=True)
-            print(f"Search results: {results}.")
+            results_tree = tree_search
+
+            search_task = runner.submit(run_search, on_progress = show_songs, cancellable = True,
+                                        on_done = search_done, on_error = search_failed)
+            progress_panel.track(search_task)
 
         except Exception as e:
             tk.messagebox.showerror("Error", f"Error searching songs: {e}.")
@@ -128,4 +230,83 @@ def open_search_songs_window(storage):
     search_button = tk.Button(search_songs_window, text = "Search", command = search_songs, **button_style)
     search_button.pack(pady = 15)
 
+    queue = storage.playback_queue()
+    playing_tree = None
+
+    def play_results():
+        """
+        Plays the songs found, from the selected one (or the first one), one after another.
+        """
+
+        nonlocal playing_tree
+
+        if not tree_search or not tree_search.get_children():
+            tk.messagebox.showerror("Error", "No songs to play.")
+            return
+
+        rows = tree_search.get_children()
+        selected = tree_search.selection()
+        start = rows.index(selected[0]) if selected else 0
+        song_ids = [int(tree_search.item(row, "values")[0]) for row in rows]
+
+        playing_tree = tree_search
+        now_playing_label.config(text = "Loading...")
+        # Prima melodie e decodata in fundal
+        runner.submit(storage.play_songs, song_ids, start,
+                      on_error = lambda e: now_playing_label.config(text = f"Error playing songs: {e}."))
+
+    def show_playback(event):
+        """
+        Highlights the playing song, on the Tk thread.
+
+        Args:
+            event (dict): The playback event.
+        """
+
+        if not search_songs_window.winfo_exists():
+            return
+
+        if event["event"] == "track_changed":
+            now_playing_label.config(text = f"Now playing: song {event['item']}")
+
+            # Randul e marcat doar daca rezultatele nu au fost inlocuite intre timp
+            if playing_tree is tree_search and event["index"] < len(tree_search.get_children()):
+                row = tree_search.get_children()[event["index"]]
+                tree_search.selection_set(row)
+                tree_search.see(row)
+
+                _, _, artist, song_name, *_ = tree_search.item(row, "values")
+                now_playing_label.config(text = f"Now playing: {artist} - {song_name}")
+        elif event["event"] == "queue_ended":
+            now_playing_label.config(text = "")
+        elif event["event"] == "error":
+            print(f"Skipped song {event['item']}: {event['error']}.")
+
+    # Evenimentele vin pe firul cozii, fereastra le primeste pe firul Tk
+    playback_listener = queue.subscribe(lambda event: runner.dispatch(show_playback, event))
+
+    playback_frame = tk.Frame(search_songs_window)
+    playback_frame.pack(pady = 5)
+
+    tk.Button(playback_frame, text = "Play Results", command = play_results, **button_style).pack(side = tk.LEFT, padx = 5)
+    # Urmatoarea melodie poate fi inca cautata sau decodata, deci nu pe firul Tk
+    tk.Button(playback_frame, text = "Next", command = lambda: runner.submit(queue.next), **button_style).pack(side = tk.LEFT, padx = 5)
+    tk.Button(playback_frame, text = "Stop", command = queue.stop, **button_style).pack(side = tk.LEFT, padx = 5)
+
+    now_playing_label = tk.Label(search_songs_window, text = "")
+    now_playing_label.pack()
+
+    progress_panel = ProgressPanel(search_songs_window)
+
+    def on_close():
+        """
+        Stops the playback of the results when the window is closed.
+        """
+
+        queue.unsubscribe(playback_listener)
+        queue.stop()
+        search_songs_window.destroy()
+
+    search_songs_window.protocol("WM_DELETE_WINDOW", on_close)
+
     search_songs_window.mainloop()
\ No newline at end of file
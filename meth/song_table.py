@@ -0,0 +1,826 @@
+import threading
+import tkinter as tk
+from tkinter import ttk, font
+
+# (coloana, titlu, latime), in ordinea din SONG_COLUMNS
+COLUMNS = (
+    ("id", "ID", 20),
+    ("file_name", "File Name", None),
+    ("artist", "Artist", None),
+    ("song_name", "Song Name", None),
+    ("release_date", "Release Date", 50),
+    ("tags", "Tags", None),
+)
+
+SORTABLE_COLUMNS = ("id", "file_name", "artist", "song_name", "release_date")
+
+# Randul afisat pentru melodiile care se citesc inca din baza de date
+PLACEHOLDER = ("", "Loading...", "", "", "", "")
+
+
+class VirtualSongTable(tk.Frame):
+    """
+    A table of songs that only holds the rows around the visible ones.
+
+    The rows are fetched from the database a page at a time, by keyset when scrolling and by offset when
+    jumping with the scrollbar, and only the visible rows exist as Treeview items. The songs are sorted in
+    the database, by clicking on a column header. Opening the table costs the same for any number of songs.
+
+    The pages are read in the background, a single one at a time, while placeholder rows are shown; a page
+    read before the songs were sorted or reloaded is dropped.
+    """
+
+    def __init__(self, master, storage, runner, page_size=200, max_buffer=1000):
+        """
+        Initialize the table.
+
+        Args:
+            master (tk.Widget): The parent widget.
+            storage (SongStorage): Storage the songs are read from. It can be set later, the table staying
+                empty until then.
+            runner (BackgroundRunner): Reads the pages of songs without blocking the window.
+            page_size (int): Number of songs fetched at a time.
+            max_buffer (int): Maximum number of songs kept in memory.
+        """
+
+        super().__init__(master)
+
+        self.storage = storage
+        self.page_size = page_size
+        self.max_buffer = max_buffer
+
+        self.order_by = "id"
+        self.descending = False
+        self.total = 0
+        self.top = 0
+        self.visible_rows = 1
+        self.selected_id = None
+
+        self._buffer = []
+        self._buffer_start = 0
+        self._end_reached = False  # Ultimul rand din memorie e ultima melodie
+        self._generation = 0  # Creste cand randurile din memorie nu mai sunt valabile
+        self._in_flight = None  # Generatia paginii care se citeste
+        self._items = []
+        self._index = {}  # ID -> pozitia melodiei in buffer
+        self._item_by_id = {}  # ID -> randul Treeview care o afiseaza
+
+        self.live = False
+        self._runner = runner
+        self._changes_lock = threading.Lock()
+        self._pending_changes = {}  # ID -> operatia, comasate intre doua actualizari
+        self._resync = False
+        self._flush_scheduled = False
+        self._fetching_changes = False
+
+        self.tree = ttk.Treeview(self, columns=[column for column, _, _ in COLUMNS], show="headings",
+                                 selectmode="browse")
+
+        for column, title, width in COLUMNS:
+            if column in SORTABLE_COLUMNS:
+                self.tree.heading(column, text=title, command=lambda column=column: self.sort_by(column))
+            else:
+                self.tree.heading(column, text=title)
+
+            if width:
+                self.tree.column(column, width=width)
+
+        self.scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self._on_scrollbar)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        self.tree.bind("<Configure>", self._on_resize)
+        self.tree.bind("<<TreeviewSelect>>", self._on_select)
+        self.tree.bind("<MouseWheel>", lambda event: self.scroll(-1 if event.delta > 0 else 1, "units", 3))
+        self.tree.bind("<Button-4>", lambda event: self.scroll(-1, "units", 3))
+        self.tree.bind("<Button-5>", lambda event: self.scroll(1, "units", 3))
+        self.tree.bind("<Prior>", lambda event: self.scroll(-1, "pages"))
+        self.tree.bind("<Next>", lambda event: self.scroll(1, "pages"))
+        self.tree.bind("<Home>", lambda event: self.scroll_to(0))
+        self.tree.bind("<End>", lambda event: self.scroll_to(self.total))
+        self.tree.bind("<Up>", lambda event: self._move_selection(-1))
+        self.tree.bind("<Down>", lambda event: self._move_selection(1))
+
+
+    def load(self, on_done=None):
+        """
+        (Re)loads the table from the first song. The songs are counted and the first page is read in
+        the background, so the window is drawn before the database answers.
+
+        Args:
+            on_done (callable): Called on the Tk thread once the first songs are shown.
+        """
+
+        self._generation += 1
+        self._in_flight = generation = self._generation
+        order_by, descending = self.order_by, self.descending
+
+        def read_first_page():
+            """
+            Counts the songs and fetches the first page, on a worker thread.
+
+            Returns:
+                tuple: The number of songs and the first page.
+            """
+
+            try:
+                total = self.storage.count_songs()
+            except Exception as e:
+                print(f"Error while counting the songs: {e}.")
+                raise
+
+            return total, self._fetch(order_by, descending)
+
+        def first_page_read(result):
+            """
+            Shows the first page, on the Tk thread.
+
+            Args:
+                result (tuple): The number of songs and the first page.
+            """
+
+            if generation != self._generation:
+                return
+
+            self._in_flight = None
+            self.total, self._buffer = result
+            self._buffer_start = 0
+            self._end_reached = len(self._buffer) < self.page_size
+            self.scroll_to(0)
+
+            if on_done is not None:
+                on_done()
+
+        self._runner.submit(read_first_page, on_done=first_page_read,
+                            on_error=lambda error: self._page_failed(generation, error))
+
+
+    def refresh(self):
+        """
+        Fetches again the visible songs, keeping the scroll position. The songs in memory stay on screen until
+        the new ones arrive.
+        """
+
+        if self.storage is None:
+            return
+
+        self._generation += 1
+        self._request_page(self._refresh_page())
+
+
+    def _refresh_page(self):
+        """
+        Gets the page read again by refresh: the songs after the one before the first visible song, or from
+        an offset if that song isn't in memory.
+
+        Returns:
+            dict: The page.
+        """
+
+        anchor = self._row(self.top - 1)
+
+        if anchor is not None:
+            return {"kind": "refresh", "after": self._key(anchor), "start": self.top}
+
+        return {"kind": "jump", "offset": max(0, self.top - self.page_size // 4)}
+
+
+    def sort_by(self, column):
+        """
+        Sorts the songs by a column, in ascending order, or reverses the order if they are already sorted by it.
+
+        Args:
+            column (str): The column, one of SORTABLE_COLUMNS.
+        """
+
+        self.descending = not self.descending if column == self.order_by else False
+        self.order_by = column
+
+        for name, title, _ in COLUMNS:
+            arrow = (" ▼" if self.descending else " ▲") if name == column else ""
+            self.tree.heading(name, text=title + arrow)
+
+        self._generation += 1
+        self._buffer = []
+        self._buffer_start = 0
+        self._end_reached = False
+        self.scroll_to(0)
+
+
+    def scroll(self, count, what="units", step=1):
+        """
+        Scrolls the table.
+
+        Args:
+            count (int): Number of units or pages, negative to scroll up.
+            what (str): "units" (rows) or "pages".
+            step (int): Number of rows of a unit.
+        """
+
+        self.scroll_to(self.top + count * (self.visible_rows if what == "pages" else step))
+        return "break"
+
+
+    def scroll_to(self, position):
+        """
+        Shows the songs starting from a position. The songs that aren't in memory are shown as placeholders
+        while their page is read in the background.
+
+        Args:
+            position (int): Position of the first visible song.
+        """
+
+        if self.storage is None:
+            return  # Tabelul ramane gol pana cand baza de date e disponibila
+
+        self.top = max(0, min(int(position), self.total - self.visible_rows))
+        page = self._missing_page(self.top)
+
+        if page is not None:
+            self._request_page(page)
+
+        self._reindex()
+        self._render()
+
+
+    def find(self, id_song):
+        """
+        Gets the Treeview item showing a song.
+
+        Args:
+            id_song (int): ID of the song.
+
+        Returns:
+            str: The item, or None if the song isn't visible.
+        """
+
+        return self._item_by_id.get(int(id_song))
+
+
+    def update_songs(self, added=(), modified=(), deleted=(), total=None, page=None):
+        """
+        Applies many changes at once. The songs in memory are found through the ID index and updated in place,
+        and the table is redrawn once. The songs are fetched again only if the changes can move them (an added
+        song, or a modified value of the sort column).
+
+        Args:
+            added (iterable): The added song records.
+            modified (iterable): The modified song records, or their IDs if the records aren't known.
+            deleted (iterable): IDs of the deleted songs.
+            total (int): The number of songs after the changes, if known. Otherwise it is updated by the
+                number of songs added and deleted.
+            page (tuple): The visible songs read again together with the changes, as (order, page, songs),
+                used instead of reading them again if the table didn't move meanwhile.
+        """
+
+        refetch = False
+        removed = set()
+
+        for id_song in deleted:
+            id_song = int(id_song)
+            self.total = max(0, self.total - 1)
+
+            if id_song == self.selected_id:
+                self.selected_id = None
+
+            if id_song in self._index:
+                removed.add(self._index[id_song])
+
+        if removed:
+            self._buffer = [song for position, song in enumerate(self._buffer) if position not in removed]
+            self._reindex()
+
+        sort_column = SORTABLE_COLUMNS.index(self.order_by)
+
+        for song in modified:
+            if not isinstance(song, tuple):
+                refetch = refetch or int(song) in self._index
+                continue
+
+            position = self._index.get(song[0])
+            if position is None:
+                continue
+
+            # Melodia isi schimba locul in ordinea curenta
+            if song[sort_column] != self._buffer[position][sort_column]:
+                refetch = True
+
+            self._buffer[position] = song
+
+        for _ in added:
+            self.total += 1
+            refetch = True
+
+        if total is not None:
+            self.total = total
+
+        if refetch:
+            self._replace_page(page)
+        else:
+            self.scroll_to(self.top)
+
+
+    def _replace_page(self, page):
+        """
+        Shows the visible songs read in the background with a batch of changes, or reads them again if the
+        table was sorted or scrolled since.
+
+        Args:
+            page (tuple): The order (sort column and direction) and the page the songs were read in, and
+                the songs; or None.
+        """
+
+        if page is None or page[0] != (self.order_by, self.descending) or page[1] != self._refresh_page():
+            self.refresh()
+            return
+
+        self._generation += 1
+        self._page_read(self._generation, page[1], page[2])
+
+
+    def follow_changes(self, feed, runner):
+        """
+        Keeps the table in sync with the changes made to the songs by any process, including the dialogs of this one.
+
+        The changes arriving between two checks of the runner queue are merged (an insert followed by a delete
+        cancels out, for example) and applied together: the changed songs and the number of songs are read with
+        a single background job, then the table is redrawn once.
+
+        Args:
+            feed (ChangeFeed): The feed of the changes.
+            runner (BackgroundRunner): Runs the queries and brings the changes to the Tk thread.
+        """
+
+        self.live = True
+        self._runner = runner
+        feed.subscribe(self._on_change)
+
+
+    def song_added(self, song):
+        """
+        Updates the table after a song was added.
+
+        Args:
+            song (tuple): The added song record.
+        """
+
+        # Cand tabelul urmareste modificarile, vin prin ChangeFeed, o singura data
+        if not self.live:
+            self.update_songs(added=[song])
+
+
+    def song_modified(self, song):
+        """
+        Updates the table after a song was modified.
+
+        Args:
+            song (tuple or int): The modified song record, or its ID if the record isn't known.
+        """
+
+        if not self.live:
+            self.update_songs(modified=[song])
+
+
+    def song_deleted(self, id_song):
+        """
+        Updates the table after a song was deleted.
+
+        Args:
+            id_song (int): ID of the deleted song.
+        """
+
+        self.songs_deleted([id_song])
+
+
+    def songs_deleted(self, ids):
+        """
+        Updates the table after many songs were deleted.
+
+        Args:
+            ids (list): IDs of the deleted songs.
+        """
+
+        if not self.live:
+            self.update_songs(deleted=ids)
+
+
+    def _on_change(self, change):
+        """
+        Records a change from the feed, on the listener thread, and schedules its application on the Tk thread.
+
+        Args:
+            change (dict): The change.
+        """
+
+        with self._changes_lock:
+            if change["op"] == "RESYNC":
+                self._resync = True
+            else:
+                previous = self._pending_changes.get(change["id"])
+
+                if previous == "INSERT" and change["op"] == "DELETE":
+                    del self._pending_changes[change["id"]]
+                elif previous != "INSERT":
+                    self._pending_changes[change["id"]] = change["op"]
+
+            if self._flush_scheduled:
+                return
+            self._flush_scheduled = True
+
+        self._runner.dispatch(self._flush_changes)
+
+
+    def _flush_changes(self):
+        """
+        Reads, in the background, the songs changed since the last flush and the number of songs.
+        A single read runs at a time, the changes arriving meanwhile waiting for the next one.
+        """
+
+        if self._fetching_changes:
+            return
+
+        with self._changes_lock:
+            changes, self._pending_changes = self._pending_changes, {}
+            resync, self._resync = self._resync, False
+            self._flush_scheduled = False
+
+        if not changes and not resync:
+            return
+
+        ids = [id_song for id_song, op in changes.items() if op != "DELETE"]
+        order = (self.order_by, self.descending)
+        page = self._refresh_page()
+        position = {"offset": page["offset"]} if page["kind"] == "jump" else {"after": page["after"]}
+
+        def read_changes():
+            """
+            Reads the changed songs, the number of songs and the visible songs, on a worker thread, so applying
+            the changes doesn't query the database from the Tk thread.
+
+            Returns:
+                tuple: The records of the changed songs that still exist, the number of songs and the visible
+                    page (order, page, songs).
+            """
+
+            songs = self.storage.get_songs(ids) if ids else []
+            total = self.storage.count_songs()
+
+            return songs, total, (order, page, self._fetch(*order, **position))
+
+        self._fetching_changes = True
+        self._runner.submit(read_changes, on_done=lambda result: self._apply_changes(changes, resync, *result),
+                            on_error=self._changes_failed)
+
+
+    def _apply_changes(self, changes, resync, songs, total, page):
+        """
+        Applies a batch of merged changes, on the Tk thread, then flushes the changes that arrived meanwhile.
+
+        Args:
+            changes (dict): The operation of every changed song ID.
+            resync (bool): Whether changes may have been missed, in which case the visible songs are fetched again.
+            songs (list): The records of the changed songs that still exist.
+            total (int): The number of songs.
+            page (tuple): The visible songs, read with the changes (see update_songs).
+        """
+
+        self._fetching_changes = False
+        songs = {song[0]: song for song in songs}
+
+        if resync:
+            self.total = total
+            self._replace_page(page)
+        else:
+            self.update_songs(
+                added=[songs[id_song] for id_song, op in changes.items() if op == "INSERT" and id_song in songs],
+                modified=[songs[id_song] for id_song, op in changes.items() if op == "UPDATE" and id_song in songs],
+                deleted=[id_song for id_song in changes if id_song not in songs],
+                total=total,
+                page=page
+            )
+
+        with self._changes_lock:
+            pending = bool(self._pending_changes) or self._resync
+
+        if pending:
+            self._flush_changes()
+
+
+    def _changes_failed(self, error):
+        """
+        Handles a failed read of the changes: the table is fetched again with the next change.
+
+        Args:
+            error (Exception): The error.
+        """
+
+        print(f"Error while loading the song changes: {error}.")
+        self._fetching_changes = False
+
+        with self._changes_lock:
+            self._resync = True
+            self._flush_scheduled = False
+
+
+    def _fetch(self, order_by, descending, **page):
+        """
+        Fetches a page of songs, on a worker thread.
+
+        Args:
+            order_by (str): The sort column.
+            descending (bool): The direction of the page.
+            **page: The after or offset of the page.
+
+        Returns:
+            list: The song records.
+        """
+
+        try:
+            return self.storage.fetch_songs_page(order_by, descending, limit=self.page_size, **page)
+        except Exception as e:
+            print(f"Error while loading songs: {e}.")
+            raise
+
+
+    def _key(self, song):
+        """
+        Gets the keyset of a song in the current order.
+
+        Args:
+            song (tuple): The song record.
+
+        Returns:
+            tuple: The value of the sort column and the ID.
+        """
+
+        return song[SORTABLE_COLUMNS.index(self.order_by)], song[0]
+
+
+    def _row(self, position):
+        """
+        Gets a song from memory.
+
+        Args:
+            position (int): Position of the song.
+
+        Returns:
+            tuple: The song record, or None if it isn't in memory.
+        """
+
+        index = position - self._buffer_start
+
+        if position < 0 or not 0 <= index < len(self._buffer):
+            return None
+
+        return self._buffer[index]
+
+
+    def _reindex(self):
+        """
+        Rebuilds the index of the songs in memory by ID, after the buffer changed.
+        """
+
+        self._index = {song[0]: position for position, song in enumerate(self._buffer)}
+
+
+    def _missing_page(self, top):
+        """
+        Finds the page to read so the songs visible from a position are in memory.
+
+        Args:
+            top (int): Position of the first visible song.
+
+        Returns:
+            dict: The page ("kind" being "next", "previous" or "jump", with its keyset or offset), or None if
+                the songs are in memory.
+        """
+
+        end = top + self.visible_rows
+        buffer_end = self._buffer_start + len(self._buffer)
+
+        if self._end_reached:
+            end = min(end, buffer_end)
+
+        if self._buffer_start <= top and end <= buffer_end:
+            return None
+
+        if self._buffer and self._buffer_start <= top < buffer_end + self.page_size:
+            # Pagina urmatoare, dupa ultimul rand din memorie
+            return {"kind": "next", "after": self._key(self._buffer[-1])}
+
+        if self._buffer and self._buffer_start - self.page_size <= top < self._buffer_start:
+            # Pagina anterioara: aceeasi interogare, in sens invers, dupa primul rand din memorie
+            return {"kind": "previous", "after": self._key(self._buffer[0])}
+
+        # Salt departe de randurile din memorie
+        return {"kind": "jump", "offset": max(0, top - self.page_size // 4)}
+
+
+    def _request_page(self, page):
+        """
+        Reads a page in the background, unless a page of the current generation is already being read
+        (the missing songs are looked for again when it arrives).
+
+        Args:
+            page (dict): The page, from _missing_page or refresh.
+        """
+
+        if self._in_flight == self._generation:
+            return
+
+        self._in_flight = generation = self._generation
+        descending = not self.descending if page["kind"] == "previous" else self.descending
+        position = {"offset": page["offset"]} if page["kind"] == "jump" else {"after": page["after"]}
+
+        self._runner.submit(self._fetch, self.order_by, descending, **position,
+                            on_done=lambda songs: self._page_read(generation, page, songs),
+                            on_error=lambda error: self._page_failed(generation, error))
+
+
+    def _page_read(self, generation, page, songs):
+        """
+        Adds a page to the songs in memory, on the Tk thread, then shows the songs and reads the next missing
+        page. A page of an older generation, or read after rows that aren't at the edge of the memory anymore,
+        is dropped.
+
+        Args:
+            generation (int): The generation the page was requested in.
+            page (dict): The page.
+            songs (list): The song records.
+        """
+
+        if self._in_flight == generation:
+            self._in_flight = None
+
+        if generation != self._generation:
+            self.scroll_to(self.top)
+            return
+
+        kind = page["kind"]
+
+        if kind == "next":
+            if not self._buffer or self._key(self._buffer[-1]) != page["after"]:
+                self.scroll_to(self.top)
+                return
+
+            self._buffer.extend(songs)
+            buffer_end = self._buffer_start + len(self._buffer)
+            self._end_reached = len(songs) < self.page_size
+            self.total = buffer_end if self._end_reached else max(self.total, buffer_end)
+
+            if len(self._buffer) > self.max_buffer:
+                removed = len(self._buffer) - self.max_buffer
+                del self._buffer[:removed]
+                self._buffer_start += removed
+        elif kind == "previous":
+            if not self._buffer or self._key(self._buffer[0]) != page["after"]:
+                self.scroll_to(self.top)
+                return
+
+            songs.reverse()
+            self._buffer[:0] = songs
+            self._buffer_start -= len(songs)
+
+            # Mai multe (sau mai putine) melodii inainte decat se estimase
+            if self._buffer_start < 0 or (len(songs) < self.page_size and self._buffer_start != 0):
+                self.top -= self._buffer_start
+                self._buffer_start = 0
+
+            if len(self._buffer) > self.max_buffer:
+                del self._buffer[self.max_buffer:]
+                self._end_reached = False
+        else:
+            # Salt sau reincarcare: randurile din memorie sunt inlocuite
+            start = page["start"] if kind == "refresh" else page["offset"]
+            self._buffer = songs
+            self._buffer_start = start
+            self._end_reached = len(songs) < self.page_size
+
+            if self._end_reached:
+                self.total = start + len(songs)
+
+        self.scroll_to(self.top)
+
+
+    def _page_failed(self, generation, error):
+        """
+        Handles a failed read of a page: the page is read again when the table is scrolled.
+
+        Args:
+            generation (int): The generation the page was requested in.
+            error (Exception): The error.
+        """
+
+        print(f"Error while loading songs: {error}.")
+
+        if self._in_flight == generation:
+            self._in_flight = None
+
+
+    def _render(self):
+        """
+        Shows the visible songs in the Treeview items, reusing them, and updates the scrollbar.
+        """
+
+        rows = [self._row(position) or PLACEHOLDER
+                for position in range(self.top, min(self.top + self.visible_rows, self.total))]
+
+        for index, song in enumerate(rows):
+            if index < len(self._items):
+                self.tree.item(self._items[index], values=song)
+            else:
+                self._items.append(self.tree.insert("", tk.END, values=song))
+
+        for item in self._items[len(rows):]:
+            self.tree.delete(item)
+        del self._items[len(rows):]
+
+        self._item_by_id = {song[0]: item for item, song in zip(self._items, rows) if song is not PLACEHOLDER}
+
+
+        # Selectia urmareste melodia, nu randul de pe ecran
+        selected = self._item_by_id.get(self.selected_id)
+        self.tree.selection_set([selected] if selected else [])
+
+        if self.total:
+            self.scrollbar.set(self.top / self.total, min(1.0, (self.top + len(rows)) / self.total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+
+    def _on_scrollbar(self, action, amount, what=None):
+        """
+        Scrolls the table from the scrollbar.
+
+        Args:
+            action (str): "moveto" or "scroll".
+            amount (str): The fraction to move to, or the number of units or pages to scroll.
+            what (str): "units" or "pages" for "scroll".
+        """
+
+        if action == "moveto":
+            self.scroll_to(float(amount) * self.total)
+        else:
+            self.scroll(int(amount), what)
+
+
+    def _on_resize(self, event):
+        """
+        Updates the number of visible rows when the table is resized.
+
+        Args:
+            event (tk.Event): The resize event.
+        """
+
+        row_height = ttk.Style().lookup("Treeview", "rowheight")
+        if not row_height:
+            row_height = font.nametofont("TkDefaultFont").metrics("linespace") + 4
+
+        # Un rand e ocupat de antetul coloanelor
+        visible_rows = max(1, event.height // int(row_height) - 1)
+
+        if visible_rows != self.visible_rows:
+            self.visible_rows = visible_rows
+            self.scroll_to(self.top)
+
+
+    def _on_select(self, event):
+        """
+        Remembers the ID of the selected song.
+
+        Args:
+            event (tk.Event): The selection event.
+        """
+
+        selection = self.tree.selection()
+
+        # Randurile care se citesc inca nu au ID
+        if selection and self.tree.item(selection[0])["values"][0] != "":
+            self.selected_id = self.tree.item(selection[0])["values"][0]
+
+
+    def _move_selection(self, delta):
+        """
+        Moves the selection up or down, scrolling when it leaves the visible rows.
+
+        Args:
+            delta (int): -1 to move up, 1 to move down.
+        """
+
+        index = self._index.get(self.selected_id)
+        position = (self._buffer_start + index if index is not None else self.top - delta) + delta
+
+        if not 0 <= position < self.total:
+            return "break"
+
+        if position < self.top:
+            self.scroll_to(position)
+        elif position >= self.top + self.visible_rows:
+            self.scroll_to(position - self.visible_rows + 1)
+
+        song = self._row(position)
+        if song is not None:
+            self.selected_id = song[0]
+
+        self._render()
+        return "break"
@@ -0,0 +1,17 @@
+import pytest
+
+from ArchiveBuilder import detect_format
+
+
+def test_detect_format():
+    assert detect_format("songs.zip") == "zip"
+    assert detect_format("/backups/Songs.TAR.GZ") == "tar.gz"
+    assert detect_format("songs.tgz") == "tar.gz"
+    assert detect_format("songs.tar.zst") == "tar.zst"
+    assert detect_format("backups.v2/songs") == "zip"
+
+
+@pytest.mark.parametrize("path", ["songs.rar", "songs.7z", "songs.bz2", "songs.iso"])
+def test_detect_format_rejects_unsupported_extensions(path):
+    with pytest.raises(ValueError):
+        detect_format(path)
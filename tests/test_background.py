@@ -0,0 +1,64 @@
+import threading
+from concurrent.futures import CancelledError
+
+from meth.background import BackgroundRunner
+
+
+class FakeRoot:
+    """
+    Stands in for the Tk window: the callbacks scheduled with after are kept and run by the test.
+    """
+
+    def __init__(self):
+        self.scheduled = []
+
+    def after(self, delay, callback):
+        self.scheduled.append(callback)
+
+
+def run_callbacks(root):
+    """
+    Runs the callbacks queued on the Tk thread.
+    """
+
+    scheduled, root.scheduled = root.scheduled, []
+    for callback in scheduled:
+        callback()
+
+
+def test_cancelled_queued_task_reports_error():
+    root = FakeRoot()
+    runner = BackgroundRunner(root, max_workers=1)
+    started = threading.Event()
+    release = threading.Event()
+    ran = []
+    errors = []
+
+    runner.submit(lambda: (started.set(), release.wait(5)))
+    assert started.wait(5)
+
+    queued = runner.submit(lambda: ran.append(True), on_done=ran.append, on_error=errors.append)
+    queued.cancel()
+    release.set()
+
+    queued.future.result(5)
+    run_callbacks(root)
+    runner.shutdown()
+
+    assert ran == []
+    assert len(errors) == 1 and isinstance(errors[0], CancelledError)
+
+
+def test_task_results_reach_callbacks():
+    root = FakeRoot()
+    runner = BackgroundRunner(root)
+    results = []
+    errors = []
+
+    runner.submit(lambda a, b: a + b, 1, 2, on_done=results.append).future.result(5)
+    runner.submit(lambda: 1 / 0, on_error=errors.append).future.result(5)
+    run_callbacks(root)
+    runner.shutdown()
+
+    assert results == [3]
+    assert isinstance(errors[0], ZeroDivisionError)
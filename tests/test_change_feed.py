@@ -0,0 +1,75 @@
+import socket
+from types import SimpleNamespace
+
+from ChangeFeed import ChangeFeed
+
+
+class FakeCursor:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute(self, query):
+        pass
+
+
+class FakeConnection:
+    """
+    Stands in for the listening connection: every line written to the socket becomes a notification.
+    """
+
+    def __init__(self):
+        self.socket, self.sender = socket.socketpair()
+        self.notifies = []
+        self.closed = False
+
+    def fileno(self):
+        return self.socket.fileno()
+
+    def cursor(self):
+        return FakeCursor()
+
+    def poll(self):
+        for payload in self.socket.recv(4096).decode().splitlines():
+            self.notifies.append(SimpleNamespace(payload=payload))
+
+    def close(self):
+        self.closed = True
+        self.socket.close()
+        self.sender.close()
+
+
+class FakePool:
+    def __init__(self):
+        self.connections = []
+
+    def dedicated_connection(self):
+        conn = FakeConnection()
+        self.connections.append(conn)
+        return conn
+
+
+def test_bad_payloads_and_subscribers_do_not_stop_the_feed():
+    pool = FakePool()
+    feed = ChangeFeed(pool, poll_timeout=0.05)
+
+    def failing(change):
+        raise RuntimeError("subscriber failed")
+
+    feed.subscribe(failing)
+    changes = feed.iter_changes(timeout=5)
+
+    assert next(changes) == {"op": "RESYNC"}
+
+    pool.connections[0].sender.sendall(b'not json\n{"op": "INSERT", "id": 1}\n')
+    assert next(changes) == {"op": "INSERT", "id": 1}
+
+    pool.connections[0].sender.sendall(b'{"op": "DELETE", "id": 1}\n')
+    assert next(changes) == {"op": "DELETE", "id": 1}
+
+    changes.close()
+    feed.stop()
+
+    assert len(pool.connections) == 1 and pool.connections[0].closed
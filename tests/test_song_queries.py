@@ -0,0 +1,25 @@
+import pytest
+
+from SongQueries import build_assignments, build_where
+
+
+def test_build_where():
+    where_clause, values = build_where({"artist": "Queen", "tags": ["rock"], "duration": (180, None),
+                                        "format": ".MP3"})
+
+    assert where_clause == "artist = %s AND tags && %s AND duration >= %s AND format = lower(%s)"
+    assert values == ["Queen", ["rock"], 180, "MP3"]
+    assert build_where({}) == ("", [])
+
+
+@pytest.mark.parametrize("column", ["1=1; DROP TABLE songs; --", "id) OR (1=1", "password", "Artist"])
+def test_build_where_rejects_unknown_columns(column):
+    with pytest.raises(ValueError):
+        build_where({column: "x"})
+
+
+def test_build_assignments_rejects_unmodifiable_columns():
+    assert build_assignments({"artist": "Queen"}) == [("artist", "%s", ["Queen"])]
+
+    with pytest.raises(ValueError):
+        build_assignments({"file_name = 'x', artist": "Queen"})
@@ -0,0 +1,190 @@
+import hashlib
+import os
+
+import pytest
+
+from StorageBackend import (
+    CHUNK_SIZE, LocalStorageBackend, RangeReader, S3StorageBackend, ShardedLocalStorageBackend
+)
+
+# S3 nu accepta parti mai mici de 5 MB, cu exceptia ultimei
+PART_SIZE = 5 * CHUNK_SIZE
+
+
+def write_file(directory, name, data):
+    """
+    Writes a local file for a test to store.
+    """
+
+    path = os.path.join(directory, name)
+    with open(path, "wb") as file:
+        file.write(data)
+    return path
+
+
+@pytest.fixture
+def s3_backend():
+    pytest.importorskip("boto3")
+    moto = pytest.importorskip("moto")
+
+    with moto.mock_aws():
+        backend = S3StorageBackend("songs", prefix="library/", region_name="us-east-1",
+                                   multipart_threshold=PART_SIZE, multipart_chunksize=PART_SIZE,
+                                   aws_access_key_id="test", aws_secret_access_key="test")
+        backend.client.create_bucket(Bucket="songs")
+        yield backend
+
+
+@pytest.fixture(params=["local", "sharded", "s3"])
+def backend(request, tmp_path):
+    if request.param == "local":
+        return LocalStorageBackend(str(tmp_path / "storage"))
+    if request.param == "sharded":
+        return ShardedLocalStorageBackend(str(tmp_path / "storage"))
+    return request.getfixturevalue("s3_backend")
+
+
+def test_put_get_stat_delete(backend, tmp_path):
+    data = os.urandom(4096)
+    key = hashlib.sha256(data).hexdigest()
+    backend.put(key, write_file(tmp_path, "song.mp3", data))
+
+    assert backend.exists(key)
+    assert backend.stat(key)["size"] == len(data)
+
+    backend.get(key, str(tmp_path / "copy.mp3"))
+    assert (tmp_path / "copy.mp3").read_bytes() == data
+
+    with backend.open_stream(key) as stream:
+        assert stream.read() == data
+
+    assert backend.delete(key) is True
+    assert backend.delete(key) is False
+    assert backend.stat(key) is None
+    assert not backend.exists(key)
+
+
+def test_missing_file(backend, tmp_path):
+    with pytest.raises(FileNotFoundError):
+        backend.get("missing.mp3", str(tmp_path / "copy.mp3"))
+    with pytest.raises(FileNotFoundError):
+        backend.open_stream("missing.mp3")
+    with pytest.raises(FileNotFoundError):
+        backend.read_range("missing.mp3", 0, 10)
+
+
+def test_put_replaces_file(backend, tmp_path):
+    backend.put("song.mp3", write_file(tmp_path, "first.mp3", b"first"))
+    backend.put("song.mp3", write_file(tmp_path, "second.mp3", b"second version"))
+
+    with backend.open_stream("song.mp3") as stream:
+        assert stream.read() == b"second version"
+
+
+def test_read_range(backend, tmp_path):
+    data = bytes(range(256)) * 40
+    backend.put("song.wav", write_file(tmp_path, "song.wav", data))
+
+    assert backend.read_range("song.wav", 0, 100) == data[:100]
+    assert backend.read_range("song.wav", 1000, 500) == data[1000:1500]
+    assert backend.read_range("song.wav", len(data) - 10, 100) == data[-10:]
+    assert backend.read_range("song.wav", len(data) + 10, 100) == b""
+
+
+def test_iter_files_sorted_and_resumable(backend, tmp_path):
+    keys = [hashlib.sha256(str(number).encode()).hexdigest() for number in range(20)] + ["old song.mp3"]
+    for number, key in enumerate(keys):
+        backend.put(key, write_file(tmp_path, "song", b"x" * (number + 1)))
+
+    listed = list(backend.iter_files())
+    expected = sorted(keys) if not isinstance(backend, ShardedLocalStorageBackend) else None
+
+    # Stocarea pe subdirectoare sorteaza cheile dupa subdirector, apoi dupa nume
+    if expected is None:
+        expected = sorted(keys, key=lambda key: (backend.local_path(key), key))
+
+    assert [key for key, size in listed] == expected
+    assert dict(listed) == {key: number + 1 for number, key in enumerate(keys)}
+
+    middle = expected[len(expected) // 2]
+    assert [key for key, size in backend.iter_files(after=middle)] == expected[len(expected) // 2 + 1:]
+
+
+def test_local_iter_files_ignores_subdirectories(tmp_path):
+    backend = LocalStorageBackend(str(tmp_path))
+    backend.put("song.mp3", write_file(tmp_path, "source", b"data"))
+    os.makedirs(tmp_path / "renditions")
+    os.remove(tmp_path / "source")
+
+    assert list(backend.iter_files()) == [("song.mp3", 4)]
+
+
+def test_iter_files_of_missing_directory(tmp_path):
+    assert list(LocalStorageBackend(str(tmp_path / "missing")).iter_files()) == []
+    assert list(ShardedLocalStorageBackend(str(tmp_path / "missing")).iter_files()) == []
+
+
+def test_sharded_paths(tmp_path):
+    backend = ShardedLocalStorageBackend(str(tmp_path), shard_levels=2)
+    digest = "abcdef" + "0" * 58
+
+    assert backend.local_path(digest) == os.path.join(str(tmp_path), "ab", "cd", digest)
+    assert len(os.path.relpath(backend.local_path("old song.mp3"), str(tmp_path)).split(os.sep)) == 3
+
+
+def test_s3_multipart_upload(s3_backend, tmp_path):
+    data = os.urandom(2 * PART_SIZE + 1024)
+    s3_backend.put("album.flac", write_file(tmp_path, "album.flac", data))
+
+    head = s3_backend.client.head_object(Bucket="songs", Key="library/album.flac")
+    # ETag-ul unui obiect incarcat in parti se termina cu numarul partilor
+    assert head["ETag"].strip('"').endswith("-3")
+    assert s3_backend.stat("album.flac")["size"] == len(data)
+
+    s3_backend.get("album.flac", str(tmp_path / "copy.flac"))
+    assert (tmp_path / "copy.flac").read_bytes() == data
+    assert s3_backend.read_range("album.flac", PART_SIZE - 10, 20) == data[PART_SIZE - 10:PART_SIZE + 10]
+
+
+def test_s3_prefix(s3_backend, tmp_path):
+    s3_backend.client.put_object(Bucket="songs", Key="other/song.mp3", Body=b"not ours")
+    s3_backend.put("song.mp3", write_file(tmp_path, "song.mp3", b"ours"))
+
+    assert list(s3_backend.iter_files()) == [("song.mp3", 4)]
+    assert s3_backend.client.get_object(Bucket="songs", Key="library/song.mp3")["Body"].read() == b"ours"
+
+
+def test_range_reader(backend, tmp_path):
+    data = os.urandom(10 * 1000 + 7)
+    backend.put("song.wav", write_file(tmp_path, "song.wav", data))
+
+    with RangeReader(backend, "song.wav", chunk_size=1000, read_ahead=3) as reader:
+        assert reader.read(2500) == data[:2500]
+        reader.seek(-100, os.SEEK_END)
+        assert reader.read() == data[-100:]
+        reader.seek(10)
+        assert reader.read(5000) == data[10:5010]
+
+
+def test_range_reader_keeps_a_window_of_chunks(tmp_path):
+    backend = LocalStorageBackend(str(tmp_path))
+    data = os.urandom(50 * 1000)
+    backend.put("song.wav", write_file(tmp_path, "source.wav", data))
+
+    reads = []
+    read_range = backend.read_range
+    backend.read_range = lambda key, offset, size: reads.append(offset) or read_range(key, offset, size)
+
+    with RangeReader(backend, "song.wav", chunk_size=1000, read_ahead=2, keep_behind=3) as reader:
+        for position in range(0, len(data), 500):
+            assert reader.read(500) == data[position:position + 500]
+            assert len(reader._chunks) <= 4
+
+        # Bucatile din fereastra nu sunt descarcate din nou
+        downloaded = len(reads)
+        reader.seek(-2500, os.SEEK_END)
+        assert reader.read(1000) == data[-2500:-1500]
+        assert len(reads) == downloaded
+
+        reader.seek(0)
+        assert reader.read() == data